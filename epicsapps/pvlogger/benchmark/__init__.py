@@ -0,0 +1,7 @@
+from .synthetic import SyntheticPV, make_pvlog_folder
+from .benchmarks import (run_benchmarks, bench_read_text, bench_parse,
+                         bench_export, bench_motor_events, bench_writer)
+
+__all__ = ('SyntheticPV', 'make_pvlog_folder', 'run_benchmarks',
+           'bench_read_text', 'bench_parse', 'bench_export',
+           'bench_motor_events', 'bench_writer')
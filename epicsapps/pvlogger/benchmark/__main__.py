@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+run PVLogger benchmarks from the command line:
+
+   python -m epicsapps.pvlogger.benchmark --npvs 200 --output results.json
+"""
+import json
+from argparse import ArgumentParser
+
+from ..binarylog import STORAGE_FORMATS, STORAGE_TEXT
+from .benchmarks import run_benchmarks, NPROCS, EXPORT_POINTS
+
+def main():
+    parser = ArgumentParser(description='run PVLogger benchmarks on a synthetic PVLOG folder')
+    parser.add_argument('--folder', default=None,
+                        help='PVLOG folder to use, or to create and keep')
+    parser.add_argument('--npvs', type=int, default=100, help='number of PVs')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='values per second for each PV')
+    parser.add_argument('--duration', type=float, default=3600.0,
+                        help='time span of data in seconds')
+    parser.add_argument('--mix', default='0.7,0.2,0.1',
+                        help='fractions of double, enum, and string PVs')
+    parser.add_argument('--nevents', type=int, default=2,
+                        help='number of event lines for each PV')
+    parser.add_argument('--nmotors', type=int, default=10, help='number of motors')
+    parser.add_argument('--storage', default=STORAGE_TEXT, choices=STORAGE_FORMATS,
+                        help='storage for double values')
+    parser.add_argument('--nprocs', default=','.join([str(n) for n in NPROCS]),
+                        help='numbers of worker processes for parsing')
+    parser.add_argument('--export-points', type=int, default=EXPORT_POINTS,
+                        help='number of times for export')
+    parser.add_argument('--writer-points', type=int, default=200000,
+                        help='number of values for writer benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='random number seed')
+    parser.add_argument('-o', '--output', default=None,
+                        help='JSON file for results')
+    args = parser.parse_args()
+
+    fracs = [float(x) for x in args.mix.split(',')]
+    mix = dict(zip(('double', 'enum', 'string'), fracs))
+    nprocs = [int(n) for n in args.nprocs.split(',')]
+    results = run_benchmarks(folder=args.folder, npvs=args.npvs, rate=args.rate,
+                             duration=args.duration, mix=mix,
+                             nevents=args.nevents, nmotors=args.nmotors,
+                             storage=args.storage, nprocs=nprocs,
+                             export_points=args.export_points,
+                             writer_points=args.writer_points,
+                             output=args.output, keep=args.folder is not None,
+                             seed=args.seed)
+    if args.output is None:
+        print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
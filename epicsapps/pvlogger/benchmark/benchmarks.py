@@ -0,0 +1,261 @@
+#!/usr/bin/python
+"""
+benchmarks of reading, parsing, exporting, and writing PVLogger data
+
+Each benchmark returns a dict of results, with times in seconds.  Use
+`run_benchmarks()` to run all benchmarks on a synthetic PVLOG folder,
+and save the results as JSON, so that results can be compared over time.
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import platform
+from time import time, sleep
+from pathlib import Path
+import numpy as np
+from pyshortcuts import isotime
+
+from ... import __version__
+from ..logfile import PVLogFolder
+from ..logcache import CACHE_DIR
+from ..export import export_timeseries
+from ..writer import LogWriter
+from ..pvlogger import LoggedPV
+from ..binarylog import STORAGE_TEXT
+from .synthetic import (SyntheticPV, make_pvlog_folder, pv_kinds,
+                        synthetic_values, PV_TYPES, PV_ENUM, ENUM_STRS)
+
+MEGABYTE = 1024*1024
+NPROCS = (1, 2, 4)
+EXPORT_POINTS = 10000
+
+def clear_cache(folder):
+    """remove cached data for a PVLOG folder"""
+    shutil.rmtree(Path(folder, CACHE_DIR), ignore_errors=True)
+
+def folder_nbytes(folder):
+    """total size of log files in a PVLOG folder"""
+    return sum(f.stat().st_size for f in Path(folder).iterdir()
+               if f.is_file() and not f.name.startswith('_PVLOG'))
+
+def data_time_range(log_folder):
+    """first and last timestamp of parsed data for all PVs"""
+    tmin, tmax = None, None
+    for pv in log_folder.pvs.values():
+        if pv.data is not None and len(pv.data.timestamps) > 0:
+            t0, t1 = pv.data.timestamps[0], pv.data.timestamps[-1]
+            tmin = t0 if tmin is None else min(tmin, t0)
+            tmax = t1 if tmax is None else max(tmax, t1)
+    return tmin, tmax
+
+def bench_read_text(folder):
+    """time reading and parsing all log files, one at a time,
+    from their bytes"""
+    nbytes = folder_nbytes(folder)
+    log_folder = PVLogFolder(folder, use_cache=False)
+    t0 = time()
+    log_folder.read_all_logs_text()
+    dt = time() - t0
+    return {'time': dt, 'npvs': len(log_folder.pvs), 'nbytes': nbytes,
+            'mb_per_sec': nbytes/MEGABYTE/max(dt, 1.e-9)}
+
+def bench_parse(folder, nprocs=NPROCS):
+    """time parsing all log files, for several numbers of worker
+    processes, and reading parsed data from the cache"""
+    nbytes = folder_nbytes(folder)
+    out = {}
+    for nproc in nprocs:
+        log_folder = PVLogFolder(folder, use_cache=False)
+        t0 = time()
+        log_folder.parse_logfiles(nproc=nproc)
+        dt = time() - t0
+        log_folder.close_pool()
+        npts = sum(len(pv.data.timestamps) for pv in log_folder.pvs.values()
+                   if pv.data is not None)
+        out[f'nproc_{nproc}'] = {'time': dt, 'npoints': npts,
+                                 'mb_per_sec': nbytes/MEGABYTE/max(dt, 1.e-9)}
+
+    clear_cache(folder)
+    nproc = max(nprocs)
+    for label in ('cache_write', 'cache_read'):
+        log_folder = PVLogFolder(folder, use_cache=True)
+        t0 = time()
+        log_folder.parse_logfiles(nproc=nproc)
+        out[label] = {'time': time() - t0, 'nproc': nproc}
+        log_folder.close_pool()
+    clear_cache(folder)
+    return out
+
+def bench_export(folder, npoints=EXPORT_POINTS):
+    """time sampling all PVs on a time grid, with values_at() for each
+    PV, and with export_timeseries() to a TSV file"""
+    log_folder = PVLogFolder(folder, use_cache=False)
+    for pvname in log_folder.pvs:
+        log_folder.read_logfile(pvname)
+    tmin, tmax = data_time_range(log_folder)
+    tstep = (tmax - tmin)/max(1, npoints - 1)
+    times = tmin + tstep*np.arange(npoints)
+
+    t0 = time()
+    for pv in log_folder.pvs.values():
+        pv.values_at(times)
+    dt_values = time() - t0
+
+    datasets = {pvname: (pv.description, pv.data)
+                for pvname, pv in log_folder.pvs.items()}
+    tmpdir = tempfile.mkdtemp(prefix='pvlog_export_')
+    try:
+        t0 = time()
+        nrows = export_timeseries(datasets, Path(tmpdir, 'export.tsv'),
+                                  tmin, tmax, tstep)
+        dt_export = time() - t0
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {'npvs': len(datasets), 'npoints': npoints,
+            'values_at': {'time': dt_values},
+            'export_tsv': {'time': dt_export, 'nrows': nrows}}
+
+def bench_motor_events(folder, window=6*3600.0):
+    """time merging motor field events for all motors, and building
+    and querying the event index for all PVs"""
+    log_folder = PVLogFolder(folder, use_cache=False)
+    for pvname in log_folder.pvs:
+        log_folder.read_logfile(pvname)
+    # re-read motor data, without the merged motor field events
+    for pvname in log_folder.motors:
+        log_folder.pvs[pvname].read_log_text(parse=True)
+    t0 = time()
+    for pvname in log_folder.motors:
+        log_folder.read_motor_events(pvname)
+    dt_motors = time() - t0
+    nmotor_events = sum(len(log_folder.pvs[pvname].data.events)
+                        for pvname in log_folder.motors)
+
+    t0 = time()
+    events = log_folder.get_events()
+    dt_index = time() - t0
+    tmin, tmax = data_time_range(log_folder)
+    t0 = time()
+    window_events = log_folder.get_events(tmax - window, tmax)
+    dt_query = time() - t0
+    return {'nmotors': len(log_folder.motors),
+            'motor_events': {'time': dt_motors, 'nevents': nmotor_events},
+            'event_index': {'time': dt_index, 'nevents': len(events)},
+            'event_query': {'time': dt_query, 'window': window,
+                            'nevents': len(window_events)}}
+
+def bench_writer(npvs=100, npoints=200000, storage=STORAGE_TEXT, seed=0):
+    """time logging values from synthetic PVs with the writer thread
+
+    Values for `npvs` PVs are sent to LoggedPV.onChanges() as fast as
+    possible, for a total of `npoints` values, and are written by a
+    LogWriter thread to log files in a temporary folder.
+    """
+    rng = np.random.default_rng(seed)
+    tmpdir = tempfile.mkdtemp(prefix='pvlog_writer_')
+    cwd = os.getcwd()
+    os.chdir(tmpdir)
+    try:
+        writer = LogWriter()
+        pvs, sources = [], []
+        nper = max(1, npoints//npvs)
+        for i, kind in enumerate(pv_kinds(npvs)):
+            pvname = f'SIM:{kind}{i:04d}.VAL'
+            enum_strs = ENUM_STRS if kind == PV_ENUM else None
+            spv = SyntheticPV(pvname, pvtype=PV_TYPES[kind], enum_strs=enum_strs)
+            lpv = LoggedPV(pvname, desc=f'synthetic {kind}', mdel=None,
+                           writer=writer, storage=storage, pv=spv)
+            lpv.needs_header = True
+            pvs.append(lpv)
+            sources.append(synthetic_values(kind, nper, rng,
+                                            enum_strs=enum_strs))
+        tstart = time()
+        writer.start()
+        t0 = time()
+        for j in range(nper):
+            ts = tstart + j*1.e-3
+            for lpv, (values, char_values) in zip(pvs, sources):
+                lpv.pv.value = values[j]
+                lpv.onChanges(lpv.pvname, values[j], char_values[j],
+                              timestamp=ts)
+        dt_send = time() - t0
+        while writer.npending > 0:
+            sleep(0.001)
+        writer.stop()
+        writer.drain(pvs)
+        writer.close()
+        dt = time() - t0
+        nbytes = folder_nbytes(tmpdir)
+        stats = dict(writer.stats)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    ntotal = nper*npvs
+    return {'npvs': npvs, 'npoints': ntotal, 'storage': storage,
+            'time': dt, 'time_send': dt_send, 'nbytes': nbytes,
+            'points_per_sec': ntotal/max(dt, 1.e-9),
+            'mb_per_sec': nbytes/MEGABYTE/max(dt, 1.e-9),
+            'writer_stats': stats}
+
+def system_info():
+    """description of system, for benchmark results"""
+    return {'epicsapps': __version__, 'python': sys.version.split()[0],
+            'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'ncpus': os.cpu_count()}
+
+def run_benchmarks(folder=None, npvs=100, rate=1.0, duration=3600.0,
+                   mix=None, nevents=2, nmotors=10, storage=STORAGE_TEXT,
+                   nprocs=NPROCS, export_points=EXPORT_POINTS,
+                   writer_points=200000, output=None, keep=False, seed=0):
+    """run PVLogger benchmarks on a synthetic PVLOG folder
+
+    Arguments:
+       folder (str or None): PVLOG folder to use [None, for a new folder]
+       npvs, rate, duration, mix, nevents, nmotors, storage, seed:
+                  settings for the synthetic folder, see make_pvlog_folder()
+       nprocs (tuple): numbers of worker processes for parsing [(1, 2, 4)]
+       export_points (int): number of times for export [10000]
+       writer_points (int): number of values for writer benchmark [200000]
+       output (str or None): name of JSON file to save results [None]
+       keep (bool): whether to keep a new synthetic folder [False]
+
+    Returns:
+       dict of benchmark results
+
+    Notes:
+       with `folder` given and existing, that folder is used and the
+       synthetic folder settings are ignored.
+    """
+    config = {'npvs': npvs, 'rate': rate, 'duration': duration,
+              'mix': mix, 'nevents': nevents, 'nmotors': nmotors,
+              'storage': storage, 'seed': seed, 'nprocs': list(nprocs),
+              'export_points': export_points, 'writer_points': writer_points}
+    results = {'date': isotime(), 'system': system_info(), 'config': config,
+               'folder': None, 'benchmarks': {}}
+    made_folder = folder is None or not Path(folder).exists()
+    if folder is None:
+        folder = tempfile.mkdtemp(prefix='pvlog_bench_')
+    try:
+        if made_folder:
+            results['folder'] = make_pvlog_folder(folder, npvs=npvs, rate=rate,
+                                                  duration=duration, mix=mix,
+                                                  nevents=nevents, nmotors=nmotors,
+                                                  storage=storage, seed=seed)
+        else:
+            results['folder'] = {'folder': Path(folder).absolute().as_posix()}
+        bench = results['benchmarks']
+        bench['read_text'] = bench_read_text(folder)
+        bench['parse'] = bench_parse(folder, nprocs=nprocs)
+        bench['export'] = bench_export(folder, npoints=export_points)
+        bench['motor_events'] = bench_motor_events(folder)
+        bench['writer'] = bench_writer(npvs=npvs, npoints=writer_points,
+                                       storage=storage, seed=seed)
+    finally:
+        if made_folder and not keep:
+            shutil.rmtree(folder, ignore_errors=True)
+    if output is not None:
+        with open(output, 'w', encoding='utf-8') as fh:
+            json.dump(results, fh, indent=2)
+    return results
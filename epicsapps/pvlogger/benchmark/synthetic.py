@@ -0,0 +1,214 @@
+#!/usr/bin/python
+"""
+synthetic PVLOG folders and PV data sources for benchmarks
+
+Log files are written by LoggedPV, with SyntheticPV objects in place of
+Epics PVs, so that they are in exactly the format written by PVLogger.
+"""
+import os
+from time import time
+from pathlib import Path
+import numpy as np
+
+from ..pvlogger import (PVLogger, LoggedPV, save_pvlog_timestamp,
+                        motor_fields)
+from ..binarylog import STORAGE_TEXT
+
+PV_DOUBLE = 'double'
+PV_ENUM = 'enum'
+PV_STRING = 'string'
+DEFAULT_MIX = {PV_DOUBLE: 0.7, PV_ENUM: 0.2, PV_STRING: 0.1}
+
+PV_TYPES = {PV_DOUBLE: 'time_double', PV_ENUM: 'time_enum',
+            PV_STRING: 'time_string'}
+
+ENUM_STRS = ('Off', 'On', 'Fault', 'Unknown')
+STRING_VALUES = ('idle', 'moving', 'counting', 'waiting for beam',
+                 'scan complete', 'error: timeout')
+EVENT_TEXTS = ('<event> <CA_disconnected>', '<event> <CA_reconnected>')
+
+MOTOR_ENUMS = {'.FOFF': ('Variable', 'Frozen'), '.SET': ('Use', 'Set'),
+               '.DIR': ('Pos', 'Neg'), '_able.VAL': ('Enable', 'Disable'),
+               '.SPMG': ('Stop', 'Pause', 'Move', 'Go')}
+CHUNK_SIZE = 10000
+
+
+class SyntheticPV:
+    """PV-like data source for LoggedPV, with the attributes used for
+    log file headers and for formatting char values
+
+    Arguments:
+       pvname (str):  PV name
+       pvtype (str):  PV type, as 'time_double' ['time_double']
+       enum_strs (tuple or None): enum strings, for enum PVs [None]
+       precision (int): precision for double values [4]
+       units (str):  units ['']
+    """
+    def __init__(self, pvname, pvtype='time_double', enum_strs=None,
+                 precision=4, units=''):
+        self.pvname = pvname
+        self.type = pvtype
+        self.enum_strs = enum_strs
+        self.precision = precision
+        self.units = units
+        self.count = self.nelm = 1
+        self.host = 'localhost:5064'
+        self.access = 'read-only'
+        self.connected = True
+        self.value = None
+        self.char_value = None
+
+    def _set_charval(self, value):
+        if value is None:
+            return ''
+        if self.enum_strs is not None:
+            return self.enum_strs[int(value)]
+        if 'double' in self.type:
+            return f'{value:.{self.precision}f}'
+        return str(value)
+
+    def get(self, as_string=False):
+        return self.char_value if as_string else self.value
+
+    def set_value(self, value):
+        """set current value and char value"""
+        self.value = value
+        self.char_value = self._set_charval(value)
+
+
+def synthetic_values(kind, npts, rng, enum_strs=ENUM_STRS):
+    """values and char values for a synthetic PV
+
+    Returns:
+       tuple of (list of values, list of char values)
+    """
+    if kind == PV_DOUBLE:
+        values = np.round(np.cumsum(rng.normal(scale=0.01, size=npts)), 4)
+        values = values.tolist()
+        return values, [f'{val:.4f}' for val in values]
+    if kind == PV_ENUM:
+        values = rng.integers(0, len(enum_strs), size=npts).tolist()
+        return values, [enum_strs[val] for val in values]
+    index = rng.integers(0, len(STRING_VALUES), size=npts).tolist()
+    values = [STRING_VALUES[i] for i in index]
+    return values, values[:]
+
+def pv_kinds(npvs, mix=None):
+    """list of kinds of PVs ('double', 'enum', 'string') for a mix of
+    fractions of each kind"""
+    if mix is None:
+        mix = DEFAULT_MIX
+    total = sum(mix.values())
+    kinds = []
+    for kind, frac in mix.items():
+        if kind not in PV_TYPES:
+            raise ValueError(f"unknown PV kind '{kind}'")
+        kinds.extend([kind]*int(round(npvs*frac/total)))
+    kinds = kinds[:npvs]
+    kinds.extend([PV_DOUBLE]*(npvs - len(kinds)))
+    return kinds
+
+def write_synthetic_pv(lpv, times, values, char_values, event_times):
+    """write data points and events for a LoggedPV, in time order"""
+    writer = lpv.writer
+    npts = len(times)
+    lpv.pv.set_value(values[-1] if npts > 0 else None)
+    lpv.needs_header = True
+    splits = np.searchsorted(times, event_times, side='right').tolist()
+    splits.append(npts)
+    start = 0
+    for i, stop in enumerate(splits):
+        for i0 in range(start, stop, CHUNK_SIZE):
+            i1 = min(stop, i0 + CHUNK_SIZE)
+            lpv.data.extend(zip(times[i0:i1], values[i0:i1], char_values[i0:i1]))
+            writer.drain([lpv])
+        start = stop
+        if i < len(event_times):
+            lpv.write(f"{event_times[i]:.3f}  {EVENT_TEXTS[i % 2]}\n")
+
+def make_pvlog_folder(folder, npvs=100, rate=1.0, duration=3600.0, mix=None,
+                      nevents=2, nmotors=0, storage=STORAGE_TEXT,
+                      tstart=None, seed=0):
+    """write a synthetic PVLOG folder
+
+    Arguments:
+       folder (str or Path):  name of folder to create
+       npvs (int):  number of PVs, not counting motors [100]
+       rate (float): average number of values per second for each PV [1]
+       duration (float): time span of data in seconds [3600]
+       mix (dict or None): fractions of 'double', 'enum', and 'string'
+                  PVs [None, for 70% double, 20% enum, 10% string]
+       nevents (int): number of event lines for each PV [2]
+       nmotors (int): number of motors, with motor fields [0]
+       storage (str): storage for double values, 'text' or 'binary' ['text']
+       tstart (float or None): first timestamp [None, for duration before now]
+       seed (int): seed for random numbers [0]
+
+    Returns:
+       dict with `folder`, numbers of `pvs`, `motors`, `points`, and
+       `events`, size of log files `nbytes`, and `time` to write.
+
+    Notes:
+       PV values arrive at random times.  Double PVs are random walks,
+       enum and string PVs take random values from fixed lists, and
+       event lines alternate between CA disconnected and reconnected.
+       Each motor has a .VAL PV logged at `rate`, and motor fields
+       that change about once every 10 minutes.
+    """
+    t0 = time()
+    folder = Path(folder).absolute()
+    folder.mkdir(parents=True, exist_ok=True)
+    if tstart is None:
+        tstart = time() - duration
+    rng = np.random.default_rng(seed)
+
+    logger = PVLogger(None)
+    logger.pvlog_folder = folder
+    logger.storage = storage
+    logger.folder_config = {'datadir': folder.as_posix(), 'storage': storage,
+                            'instruments': {}}
+    pvlist = []
+    for i, kind in enumerate(pv_kinds(npvs, mix=mix)):
+        pvlist.append((f'SIM:{kind}{i:04d}.VAL', kind, None, rate))
+    motor_rate = 1.0/600.0
+    for i in range(nmotors):
+        root = f'SIM:m{i:04d}'
+        pvlist.append((f'{root}.VAL', PV_DOUBLE, None, rate))
+        logger.motors.append(f'{root}.VAL')
+        for suff in motor_fields:
+            kind = PV_ENUM if suff in MOTOR_ENUMS else PV_DOUBLE
+            pvlist.append((f'{root}{suff}', kind, MOTOR_ENUMS.get(suff, None),
+                           motor_rate))
+
+    npoints = nevts = 0
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        for pvname, kind, enum_strs, pvrate in pvlist:
+            if kind == PV_ENUM and enum_strs is None:
+                enum_strs = ENUM_STRS
+            spv = SyntheticPV(pvname, pvtype=PV_TYPES[kind], enum_strs=enum_strs)
+            lpv = LoggedPV(pvname, desc=f'synthetic {kind}', mdel=None,
+                           writer=logger.writer, storage=storage, pv=spv)
+            npts = max(1, int(rng.poisson(pvrate*duration)))
+            times = np.round(tstart + np.sort(rng.uniform(0, duration, npts)), 3)
+            values, char_values = synthetic_values(kind, npts, rng,
+                                                   enum_strs=enum_strs)
+            event_times = []
+            if nevents > 0 and npts > 1:
+                event_times = np.sort(rng.uniform(times[0], times[-1], nevents))
+            write_synthetic_pv(lpv, times.tolist(), values, char_values,
+                               event_times)
+            logger.pvs[lpv.pvname] = lpv
+            logger.config_pvnames.append(lpv.pvname)
+            npoints += npts
+            nevts += len(event_times)
+        logger.writer.close()
+    finally:
+        os.chdir(cwd)
+    logger.save_folder_config()
+    save_pvlog_timestamp(folder)
+    nbytes = sum(f.stat().st_size for f in folder.iterdir() if f.is_file())
+    return {'folder': folder.as_posix(), 'pvs': len(pvlist),
+            'motors': nmotors, 'points': npoints, 'events': nevts,
+            'nbytes': nbytes, 'time': time() - t0}
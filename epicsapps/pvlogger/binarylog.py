@@ -0,0 +1,123 @@
+#!/usr/bin/python
+"""
+binary data files for PVLogger
+
+With `storage: binary` in the PVLogger configuration, numeric scalar PVs
+write their values as fixed-width records of little-endian float64
+(timestamp, value) pairs to a data file next to the text log file.  The
+text log file keeps the header, events, and any non-numeric values.
+
+Numeric array (waveform) PVs always write each array to a waveform data
+file next to the text log file, as fixed-width records of timestamp,
+number of elements, and array values.  The text log file has a line for
+each array with the record number in the waveform data file.
+"""
+from pathlib import Path
+import numpy as np
+
+STORAGE_TEXT = 'text'
+STORAGE_BINARY = 'binary'
+STORAGE_FORMATS = (STORAGE_TEXT, STORAGE_BINARY)
+
+BINARY_SUFFIX = '.bin'
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'), ('value', '<f8')])
+
+WAVEFORM_SUFFIX = '.wfm'
+WAVEFORM_TYPES = {'double': '<f8', 'float': '<f4', 'long': '<i4',
+                  'int': '<i2', 'short': '<i2', 'enum': '<u2'}
+BINARY_SUFFIXES = (BINARY_SUFFIX, WAVEFORM_SUFFIX)
+
+def binary_datafile(logfile):
+    """name of binary data file for a log file"""
+    return Path(logfile).with_suffix(BINARY_SUFFIX)
+
+def pack_records(records):
+    """pack a list of (timestamp, value) pairs to bytes"""
+    return np.asarray(records, dtype='<f8').reshape(-1, 2).tobytes()
+
+def read_records(datafile, use_mmap=False):
+    """read binary records from data file
+
+    Arguments:
+       datafile (str or Path):  name of binary data file
+       use_mmap (bool):  whether to memory-map the file [False]
+
+    Returns:
+       tuple of (timestamps, values) as float64 arrays
+
+    Notes:
+       an incomplete record at the end of the file (from a write
+       in progress) is ignored.
+    """
+    datafile = Path(datafile)
+    nrec = 0
+    if datafile.exists():
+        nrec = datafile.stat().st_size // RECORD_DTYPE.itemsize
+    if nrec < 1:
+        return np.zeros(0, dtype='f8'), np.zeros(0, dtype='f8')
+    if use_mmap:
+        recs = np.memmap(datafile, dtype=RECORD_DTYPE, mode='r', shape=(nrec,))
+    else:
+        recs = np.fromfile(datafile, dtype=RECORD_DTYPE, count=nrec)
+    return (recs['timestamp'].astype('f8', copy=False),
+            recs['value'].astype('f8', copy=False))
+
+def waveform_datafile(logfile):
+    """name of waveform data file for a log file"""
+    return Path(logfile).with_suffix(WAVEFORM_SUFFIX)
+
+def waveform_record_dtype(value_type, nelm):
+    """record dtype for waveform data file with array values
+    of type `value_type` (such as '<f8') and `nelm` elements"""
+    return np.dtype([('timestamp', '<f8'), ('count', '<u4'),
+                     ('value', value_type, (int(nelm),))])
+
+def waveform_type(pvtype, nelm):
+    """array value type for waveform data file for an Epics PV type and
+    number of elements, or None if the PV is not logged as a waveform.
+    Character waveforms are logged as strings, not as waveforms."""
+    try:
+        nelm = int(nelm)
+    except (ValueError, TypeError):
+        return None
+    if nelm < 2:
+        return None
+    return WAVEFORM_TYPES.get(str(pvtype).replace('time_', '').replace('ctrl_', ''), None)
+
+def pack_waveforms(records, dtype):
+    """pack a list of (timestamp, array) pairs to bytes, for a record dtype
+    from waveform_record_dtype().  Arrays longer than the number of elements
+    are truncated, and shorter arrays are padded with 0."""
+    nelm = dtype['value'].shape[0]
+    recs = np.zeros(len(records), dtype=dtype)
+    for i, (ts, val) in enumerate(records):
+        val = np.ravel(val)[:nelm]
+        recs['timestamp'][i] = ts
+        recs['count'][i] = len(val)
+        recs['value'][i, :len(val)] = val
+    return recs.tobytes()
+
+def read_waveforms(datafile, dtype, use_mmap=True):
+    """read records from waveform data file
+
+    Arguments:
+       datafile (str or Path):  name of waveform data file
+       dtype (np.dtype): record dtype, from waveform_record_dtype()
+       use_mmap (bool):  whether to memory-map the file [True]
+
+    Returns:
+       structured array of records, with fields 'timestamp', 'count',
+       and 'value', a 2D array with one row per record.
+
+    Notes:
+       an incomplete record at the end of the file is ignored.
+    """
+    datafile = Path(datafile)
+    nrec = 0
+    if datafile.exists():
+        nrec = datafile.stat().st_size // dtype.itemsize
+    if nrec < 1:
+        return np.zeros(0, dtype=dtype)
+    if use_mmap:
+        return np.memmap(datafile, dtype=dtype, mode='r', shape=(nrec,))
+    return np.fromfile(datafile, dtype=dtype, count=nrec)
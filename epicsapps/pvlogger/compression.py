@@ -0,0 +1,261 @@
+#!/usr/bin/python
+"""
+compression of PV data on write for PVLogger
+
+A compression mode can be given for each PV in the PVLogger configuration,
+as a fourth field of the PV line, or for all PVs with `compression`:
+
+    swinging_door 0.01    keep points needed for linear interpolation
+                          between logged points to be within 0.01 of
+                          every value.
+    rate 2                log at most 2 values per second, keeping the
+                          extreme value and the final value for each
+                          period of 1 second.
+    percent 0.5           log values that change by at least 0.5% from
+                          the last logged value.
+    none                  log all values.
+
+Compression applies only to scalar floating point values, as for double
+and float PVs.  Integer values, as for enum, int, and status PVs, strings,
+and the first value after a value that cannot be compressed are logged
+exactly, so that every change of state is kept.
+"""
+from math import inf
+from numbers import Real, Integral
+
+COMPRESS_NONE = 'none'
+COMPRESS_SWINGING_DOOR = 'swinging_door'
+COMPRESS_RATE = 'rate'
+COMPRESS_PERCENT = 'percent'
+
+COMPRESS_ALIASES = {'sdt': COMPRESS_SWINGING_DOOR,
+                    'swingingdoor': COMPRESS_SWINGING_DOOR,
+                    'rate_limit': COMPRESS_RATE,
+                    'deadband': COMPRESS_PERCENT,
+                    'pct': COMPRESS_PERCENT}
+
+# time (sec) after which a held point is logged if no new values arrive
+QUIET_TIME = 2.0
+
+def is_scalar(value):
+    """whether a value is a scalar floating point value, that can be
+    compressed.  Integers (including bools and numpy integers) are not."""
+    return isinstance(value, Real) and not isinstance(value, Integral)
+
+
+class Compressor:
+    """base class for compression of (timestamp, value, char_value) points
+
+    Use `add(point)` for each new point, and `poll(now)` periodically.
+    Each returns a list of points to log.  Compressors are not
+    thread-safe: callers should hold a lock when using them.
+    """
+    mode = COMPRESS_NONE
+
+    def __init__(self, param=None, quiet_time=QUIET_TIME):
+        self.param = param
+        self.quiet_time = quiet_time
+        self.last = None
+        self.held = []
+        self.reset()
+
+    def __repr__(self):
+        return f"{self.mode} {self.param}"
+
+    def reset(self):
+        self.last = None
+        self.held = []
+
+    def add(self, point):
+        """add a point, returning list of points to log"""
+        if not is_scalar(point[1]):
+            out = self.held + [point]
+            self.reset()
+            return out
+        if self.last is None:
+            self.last = point
+            return [point]
+        return self.compress(point)
+
+    def compress(self, point):
+        return [point]
+
+    def poll(self, now):
+        """return held points, if no new values have arrived for a while"""
+        if len(self.held) > 0 and now > self.held[-1][0] + self.quiet_time:
+            return self.flush_held()
+        return []
+
+    def flush(self):
+        """return all held points"""
+        return self.flush_held()
+
+    def flush_held(self):
+        out = self.held
+        if len(out) > 0:
+            self.last = out[-1]
+        self.held = []
+        return out
+
+
+class SwingingDoorCompressor(Compressor):
+    """swinging door compression with error bound `param`: linear
+    interpolation between logged points is within `param` of all values.
+
+    Notes:
+       the range of slopes from the last logged point that stay within
+       the error bound of all held points (the 'doors') is kept.  When
+       no slope fits, the latest held point whose line from the last
+       logged point fits all points before it is logged, and the held
+       points after it are checked again.
+    """
+    mode = COMPRESS_SWINGING_DOOR
+
+    def reset(self):
+        Compressor.reset(self)
+        self.slope_lo, self.slope_hi, self.cand = -inf, inf, -1
+
+    def slopes(self, point):
+        """slope from last logged point, and range of slopes within
+        the error bound for a point"""
+        dt = point[0] - self.last[0]
+        dv = point[1] - self.last[1]
+        return dv/dt, (dv - self.param)/dt, (dv + self.param)/dt
+
+    def scan(self, points):
+        """range of slopes fitting all points, and index of last
+        point whose slope fits all points before it"""
+        slope_lo, slope_hi, cand = -inf, inf, -1
+        for i, point in enumerate(points):
+            slope, lo, hi = self.slopes(point)
+            if slope_lo <= slope <= slope_hi:
+                cand = i
+            slope_lo, slope_hi = max(slope_lo, lo), min(slope_hi, hi)
+        return slope_lo, slope_hi, cand
+
+    def compress(self, point):
+        if point[0] <= self.last[0]:
+            out = self.held + [point]
+            self.reset()
+            self.last = point
+            return out
+        slope, lo, hi = self.slopes(point)
+        if self.slope_lo <= slope <= self.slope_hi:
+            self.cand = len(self.held)
+        self.held.append(point)
+        self.slope_lo = max(self.slope_lo, lo)
+        self.slope_hi = min(self.slope_hi, hi)
+        out = []
+        while self.slope_lo > self.slope_hi:
+            out.append(self.held[self.cand])
+            self.last = self.held[self.cand]
+            self.held = self.held[self.cand+1:]
+            self.slope_lo, self.slope_hi, self.cand = self.scan(self.held)
+        return out
+
+    def flush_held(self):
+        out = []
+        while len(self.held) > 0:
+            final = self.held[-1]
+            slope_lo, slope_hi, cand = self.scan(self.held[:-1])
+            if slope_lo <= self.slopes(final)[0] <= slope_hi:
+                cand = len(self.held) - 1
+            out.append(self.held[cand])
+            self.last = self.held[cand]
+            self.held = self.held[cand+1:]
+        self.slope_lo, self.slope_hi, self.cand = -inf, inf, -1
+        return out
+
+
+class RateCompressor(Compressor):
+    """rate limit to at most `param` values per second: for each period
+    of 2/param seconds, the extreme value (furthest from the last logged
+    value) and the final value are logged."""
+    mode = COMPRESS_RATE
+
+    def reset(self):
+        Compressor.reset(self)
+        self.period_end = None
+
+    def compress(self, point):
+        out = []
+        if self.period_end is not None and point[0] >= self.period_end:
+            out = self.flush_held()
+        if self.period_end is None or point[0] >= self.period_end:
+            self.period_end = point[0] + 2.0/self.param
+        self.held.append(point)
+        return out
+
+    def poll(self, now):
+        if (self.period_end is not None and now > self.period_end and
+            len(self.held) > 0):
+            return self.flush_held()
+        return []
+
+    def flush_held(self):
+        held = self.held
+        self.held = []
+        self.period_end = None
+        if len(held) < 1:
+            return []
+        lastval = self.last[1]
+        extreme = max(held, key=lambda p: abs(p[1] - lastval))
+        out = [held[-1]]
+        if extreme is not held[-1]:
+            out.insert(0, extreme)
+        self.last = held[-1]
+        return out
+
+
+class PercentCompressor(Compressor):
+    """relative deadband: log values that differ from the last
+    logged value by at least `param` percent."""
+    mode = COMPRESS_PERCENT
+
+    def compress(self, point):
+        delta = abs(point[1] - self.last[1])
+        if delta > 0 and delta >= 0.01*self.param*abs(self.last[1]):
+            self.last = point
+            self.held = []
+            return [point]
+        # hold the latest value, so that the final value is logged
+        # if the value stops changing
+        self.held = [point]
+        return []
+
+    def poll(self, now):
+        # log a held value only if it differs from the last logged value
+        if len(self.held) > 0 and self.held[-1][1] == self.last[1]:
+            self.held = []
+        return Compressor.poll(self, now)
+
+
+COMPRESSORS = {COMPRESS_SWINGING_DOOR: SwingingDoorCompressor,
+               COMPRESS_RATE: RateCompressor,
+               COMPRESS_PERCENT: PercentCompressor}
+
+def make_compressor(spec):
+    """make Compressor from a compression specification string,
+    such as 'swinging_door 0.01', 'rate 2', or 'percent 0.5'
+
+    Returns:
+       Compressor, or None for no compression
+
+    Raises:
+       ValueError for an invalid specification
+    """
+    if spec in (None, '', 'None', '<auto>'):
+        return None
+    words = str(spec).strip().split()
+    mode = words[0].lower()
+    mode = COMPRESS_ALIASES.get(mode, mode)
+    if mode == COMPRESS_NONE:
+        return None
+    if mode not in COMPRESSORS:
+        raise ValueError(f"unknown compression mode '{words[0]}'")
+    if len(words) < 2:
+        raise ValueError(f"compression mode '{mode}' needs a value")
+    param = float(words[1])
+    if param <= 0:
+        raise ValueError(f"compression value for '{mode}' must be positive")
+    return COMPRESSORS[mode](param)
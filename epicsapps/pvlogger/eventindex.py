@@ -0,0 +1,181 @@
+#!/usr/bin/python
+"""
+time-ordered index of events for the PVs in a PVLOG folder
+
+The events for each PV -- logged events, and the values of enum PVs --
+are already in time order in the log file.  The events for all PVs are
+combined with a k-way merge of these per-PV streams, which is kept and
+extended as new data is read, so that finding the events for a time
+range and a set of PVs needs only a binary search.
+"""
+import heapq
+from operator import itemgetter
+from threading import Lock
+import numpy as np
+
+def sorted_events(events):
+    """events sorted by timestamp, or unchanged if already in order"""
+    for i in range(1, len(events)):
+        if events[i][0] < events[i-1][0]:
+            return sorted(events, key=itemgetter(0))
+    return events
+
+def event_stream(data, npts=0, nevents=0, label=None, all_values=False):
+    """time-ordered list of (timestamp, text) events for PV data
+
+    Arguments:
+       data (PVLogData):  data for PV
+       npts (int):  number of data points already used [0]
+       nevents (int): number of logged events already used [0]
+       label (str or None):  label for values, giving 'label = value' [None]
+       all_values (bool): whether to include values for non-enum PVs [False]
+
+    Returns:
+       list of (timestamp, text) for the logged events after `nevents`,
+       and for the values after `npts` for enum PVs or with `all_values`.
+    """
+    events = sorted_events(data.events[nevents:])
+    dtype = data.attrs.get('type', '')
+    if not (all_values or 'enum' in dtype) or len(data.timestamps) <= npts:
+        return events
+    enumstrs = data.attrs.get('enum_strs', None)
+    if 'enum' not in dtype:
+        enumstrs = None
+    values = []
+    for i in range(npts, len(data.timestamps)):
+        cval = data.char_values[i]
+        if enumstrs is not None:
+            cval = enumstrs.get(data.values[i], cval)
+        if label is not None:
+            cval = f'{label} = {cval}'
+        values.append((float(data.timestamps[i]), cval))
+    return list(merge_events([events, sorted_events(values)]))
+
+def merge_events(streams):
+    """k-way merge of time-ordered event streams, as an iterator
+    of events in time order"""
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+class EventIndex:
+    """time-ordered index of events for many PVs
+
+    Use `update(pvname, data)` to add or update the events for a PV, and
+    `query(tstart, tstop, pvnames)` to get events in time order.
+
+    Notes:
+       events added to the end of the data for a PV are merged into the
+       index when they are all later than the indexed events.  Otherwise,
+       the index is rebuilt by merging the event streams for all PVs.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.pvnames = []
+        self.pvcodes = {}
+        self.streams = {}
+        self.state = {}
+        self.pending = []
+        self.stale = False
+        self.times = np.zeros(0, dtype='f8')
+        self.codes = np.zeros(0, dtype='i4')
+        self.texts = []
+
+    def __len__(self):
+        with self.lock:
+            self._merge()
+            return len(self.times)
+
+    def update(self, pvname, data, **kws):
+        """add or update events for a PV from its PVLogData.
+        Keyword arguments are passed to event_stream()."""
+        if data is None:
+            return
+        npts, nevents = len(data.timestamps), len(data.events)
+        with self.lock:
+            if pvname not in self.pvcodes:
+                self.pvcodes[pvname] = len(self.pvnames)
+                self.pvnames.append(pvname)
+            code = self.pvcodes[pvname]
+            prev = self.state.get(pvname, None)
+            if (prev is not None and prev[0] is data and prev[1] is data.events
+                and npts >= prev[2] and nevents >= prev[3]):
+                if npts == prev[2] and nevents == prev[3]:
+                    return
+                new = event_stream(data, npts=prev[2], nevents=prev[3], **kws)
+                stream = self.streams[pvname]
+                if len(stream) > 0 and len(new) > 0 and new[0][0] < stream[-1][0]:
+                    self.streams[pvname] = sorted_events(stream + new)
+                    self.stale = True
+                else:
+                    stream.extend(new)
+                    self.pending.append((code, new))
+            else:
+                self.streams[pvname] = event_stream(data, **kws)
+                self.stale = True
+            self.state[pvname] = (data, data.events, npts, nevents)
+
+    def remove(self, pvname):
+        """remove events for a PV"""
+        with self.lock:
+            if pvname in self.streams:
+                self.streams.pop(pvname)
+                self.state.pop(pvname)
+                self.stale = True
+
+    def _coded(self, code, stream):
+        return ((ts, code, text) for ts, text in stream)
+
+    def _merge(self):
+        """merge pending events into the index, rebuilding if needed"""
+        if not self.stale and len(self.pending) > 0:
+            new = list(merge_events([self._coded(code, stream)
+                                     for code, stream in self.pending]))
+            if len(new) > 0 and len(self.times) > 0 and new[0][0] < self.times[-1]:
+                self.stale = True
+            elif len(new) > 0:
+                times, codes, texts = zip(*new)
+                self.times = np.concatenate((self.times, np.array(times, dtype='f8')))
+                self.codes = np.concatenate((self.codes, np.array(codes, dtype='i4')))
+                self.texts.extend(texts)
+        self.pending = []
+        if not self.stale:
+            return
+        self.stale = False
+        merged = list(merge_events([self._coded(self.pvcodes[pvname], stream)
+                                    for pvname, stream in self.streams.items()]))
+        if len(merged) < 1:
+            self.times = np.zeros(0, dtype='f8')
+            self.codes = np.zeros(0, dtype='i4')
+            self.texts = []
+            return
+        times, codes, texts = zip(*merged)
+        self.times = np.array(times, dtype='f8')
+        self.codes = np.array(codes, dtype='i4')
+        self.texts = list(texts)
+
+    def query(self, tstart=None, tstop=None, pvnames=None):
+        """events in a time range for a set of PVs
+
+        Arguments:
+           tstart (float or None): start time [None, for first event]
+           tstop (float or None):  stop time [None, for last event]
+           pvnames (list or None): PV names [None, for all PVs]
+
+        Returns:
+           list of (timestamp, pvname, text), in time order
+        """
+        with self.lock:
+            self._merge()
+            i0, i1 = 0, len(self.times)
+            if tstart is not None:
+                i0 = int(np.searchsorted(self.times, tstart, side='left'))
+            if tstop is not None:
+                i1 = int(np.searchsorted(self.times, tstop, side='right'))
+            idx = np.arange(i0, max(i0, i1))
+            if pvnames is not None:
+                want = [self.pvcodes[p] for p in pvnames if p in self.pvcodes]
+                idx = idx[np.isin(self.codes[i0:i1], want)]
+            times, codes, texts = self.times, self.codes, self.texts
+            pvnames = self.pvnames
+            return [(float(times[i]), pvnames[codes[i]], texts[i])
+                    for i in idx.tolist()]
@@ -16,36 +16,45 @@ def dtformat(ts):
     return dt.isoformat(sep=' ', timespec='milliseconds')
 
 class EventDataModel(dv.DataViewIndexListModel):
-    def __init__(self, event_data=None, dt1=None, dt2=None):
+    def __init__(self, events=None, dt1=None, dt2=None, pvdescs=None):
         dv.DataViewIndexListModel.__init__(self, 0)
-        self.event_data = event_data
+        self.events = events
+        self.pvdescs = pvdescs
         self.pvcolors = {}
         self.dt1 = dt1
         self.dt2 = dt2
         self.set_data()
 
-    def set_data(self, event_data=None, dt1=None, dt2=None):
-        if event_data is not None:
-            self.event_data = event_data
+    def set_data(self, events=None, dt1=None, dt2=None, pvdescs=None):
+        """set table data from a time-ordered list of (timestamp, pvname, text)
+        events, with pvdescs a dict of PV descriptions for PV names"""
+        if events is not None:
+            self.events = events
         if dt1 is not None:
             self.dt1 = dt1
         if dt2 is not None:
             self.dt2 = dt2
+        if pvdescs is not None:
+            self.pvdescs = pvdescs
         self.data = []
         self.pvcolors = {}
-        if self.event_data is None or self.dt1 is None or self.dt2 is None:
+        if self.events is None or self.dt1 is None or self.dt2 is None:
             return
+        if self.pvdescs is None:
+            self.pvdescs = {}
         tmin = self.dt1.timestamp()
         tmax = self.dt2.timestamp()
         ipv = 0
-        for pvdesc, dat in self.event_data.items():
-            if pvdesc not in self.pvcolors:
-                self.pvcolors[pvdesc] = COLORS[ipv]
-                ipv  = (ipv+1) % len(COLORS)
-            for ts, cval in dat.events:
-                if ts >= tmin and ts <= tmax:
-                    self.data.append([pvdesc, dat.pvname, dtformat(ts), cval])
-        self.data = sorted(self.data, key=lambda x: x[2])
+        for pvname, pvdesc in self.pvdescs.items():
+            self.pvcolors[pvdesc] = COLORS[ipv]
+            ipv  = (ipv+1) % len(COLORS)
+        for ts, pvname, cval in self.events:
+            if ts >= tmin and ts <= tmax:
+                pvdesc = self.pvdescs.get(pvname, pvname)
+                if pvdesc not in self.pvcolors:
+                    self.pvcolors[pvdesc] = COLORS[ipv]
+                    ipv  = (ipv+1) % len(COLORS)
+                self.data.append([pvdesc, pvname, dtformat(ts), cval])
         self.Reset(len(self.data))
 
     def ClearAll(self):
@@ -101,8 +110,8 @@ class EventTablePanel(wx.Panel) :
         mainsizer.Add(spanel, 1, wx.GROW|wx.ALL, 5)
         pack(self, mainsizer)
 
-    def set_data(self, event_data, dt1, dt2):
-        self.model.set_data(event_data, dt1, dt2)
+    def set_data(self, events, dt1, dt2, pvdescs=None):
+        self.model.set_data(events, dt1, dt2, pvdescs=pvdescs)
 
     def onClearAll(self, event=None):
         self.model.ClearAll()
@@ -122,5 +131,5 @@ class EventTableFrame(wx.Frame) :
         self.Show()
         self.Raise()
 
-    def set_data(self, event_data, dt1, dt2):
-        self.panel.set_data(event_data, dt1, dt2)
+    def set_data(self, events, dt1, dt2, pvdescs=None):
+        self.panel.set_data(events, dt1, dt2, pvdescs=pvdescs)
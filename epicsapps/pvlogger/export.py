@@ -0,0 +1,230 @@
+#!/usr/bin/python
+"""
+export PVLogger data sampled on a regular time grid
+
+The time grid is walked in chunks: for each chunk, the last known value
+of every PV is found at each time and the rows are written to the output
+file, so that memory use does not grow with the length of the export.
+"""
+import csv
+from abc import ABC, abstractmethod
+from pathlib import Path
+import numpy as np
+from pyshortcuts import isotime
+
+HAS_H5PY = False
+try:
+    import h5py
+    HAS_H5PY = True
+except ImportError:
+    pass
+
+HAS_PYARROW = False
+try:
+    import pyarrow
+    import pyarrow.parquet
+    HAS_PYARROW = True
+except ImportError:
+    pass
+
+EXPORT_TSV = 'tsv'
+EXPORT_CSV = 'csv'
+EXPORT_PARQUET = 'parquet'
+EXPORT_HDF5 = 'hdf5'
+
+EXPORT_SUFFIXES = {'.tsv': EXPORT_TSV, '.txt': EXPORT_TSV, '.csv': EXPORT_CSV,
+                   '.parquet': EXPORT_PARQUET, '.h5': EXPORT_HDF5,
+                   '.hdf5': EXPORT_HDF5}
+CHUNK_SIZE = 10000
+
+def export_formats():
+    """list of available export formats"""
+    formats = [EXPORT_TSV, EXPORT_CSV]
+    if HAS_PYARROW:
+        formats.append(EXPORT_PARQUET)
+    if HAS_H5PY:
+        formats.append(EXPORT_HDF5)
+    return formats
+
+def export_format(filename):
+    """export format for a file name, from its extension"""
+    return EXPORT_SUFFIXES.get(Path(filename).suffix.lower(), EXPORT_TSV)
+
+def uses_strings(data):
+    """whether PVLogData values are exported as char values
+    (strings, enums, and ints) or as formatted numbers (floats)"""
+    return 'double' not in data.attrs.get('type', 'time_char')
+
+
+class TimeSeriesWriter(ABC):
+    """base class for writing rows of time-sampled data
+
+    Arguments:
+       filename (str):  name of output file
+       pvnames (list):  list of PV names
+       labels (list):  list of PV descriptions
+       numeric (list):  whether each PV has numeric values
+    """
+    def __init__(self, filename, pvnames, labels, numeric):
+        self.filename = filename
+        self.pvnames = pvnames
+        self.labels = labels
+        self.numeric = numeric
+
+    @abstractmethod
+    def write_chunk(self, times, columns):
+        """write a chunk of data: an array of timestamps and a list of
+        columns, one for each PV, of numbers or strings"""
+
+    def close(self):
+        pass
+
+
+class TextWriter(TimeSeriesWriter):
+    """write tab-separated text, as for the PVLogger viewer"""
+    def __init__(self, filename, pvnames, labels, numeric, delim='\t '):
+        TimeSeriesWriter.__init__(self, filename, pvnames, labels, numeric)
+        self.delim = delim
+        self.fh = open(filename, 'w', encoding='utf-8')
+        head0 = ['# Date/Time', 'Timestamp']
+        head1 = ['# Date/Time', 'Timestamp']
+        head0.extend(labels)
+        head1.extend(pvnames)
+        self.fh.write('\n'.join([delim.join(head0), delim.join(head1), '']))
+
+    def write_chunk(self, times, columns):
+        rows = zip([isotime(ts) for ts in times.tolist()],
+                   [f"{ts:.1f}" for ts in times.tolist()], *columns)
+        self.fh.write(''.join([f"{self.delim.join(row)}\n" for row in rows]))
+
+    def close(self):
+        self.fh.close()
+
+
+class CSVWriter(TimeSeriesWriter):
+    """write comma-separated values"""
+    def __init__(self, filename, pvnames, labels, numeric):
+        TimeSeriesWriter.__init__(self, filename, pvnames, labels, numeric)
+        self.fh = open(filename, 'w', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.fh)
+        self.writer.writerow(['Date/Time', 'Timestamp'] + list(labels))
+        self.writer.writerow(['Date/Time', 'Timestamp'] + list(pvnames))
+
+    def write_chunk(self, times, columns):
+        self.writer.writerows(zip([isotime(ts) for ts in times.tolist()],
+                                  [f"{ts:.1f}" for ts in times.tolist()],
+                                  *columns))
+
+    def close(self):
+        self.fh.close()
+
+
+class ParquetWriter(TimeSeriesWriter):
+    """write Parquet file, with numeric PVs as float64 columns"""
+    def __init__(self, filename, pvnames, labels, numeric):
+        TimeSeriesWriter.__init__(self, filename, pvnames, labels, numeric)
+        fields = [pyarrow.field('timestamp', pyarrow.float64())]
+        for pvname, label, isnum in zip(pvnames, labels, numeric):
+            dtype = pyarrow.float64() if isnum else pyarrow.string()
+            fields.append(pyarrow.field(pvname, dtype,
+                                        metadata={'description': label}))
+        self.schema = pyarrow.schema(fields)
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def write_chunk(self, times, columns):
+        arrays = [pyarrow.array(times)]
+        for col, isnum in zip(columns, self.numeric):
+            arrays.append(pyarrow.array(col if isnum else list(col)))
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays,
+                                                          schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class HDF5Writer(TimeSeriesWriter):
+    """write HDF5 file, with one extendable dataset per PV"""
+    def __init__(self, filename, pvnames, labels, numeric):
+        TimeSeriesWriter.__init__(self, filename, pvnames, labels, numeric)
+        self.h5file = h5py.File(filename, 'w')
+        self.h5file.attrs['source'] = 'epicsapps pvlogger'
+        self.datasets = [self.h5file.create_dataset('timestamp', shape=(0,),
+                                                    maxshape=(None,), dtype='f8',
+                                                    chunks=True)]
+        for pvname, label, isnum in zip(pvnames, labels, numeric):
+            dtype = 'f8' if isnum else h5py.string_dtype()
+            dset = self.h5file.create_dataset(pvname.replace('/', '_'), shape=(0,),
+                                              maxshape=(None,), dtype=dtype,
+                                              chunks=True)
+            dset.attrs['pvname'] = pvname
+            dset.attrs['description'] = label
+            self.datasets.append(dset)
+
+    def write_chunk(self, times, columns):
+        npts = len(times)
+        for dset, col in zip(self.datasets, [times] + list(columns)):
+            n0 = dset.shape[0]
+            dset.resize((n0 + npts,))
+            dset[n0:] = col
+
+    def close(self):
+        self.h5file.close()
+
+
+WRITERS = {EXPORT_TSV: TextWriter, EXPORT_CSV: CSVWriter,
+           EXPORT_PARQUET: ParquetWriter, EXPORT_HDF5: HDF5Writer}
+
+def export_timeseries(datasets, filename, tstart, tstop, tstep, form=None,
+                      chunksize=CHUNK_SIZE, on_progress=None):
+    """export last known values of PVs sampled at a fixed time step
+
+    Arguments:
+       datasets (dict):  dict of {pvname: (label, PVLogData)}
+       filename (str):  name of output file
+       tstart (float):  first timestamp
+       tstop (float):  last timestamp
+       tstep (float):  time step in seconds
+       form (str or None): one of 'tsv', 'csv', 'parquet', 'hdf5' [None]
+       chunksize (int):  number of times to sample and write at once [10000]
+       on_progress (callable or None): function called after each chunk
+                    is written, as on_progress(nwritten, ntotal) [None]
+
+    Returns:
+       number of rows written
+
+    Notes:
+       1. with form=None, the format is taken from the file extension,
+          and is 'tsv' if the extension is not recognized.
+       2. for text formats, floating point PVs are written with gformat
+          and others with their char values.  For Parquet and HDF5,
+          numeric PVs are written as float64 values, and others as strings.
+    """
+    if form is None:
+        form = export_format(filename)
+    if form not in export_formats():
+        raise ValueError(f"export format '{form}' is not available")
+
+    pvnames = list(datasets.keys())
+    labels = [datasets[pvname][0] for pvname in pvnames]
+    pvdata = [datasets[pvname][1] for pvname in pvnames]
+    binary = form in (EXPORT_PARQUET, EXPORT_HDF5)
+    numeric = [binary and dat.is_numeric for dat in pvdata]
+
+    ntimes = max(0, int(np.floor((tstop - tstart)/tstep + 1.e-9)) + 1)
+    writer = WRITERS[form](filename, pvnames, labels, numeric)
+    try:
+        for i0 in range(0, ntimes, chunksize):
+            times = tstart + tstep*np.arange(i0, min(ntimes, i0+chunksize))
+            columns = []
+            for dat, isnum in zip(pvdata, numeric):
+                if isnum:
+                    columns.append(dat.sample(times)[0])
+                else:
+                    columns.append(dat.format_samples(dat.index_at(times),
+                                                      as_string=uses_strings(dat)))
+            writer.write_chunk(times, columns)
+            if on_progress is not None:
+                on_progress(i0 + len(times), ntimes)
+    finally:
+        writer.close()
+    return ntimes
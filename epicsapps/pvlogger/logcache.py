@@ -0,0 +1,151 @@
+#!/usr/bin/python
+"""
+cache of parsed log file data for PVLOG folders
+
+Parsed data for each log file is saved to a numpy .npz file in the
+_PVLOG_cache folder, next to the log files.  Each cache file records the
+size and modification time of the log file (and binary data file, if
+used) it was made from, and is used only if these have not changed.
+"""
+import os
+import json
+from pathlib import Path
+import numpy as np
+
+from .binarylog import binary_datafile
+
+CACHE_DIR = '_PVLOG_cache'
+CACHE_VERSION = 3
+
+def cache_file(logfile):
+    """name of cache file for a log file"""
+    logfile = Path(logfile)
+    return Path(logfile.parent, CACHE_DIR, f'{logfile.name}.npz')
+
+def cache_key(logfile):
+    """key for validating cache: size and modification time of
+    log file and binary data file"""
+    key = {'version': CACHE_VERSION}
+    for fname in (Path(logfile), binary_datafile(logfile)):
+        if fname.exists():
+            stat = os.stat(fname)
+            key[fname.name] = [stat.st_size, stat.st_mtime]
+    return key
+
+def pack_strings(strings):
+    """pack a sequence of single-line strings to a uint8 array"""
+    return np.frombuffer('\n'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+def unpack_strings(buff, npts):
+    """unpack uint8 array from pack_strings() to list of strings"""
+    if npts < 1:
+        return []
+    return buff.tobytes().decode('utf-8').split('\n')
+
+def save_cached_data(data, logfile, key=None):
+    """save parsed PVLogData for a log file to the cache
+
+    Arguments:
+       data (PVLogData):  parsed data
+       logfile (str or Path):  name of log file
+       key (dict or None):  cache key, as taken before the log file was read.
+
+    Returns:
+       True if the cache file was written, False otherwise
+
+    Notes:
+       char values are saved in their compact form: either the char
+       values that differ from formatted numeric values, or integer
+       codes into a table of strings.
+    """
+    if key is None:
+        key = cache_key(logfile)
+    cfile = cache_file(logfile)
+    attrs = dict(data.attrs)
+    enum_strs = attrs.pop('enum_strs', None)
+    cvals = data.char_values
+    meta = {'key': key, 'pvname': data.pvname, 'is_numeric': data.is_numeric,
+            'offset': data.offset, 'index': data.index,
+            'headers': data.headers, 'attrs': attrs,
+            'char_mode': {'FormattedValues': 'formatted',
+                          'EncodedValues': 'encoded'}.get(cvals.__class__.__name__,
+                                                          'strings')}
+    if enum_strs is not None:
+        meta['enum_strs'] = [[k, v] for k, v in enum_strs.items()]
+
+    arrays = {'timestamps': np.asarray(data.timestamps, dtype='f8'),
+              'values': np.asarray(data.values, dtype='f8'),
+              'event_times': np.array([e[0] for e in data.events], dtype='f8'),
+              'event_text': np.array([e[1] for e in data.events], dtype=str),
+              'event_kind': np.array([isinstance(e, list) for e in data.events],
+                                     dtype=bool)}
+    if meta['char_mode'] == 'formatted':
+        meta['is_int'] = cvals.is_int
+        meta['precision'] = cvals.precision
+        arrays['override_index'] = np.array(list(cvals.overrides.keys()),
+                                            dtype='i8')
+        arrays['override_text'] = pack_strings(cvals.overrides.values())
+    elif meta['char_mode'] == 'encoded':
+        meta['ntable'] = len(cvals.table)
+        arrays['codes'] = np.array(cvals.codes, dtype='i4')
+        arrays['table'] = pack_strings(cvals.table)
+    else:
+        arrays['char_values'] = pack_strings(cvals)
+    try:
+        cfile.parent.mkdir(exist_ok=True)
+        tmpfile = cfile.with_suffix('.tmp.npz')
+        np.savez(tmpfile, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmpfile, cfile)
+    except OSError:
+        return False
+    return True
+
+def load_cached_data(logfile):
+    """load parsed data for a log file from the cache
+
+    Returns:
+       dict of PVLogData fields, or None if there is no valid cache
+    """
+    cfile = cache_file(logfile)
+    if not cfile.exists():
+        return None
+    try:
+        with np.load(cfile, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if meta.get('key', None) != json.loads(json.dumps(cache_key(logfile))):
+                return None
+            arrays = {name: npz[name] for name in npz.files if name != 'meta'}
+    except (OSError, ValueError, KeyError):
+        return None
+
+    attrs = meta['attrs']
+    if 'enum_strs' in meta:
+        attrs['enum_strs'] = {int(k): v for k, v in meta['enum_strs']}
+    events = []
+    for ts, txt, kind in zip(arrays['event_times'].tolist(),
+                             arrays['event_text'].tolist(),
+                             arrays['event_kind'].tolist()):
+        events.append([ts, txt] if kind else (ts, txt))
+    logfile = Path(logfile).absolute()
+    out = {'pvname': meta['pvname'], 'filename': logfile.name,
+           'path': logfile.as_posix(), 'is_numeric': meta['is_numeric'],
+           'headers': meta['headers'], 'attrs': attrs,
+           'timestamps': arrays['timestamps'], 'values': arrays['values'],
+           'char_values': None,
+           'events': events, 'datetimes': None, 'mpldates': None,
+           'offset': meta['offset'], 'index': meta['index']}
+    if meta['char_mode'] == 'formatted':
+        index = arrays['override_index'].tolist()
+        text = unpack_strings(arrays['override_text'], len(index))
+        out['formatted'] = {'enum_strs': attrs.get('enum_strs', None),
+                            'is_int': meta['is_int'],
+                            'precision': meta['precision'],
+                            'overrides': dict(zip(index, text))}
+    elif meta['char_mode'] == 'encoded':
+        out['encoded'] = {'codes': arrays['codes'],
+                          'table': unpack_strings(arrays['table'],
+                                                  meta['ntable'])}
+    else:
+        out['char_values'] = unpack_strings(arrays['char_values'],
+                                            len(out['values']))
+    return out
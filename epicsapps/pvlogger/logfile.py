@@ -3,27 +3,43 @@
   read log file column file
 """
 import os
-import random
+import mmap
 import time
 import tomli
 import yaml
 from pathlib import Path
-from dataclasses import dataclass
+from functools import partial
+from array import array
+from math import log10
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from dateutil import parser as dateparser
 import pytz
-from multiprocessing import Process, Queue
+from threading import Lock, Event
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from pyshortcuts import debugtimer, gformat
 
 from ..utils.textfile import read_textfile
 
+from .binarylog import (read_records, binary_datafile, STORAGE_BINARY,
+                        read_waveforms, waveform_record_dtype)
+from .logcache import cache_key, save_cached_data, load_cached_data
+from .logindex import read_time_index, index_range
+from .segments import read_filelist, segment_path, is_compressed, read_compressed
+from .eventindex import EventIndex, event_stream, merge_events, sorted_events
+
 from .pvlogger import (motor_fields, TIMESTAMP_FILE,
                        CONF_FILE, FILELIST_FILE, INSTRUMENTS_FILE)
 
 TINY = 1.e-7
 MAX_FILESIZE = 700*1024*1024  # 700 Mb limit
+PREFETCH_MEMORY = 512*1024*1024  # memory budget for reading data in background
+DATA_MEMORY_FACTOR = 4  # estimated memory for parsed data / size of log file
 COMMENTCHARS = '#;%*!$'
+CHUNK_BYTES = 8*1024*1024  # bytes of log file to tokenize at a time
+HEADER_BYTES = 256*1024  # bytes of log file to search for header lines
 
 
 TZONE = str(datetime.now(timezone.utc).astimezone().tzinfo)
@@ -41,6 +57,245 @@ def is_int(s):
     except:
         return False
 
+class FormattedValues:
+    """sequence of char values for numeric data, formatted on demand
+
+    Arguments:
+       values (ndarray):  numeric values
+       enum_strs (dict or None):  map of enum index to string [None]
+       is_int (bool):  whether values are integers [False]
+       precision (int or None): precision for floating point values [None]
+       overrides (dict or None): map of index to char value, for char
+                  values that differ from the formatted value [None]
+    """
+    def __init__(self, values, enum_strs=None, is_int=False, precision=None,
+                 overrides=None):
+        self.values = values
+        self.enum_strs = enum_strs
+        self.is_int = is_int
+        self.precision = precision
+        self.overrides = {} if overrides is None else overrides
+
+    def format(self, val):
+        """format value as for Epics char_value"""
+        if self.enum_strs is not None:
+            return self.enum_strs.get(int(val), f'{int(val)}')
+        if self.is_int:
+            return f'{int(val)}'
+        if self.precision is not None:
+            try:
+                fmt = 'f'
+                if 4 < abs(int(log10(abs(val + 1.e-9)))):
+                    fmt = 'g'
+                return f'{val:.{self.precision}{fmt}}'
+            except (ValueError, OverflowError):
+                return str(val)
+        return gformat(val).strip()
+
+    def format_all(self, values):
+        """format a sequence of values"""
+        values = np.asarray(values, dtype='f8')
+        if self.enum_strs is not None or self.is_int:
+            return [self.format(val) for val in values.astype(int).tolist()]
+        if self.precision is None:
+            return [self.format(val) for val in values.tolist()]
+        prec = self.precision
+        with np.errstate(divide='ignore', invalid='ignore'):
+            use_g = 4 < np.abs(np.trunc(np.log10(np.abs(values + 1.e-9))))
+        if not np.all(np.isfinite(values)):
+            return [self.format(val) for val in values.tolist()]
+        return [f'{val:.{prec}g}' if g else f'{val:.{prec}f}'
+                for val, g in zip(values.tolist(), use_g.tolist())]
+
+    def find_overrides(self, char_values, start=0):
+        """save char values that differ from formatted values,
+        for values starting at index `start`"""
+        fvals = self.format_all(self.values[start:start+len(char_values)])
+        for i, (cval, fval) in enumerate(zip(char_values, fvals), start=start):
+            if cval != fval:
+                self.overrides[i] = cval
+
+    def append(self, cval):
+        self.find_overrides([cval], start=len(self.values)-1)
+
+    def extend(self, char_values):
+        char_values = list(char_values)
+        self.find_overrides(char_values, start=len(self.values)-len(char_values))
+
+    def truncate(self, npts):
+        """remove char values after the first npts values"""
+        for i in [i for i in self.overrides if i >= npts]:
+            self.overrides.pop(i)
+
+    def select(self, i0, i1):
+        """FormattedValues for values i0 to i1 (exclusive)"""
+        overrides = {i-i0: cval for i, cval in self.overrides.items()
+                     if i0 <= i < i1}
+        return FormattedValues(self.values[i0:i1], enum_strs=self.enum_strs,
+                               is_int=self.is_int, precision=self.precision,
+                               overrides=overrides)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i in self.overrides:
+            return self.overrides[i]
+        return self.format(self.values[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class EncodedValues:
+    """sequence of char values, stored as an array of integer codes
+    into a table of unique strings
+
+    Arguments:
+       char_values (sequence or None):  char values [None]
+    """
+    def __init__(self, char_values=None, codes=None, table=None):
+        self.codes = array('i')
+        if codes is not None:
+            self.codes.frombytes(np.asarray(codes, dtype=np.intc).tobytes())
+        self.table = [] if table is None else list(table)
+        self.lookup = {cval: i for i, cval in enumerate(self.table)}
+        if char_values is not None:
+            self.extend(char_values)
+
+    def append(self, cval):
+        code = self.lookup.get(cval, None)
+        if code is None:
+            code = self.lookup[cval] = len(self.table)
+            self.table.append(cval)
+        self.codes.append(code)
+
+    def extend(self, char_values):
+        for cval in char_values:
+            self.append(cval)
+
+    def truncate(self, npts):
+        """keep only the first npts values"""
+        del self.codes[npts:]
+
+    def select(self, i0, i1):
+        """EncodedValues for values i0 to i1 (exclusive)"""
+        return EncodedValues(codes=self.codes[i0:i1], table=self.table)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.table[c] for c in self.codes[i]]
+        return self.table[self.codes[i]]
+
+    def __iter__(self):
+        for code in self.codes:
+            yield self.table[code]
+
+
+class LineCharValues:
+    """sequence of char values for log file data lines, extracted on demand
+
+    Arguments:
+       lines (list):  text lines of 'timestamp value char_value'
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self.extra = []
+
+    def extract(self, line):
+        words = line.split(maxsplit=2)
+        return words[-1].strip()
+
+    def append(self, cval):
+        self.extra.append(cval)
+
+    def extend(self, char_values):
+        self.extra.extend(char_values)
+
+    def truncate(self, npts):
+        """keep only the first npts values"""
+        if npts < len(self.lines):
+            self.lines = self.lines[:npts]
+            self.extra = []
+        else:
+            self.extra = self.extra[:npts-len(self.lines)]
+
+    def select(self, i0, i1):
+        """LineCharValues for values i0 to i1 (exclusive)"""
+        nlines = len(self.lines)
+        out = LineCharValues(self.lines[i0:i1])
+        out.extra = self.extra[max(0, i0-nlines):max(0, i1-nlines)]
+        return out
+
+    def __len__(self):
+        return len(self.lines) + len(self.extra)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if i >= len(self.lines):
+            return self.extra[i-len(self.lines)]
+        return self.extract(self.lines[i])
+
+    def __iter__(self):
+        for line in self.lines:
+            yield self.extract(line)
+        for cval in self.extra:
+            yield cval
+
+
+def formatted_values(values, attrs):
+    """FormattedValues for numeric values, formatted as for the type,
+    precision, and enum strings in log file attributes"""
+    dtype = attrs.get('type', 'time_double')
+    int_type = ('int' in dtype or 'long' in dtype or 'short' in dtype)
+    precision = None
+    if 'double' in dtype or 'float' in dtype:
+        precision = attrs.get('precision', None)
+        precision = int(precision) if is_int(precision) else None
+    return FormattedValues(values, enum_strs=attrs.get('enum_strs', None),
+                           is_int=int_type, precision=precision)
+
+def compact_char_values(values, char_values, attrs):
+    """compact char values, keeping only char values that differ from
+    formatted numeric values, or encoding them into a table of strings
+
+    Arguments:
+       values (ndarray): numeric values
+       char_values (sequence): char values
+       attrs (dict):  log file attributes, for type, precision, and enum strings
+
+    Returns:
+       FormattedValues or EncodedValues
+    """
+    if isinstance(char_values, (FormattedValues, EncodedValues)):
+        return char_values
+    fvals = formatted_values(values, attrs)
+    if isinstance(char_values, LineCharValues):
+        char_values = ([line.split(maxsplit=2)[-1].strip() for line in char_values.lines]
+                       + char_values.extra)
+    else:
+        char_values = list(char_values)
+    # check a sample of values first, as most will differ if any do
+    nsample = min(len(char_values), 64)
+    fvals.find_overrides(char_values[:nsample])
+    if len(fvals.overrides) <= nsample//4:
+        fvals.find_overrides(char_values[nsample:], start=nsample)
+        if len(fvals.overrides) <= len(char_values)//4:
+            return fvals
+    return EncodedValues(char_values)
+
+
 @dataclass
 class PVLogData:
     pvname: str
@@ -49,16 +304,209 @@ class PVLogData:
     is_numeric: bool
     headers: []
     attrs: []
-    timestamps: []
+    timestamps: np.ndarray
     datetimes: []
     mpldates: []
-    values: []
+    values: np.ndarray
     char_values: []
     events: []
+    offset: int = 0
+    index: int = -1
+    _tbuf: np.ndarray = field(default=None, init=False, repr=False)
+    _vbuf: np.ndarray = field(default=None, init=False, repr=False)
+    _wfm_records: np.ndarray = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        self.timestamps = np.asarray(self.timestamps, dtype='f8')
+        self.values = np.asarray(self.values, dtype='f8')
 
     def __repr__(self):
         return f"PVLogData(pv='{self.pvname}', file='{self.filename}', npts={len(self.timestamps)})"
 
+    def append(self, timestamp, value, char_value):
+        """append a data point"""
+        self.extend([timestamp], [value], [char_value], [])
+
+    def extend(self, timestamps, values, char_values, events):
+        """extend data with new data points and events
+
+        Notes:
+           timestamps and values are kept in buffers that grow
+           by doubling in size, so that repeated appends are fast.
+        """
+        n, nnew = len(self.timestamps), len(timestamps)
+        if (self._tbuf is None or len(self._tbuf) < n + nnew or
+            self.timestamps.base is not self._tbuf or
+            self.values.base is not self._vbuf):
+            size = max(2*n, n + nnew, 64)
+            self._tbuf = np.empty(size, dtype='f8')
+            self._vbuf = np.empty(size, dtype='f8')
+            self._tbuf[:n] = self.timestamps
+            self._vbuf[:n] = self.values
+        self._tbuf[n:n+nnew] = timestamps
+        self._vbuf[n:n+nnew] = values
+        self.timestamps = self._tbuf[:n+nnew]
+        self.values = self._vbuf[:n+nnew]
+        if isinstance(self.char_values, FormattedValues):
+            self.char_values.values = self.values
+        self.char_values.extend(char_values)
+        self.events.extend(events)
+        self.datetimes = self.mpldates = None
+
+    def truncate(self, npts):
+        """keep only the first npts data points"""
+        self.timestamps = self.timestamps[:npts]
+        self.values = self.values[:npts]
+        if isinstance(self.char_values, FormattedValues):
+            self.char_values.values = self.values
+        if isinstance(self.char_values, list):
+            del self.char_values[npts:]
+        else:
+            self.char_values.truncate(npts)
+        self.datetimes = self.mpldates = None
+
+    def to_arrays(self):
+        """convert to compact numpy arrays and char values,
+        as for sending data between processes"""
+        self.timestamps = np.array(self.timestamps, dtype='f8')
+        self.values = np.array(self.values, dtype='f8')
+        self._tbuf = self._vbuf = None
+        self.char_values = compact_char_values(self.values, self.char_values,
+                                               self.attrs)
+        if isinstance(self.char_values, FormattedValues):
+            self.char_values.values = self.values
+        return self
+
+    def index_at(self, timestamps):
+        """index of the last data point at or before each timestamp
+
+        Arguments:
+           timestamps (float or sequence):  timestamps, in increasing order
+
+        Returns:
+           integer array of indices, with -1 for timestamps before
+           the first data point
+        """
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype='f8'))
+        return np.searchsorted(self.timestamps, timestamps, side='right') - 1
+
+    def sample(self, timestamps):
+        """last known values at timestamps
+
+        Arguments:
+           timestamps (float or sequence):  timestamps, in increasing order
+
+        Returns:
+           tuple of (values, index) arrays, with values of NaN and index
+           of -1 for timestamps before the first data point
+        """
+        index = self.index_at(timestamps)
+        values = np.full(len(index), np.nan)
+        valid = index >= 0
+        values[valid] = self.values[index[valid]]
+        return values, index
+
+    def format_samples(self, index, as_string=True):
+        """format values for an index array from index_at()
+
+        Arguments:
+           index (ndarray):  indices of data points
+           as_string (bool):  whether to use char values (True) or
+                   format numeric values (False) [True]
+
+        Returns:
+           object array of strings, with '' for index of -1
+
+        Notes:
+           each distinct data point is formatted only once.
+        """
+        uindex, inverse = np.unique(np.asarray(index), return_inverse=True)
+        if as_string:
+            strs = [self.char_values[i] if i >= 0 else ''
+                    for i in uindex.tolist()]
+        else:
+            strs = [gformat(self.values[i]) if i >= 0 else ''
+                    for i in uindex.tolist()]
+        return np.array(strs, dtype=object)[inverse]
+
+    def get_range(self, tstart, tstop):
+        """data for a time range, starting with the last data point
+        at or before tstart
+
+        Arguments:
+           tstart (float): start time
+           tstop (float): stop time
+
+        Returns:
+           PVLogData
+        """
+        i0, i1 = self.index_at([tstart, tstop]).tolist()
+        i0, i1 = max(0, i0), i1 + 1
+        if isinstance(self.char_values, list):
+            char_values = self.char_values[i0:i1]
+        else:
+            char_values = self.char_values.select(i0, i1)
+        data = PVLogData(pvname=self.pvname,
+                         filename=self.filename,
+                         path=self.path,
+                         is_numeric=self.is_numeric,
+                         headers=list(self.headers),
+                         attrs=dict(self.attrs),
+                         timestamps=self.timestamps[i0:i1].copy(),
+                         datetimes=None,
+                         mpldates=None,
+                         values=self.values[i0:i1].copy(),
+                         char_values=char_values,
+                         events=[ev for ev in self.events
+                                 if tstart <= ev[0] <= tstop],
+                         offset=self.offset,
+                         index=self.index)
+        if isinstance(data.char_values, FormattedValues):
+            data.char_values.values = data.values
+        return data
+
+    def has_waveforms(self):
+        """whether data points are arrays, saved in a waveform data file"""
+        return 'waveform_file' in self.attrs
+
+    def get_waveform_records(self):
+        """records of the waveform data file, memory-mapped and
+        re-mapped if data points refer to records added to the file
+
+        Returns:
+           structured array of records with fields 'timestamp', 'count',
+           and 'value', or None if the PV does not have waveforms.
+        """
+        if not self.has_waveforms():
+            return None
+        nrec = 0 if len(self.values) < 1 else int(np.nanmax(self.values)) + 1
+        if self._wfm_records is None or len(self._wfm_records) < nrec:
+            dtype = waveform_record_dtype(self.attrs.get('waveform_type', '<f8'),
+                                          self.attrs.get('nelm', 1))
+            self._wfm_records = read_waveforms(Path(self.path).parent /
+                                               self.attrs['waveform_file'], dtype)
+        return self._wfm_records
+
+    def get_waveforms(self):
+        """2D array of waveform data, memory-mapped from the waveform data
+        file, with one row per record, or None if the PV does not have
+        waveforms.  The values of the data points are the record numbers,
+        so that the arrays for the data points are `get_waveforms()[values]`.
+        Elements after the number of elements for each record are 0.
+        """
+        recs = self.get_waveform_records()
+        return None if recs is None else recs['value']
+
+    def get_waveform(self, i):
+        """array for data point i, or None if not available"""
+        recs = self.get_waveform_records()
+        if recs is None or i >= len(self.values):
+            return None
+        irec = int(self.values[i])
+        if irec < 0 or irec >= len(recs):
+            return None
+        return np.array(recs['value'][irec, :recs['count'][irec]])
+
     def get_datetimes(self):
         """set datetimes to list of datetimes"""
         if (self.datetimes is None or
@@ -70,42 +518,157 @@ class PVLogData:
         """set matplotlib/numpy dates"""
         if (self.mpldates is None or
                 len(self.mpldates) < len(self.timestamps)):
-            self.mpldates = np.array(self.timestamps)/86400.0
+            self.mpldates = self.timestamps/86400.0
         return self.mpldates
 
 class PVLogFile:
     """PV LogFile"""
     def __init__(self, pvname, logfile=None, description=None, monitor_delta=None,
-                 mod_time=None, text=None, data=None):
+                 mod_time=None, size=0, text=None, data=None, segments=None,
+                 use_cache=False):
         self.pvname = pvname
         self.logfile = logfile
+        self.segments = segments
+        if segments is None:
+            self.segments = [(logfile, None, None)]
+        self.use_cache = use_cache
         self.description = description
         self.monitor_delta = monitor_delta
         self.mod_time = mod_time
+        self.size = size
         self.has_motor_events = False
         self.text = text
+        self.offset = 0
+        self.end_added = False
         self.data = data
 
-    def read_log_text(self, parse=False):
-        """read text of logfile"""
-        self.text = read_textfile(self.logfile).split('\n')
+    def read_log_text(self, parse=False, keep_text=False):
+        """read text of logfile
+        with parse=True, the log file is parsed from its bytes, without
+        keeping the text, unless keep_text=True"""
         self.mod_time = os.stat(self.logfile).st_mtime
         self.data = None
+        if parse and not keep_text:
+            self.text = None
+            buff, self.offset = read_logbytes(self.logfile)
+            # a new or empty log gives empty data, with the header attrs
+            self.parse(buff)
+            return
+        self.text, self.offset = read_logtext(self.logfile)
         if parse and len(self.text) > 3:
             self.parse()
 
-    def parse(self):
-        """parse text to data"""
-        self.data = parse_logfile(self.text, self.logfile)
+    def parse(self, buff=None):
+        """parse text, or bytes from read_logbytes(), to data, joining
+        data from any earlier log file segments"""
+        if buff is None:
+            self.data = parse_logfile(self.text, self.logfile, offset=self.offset)
+        else:
+            self.data = parse_logbytes(buff, self.logfile, offset=self.offset)
+        if len(self.segments) > 1:
+            closed = self.segment_files()[:-1]
+            if self.use_cache:
+                datasets = [read_logfiles_arrays([f], use_cache=True) for f in closed]
+            else:
+                datasets = [read_logfile(f) for f in closed]
+            self.data = join_logdata(datasets + [self.data])
         self.has_motor_events = False
+        self.end_added = False
+
+    def segment_files(self, tstart=None, tstop=None):
+        """list of log file segments, optionally only those
+        overlapping the time range tstart to tstop"""
+        files = []
+        for logfile, t0, t1 in self.segments:
+            if tstop is not None and t0 is not None and t0 > tstop:
+                continue
+            if tstart is not None and t1 is not None and t1 < tstart:
+                continue
+            files.append(segment_path(logfile))
+        return files
+
+    def read_tail(self):
+        """read and parse data added to the logfile since it was last read,
+        extending the existing data
+
+        Returns:
+           number of new data points and events
+
+        Notes:
+           only the text added after the byte offset of the data is read.
+           Data for logs with binary storage, or for log files that have
+           been truncated, will be read in full.
+        """
+        if self.data is None:
+            self.read_log_text(parse=True)
+            return 0 if self.data is None else len(self.data.timestamps)
+        npts = len(self.data.timestamps)
+        self.mod_time = os.stat(self.logfile).st_mtime
+        if (self.data.attrs.get('storage', None) == STORAGE_BINARY or
+            os.stat(self.logfile).st_size < self.data.offset):
+            self.read_log_text(parse=True)
+            return len(self.data.timestamps) - npts
+
+        lines, offset = read_logtext(self.logfile, offset=self.data.offset)
+        if len(lines) < 1:
+            return 0
+        if self.end_added:
+            npts -= 1
+            self.data.truncate(npts)
+            self.end_added = False
+        if npts > 0:
+            start_tstamp = self.data.timestamps[-1]
+        else:
+            start_tstamp = MIN_TIMESTAMP
+            for hline in self.data.headers:
+                if 'start_time' in hline:
+                    start_tstamp = parse_start_time(hline)
+
+        out = parse_body_fast(lines, start_tstamp=start_tstamp,
+                              index=self.data.index)
+        if out is None:
+            out = parse_body_lines(lines, start_tstamp=start_tstamp,
+                                   index=self.data.index)
+        times, vals, cvals, events, headers, val_index, index = out
+        self.data.extend(times, vals, cvals, events)
+        self.data.headers.extend(headers)
+        self.data.offset = offset
+        self.data.index = index
+        self.text = None
+        return len(times) + len(events)
 
 
     def read(self):
         """read, parse and fully populate data from logfile"""
-        if self.text is None:
-            self.read_log_text(parse=True)
         if self.data is None:
-            self.parse()
+            if self.text is None:
+                self.read_log_text(parse=True)
+            else:
+                self.parse()
+                self.text = None
+
+    def read_range(self, tstart, tstop):
+        """read and parse data for a time range
+
+        Arguments:
+           tstart (float): start time
+           tstop (float): stop time
+
+        Returns:
+           PVLogData for the time range, starting with the last data
+           point at or before tstart
+
+        Notes:
+           if the data has been read, it is selected from that data.
+           Otherwise, only the part of the log file for the time range
+           is read, using a sparse time index of the log file, and the
+           data is not kept.
+        """
+        if self.data is not None:
+            return self.data.get_range(tstart, tstop)
+        datasets = [read_logfile_range(logfile, tstart, tstop)
+                    for logfile in self.segment_files(tstart, tstop)]
+        return join_logdata(datasets).get_range(tstart, tstop)
 
     def values_at(self, timestamp_list, as_string=None):
         """get values at a list of timestamps,
@@ -117,7 +680,9 @@ class PVLogFile:
            as_string (bool or None): whether to return strings or native values [None]
 
         Notes:
-           with as_string=None, string values will be used for strings, enums,
+           the value at each timestamp is the last value logged at or
+           before that time, with '' for times before the first value.
+           With as_string=None, string values will be used for strings, enums,
            char waveforms (byte arrays), and ints, while formatting will be done
            with gformat for floats.
         Returns:
@@ -127,20 +692,13 @@ class PVLogFile:
         if as_string is None:
             as_string = 'double' not in self.data.attrs.get('type', 'time_char')
 
-        if isinstance(timestamp_list, (int, float)):
-            ts = [timestamp_list]
-        else:
-            ts = [t for t in timestamp_list]
-        ts = np.array(ts)
-        d_ts = np.array(self.data.timestamps)
-        d_id = np.arange(len(self.data.timestamps))
-        t_id = [int(t) for t in np.interp(ts, d_ts, d_id, left=0, right=0)]
-        if as_string:
-            values = [self.data.char_values[i] for i in t_id]
-        else:
-            values = [gformat(self.data.values[i]) for i in t_id]
-        return values
-
+        if isinstance(timestamp_list, (int, float, datetime)):
+            timestamp_list = [timestamp_list]
+        ts = timestamp_list
+        if not isinstance(ts, np.ndarray):
+            ts = [t.timestamp() if isinstance(t, datetime) else t for t in ts]
+        index = self.data.index_at(ts)
+        return self.data.format_samples(index, as_string=as_string).tolist()
 
     def get_datetimes(self):
         """set datetimes to list of datetimes"""
@@ -153,9 +711,11 @@ class PVLogFile:
     def set_end_time(self, tstamp):
         last_time = self.data.timestamps[-1]
         if tstamp > (last_time + 0.001):
-            self.data.values.append(self.data.values[-1])
-            self.data.char_values.append(self.data.char_values[-1])
-            self.data.timestamps.append(tstamp)
+            if self.end_added:
+                self.data.truncate(len(self.data.timestamps)-1)
+            self.data.append(tstamp, self.data.values[-1],
+                             self.data.char_values[-1])
+            self.end_added = True
             self.get_mpldates()
 
 def read_logfile(filename):
@@ -171,20 +731,225 @@ def read_logfile(filename):
         raise OSError("File not found: '%s'" % filename)
     if os.stat(filename).st_size > MAX_FILESIZE:
         raise OSError("File '%s' too big for read_ascii()" % filename)
-    text = read_textfile(filename)
+    buff, offset = read_logbytes(filename)
+    return parse_logbytes(buff, filename, offset=offset)
+
+def read_logfiles(filenames):
+    """read and join data for the segments of a PVlogger log file
+
+    Arguments:
+      filenames (list):  names of log file segments, in order
+
+    Returns:
+      PVLogData dataclass instance
+    """
+    return join_logdata([read_logfile(fname) for fname in filenames])
+
+def read_logfile_range(filename, tstart, tstop):
+    """read and parse data for a time range from a log file, using a
+    sparse time index of the log file to read only that part of the file.
+    Compressed log files are read in full.
+
+    Returns:
+      PVLogData, which may include data outside the time range
+    """
+    if is_compressed(filename):
+        buff, offset = read_logbytes(filename)
+        return parse_logbytes(buff, filename, offset=offset,
+                              time_range=(tstart, tstop))
+    tindex = read_time_index(filename)
+    start, stop = index_range(tindex, tstart, tstop)
+    if tindex['header_end'] < 0:
+        buff, offset = read_logbytes(filename)
+    else:
+        header, offset = read_logbytes(filename, stop=tindex['header_end'])
+        body, offset = read_logbytes(filename, offset=start, stop=stop)
+        buff = b''.join((header, body))
+    return parse_logbytes(buff, filename, offset=offset,
+                          time_range=(tstart, tstop))
+
+def join_logdata(datasets):
+    """join PVLogData for consecutive segments of a log file
+
+    Arguments:
+      datasets (list):  list of PVLogData, in order of segments
+
+    Returns:
+      PVLogData, with the file name and offset of the last segment
+
+    Notes:
+      as each segment starts with the last value of the previous
+      segment, data points at or before the last data point of the
+      previous segments are skipped.
+    """
+    datasets = [data for data in datasets if data is not None]
+    if len(datasets) == 1:
+        return datasets[0]
+    first, last = datasets[0], datasets[-1]
+    parts = []
+    tlast = -np.inf
+    for data in datasets:
+        i0 = int(np.searchsorted(data.timestamps, tlast, side='right'))
+        parts.append((data, i0))
+        if len(data.timestamps) > 0:
+            tlast = max(tlast, data.timestamps[-1])
+    timestamps = np.concatenate([data.timestamps[i0:] for data, i0 in parts])
+    values = np.concatenate([data.values[i0:] for data, i0 in parts])
+    if all(isinstance(data.char_values, FormattedValues) for data in datasets):
+        overrides, npts = {}, 0
+        for data, i0 in parts:
+            for i, cval in data.char_values.overrides.items():
+                if i >= i0:
+                    overrides[npts + i - i0] = cval
+            npts += len(data.values) - i0
+        fvals = last.char_values
+        char_values = FormattedValues(values, enum_strs=fvals.enum_strs,
+                                      is_int=fvals.is_int,
+                                      precision=fvals.precision,
+                                      overrides=overrides)
+    else:
+        char_values = []
+        for data, i0 in parts:
+            char_values.extend(data.char_values[i0:])
+    attrs = dict(last.attrs)
+    if 'start_time' in first.attrs:
+        attrs['start_time'] = first.attrs['start_time']
+    events = []
+    for data in datasets:
+        events.extend(data.events)
+    return PVLogData(pvname=last.pvname,
+                     filename=last.filename,
+                     path=last.path,
+                     is_numeric=all(data.is_numeric for data in datasets),
+                     headers=list(first.headers),
+                     attrs=attrs,
+                     timestamps=timestamps,
+                     datetimes=None,
+                     mpldates=None,
+                     values=values,
+                     char_values=char_values,
+                     events=events,
+                     offset=last.offset,
+                     index=last.index)
+
+def read_logtext(filename, offset=0, stop=None):
+    """read text lines of a log file, starting at a byte offset
+
+    Arguments:
+      filename (str):  name of file to read
+      offset (int):  byte offset to start reading [0]
+      stop (int or None):  byte offset to stop reading [None, end of file]
+
+    Returns:
+      tuple of (list of text lines, byte offset after the last line read)
+
+    Notes:
+      an incomplete last line (from a write in progress) is not included.
+      For compressed log files, offsets are into the decompressed text.
+    """
+    if is_compressed(filename):
+        buff = read_compressed(filename)
+        size = len(buff) if stop is None else min(len(buff), stop)
+        if size <= offset:
+            return [], offset
+        text = buff[offset:size].decode('utf-8', errors='replace')
+        lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        partial = lines.pop()
+        return lines, size - len(partial.encode('utf-8'))
+    size = os.stat(filename).st_size
+    if stop is not None:
+        size = min(size, stop)
+    if size <= offset:
+        return [], offset
+    with open(filename, 'rb') as fh:
+        fh.seek(offset)
+        text = read_textfile(fh, size=size-offset)
     lines = text.split('\n')
-    return parse_logfile(lines, filename)
+    partial = lines.pop()
+    return lines, size - len(partial.encode('utf-8'))
 
-def parse_logfile(textlines, filename):
-    dt = debugtimer()
+def read_logbytes(filename, offset=0, stop=None):
+    """read bytes of a log file, starting at a byte offset, without
+    decoding them to text
+
+    Arguments:
+      filename (str):  name of file to read
+      offset (int):  byte offset to start reading [0]
+      stop (int or None):  byte offset to stop reading [None, end of file]
+
+    Returns:
+      tuple of (bytes-like buffer of complete lines, byte offset after
+      the last line read)
+
+    Notes:
+      plain log files are memory-mapped, so that bytes are only read
+      from the file as they are parsed, and are not copied.  Compressed
+      log files are decompressed in memory.  As for read_logtext(), an
+      incomplete last line is not included.
+    """
+    if is_compressed(filename):
+        buff = read_compressed(filename)
+        size = len(buff) if stop is None else min(len(buff), stop)
+    else:
+        size = os.stat(filename).st_size
+        if stop is not None:
+            size = min(size, stop)
+        if size <= offset:
+            return b'', offset
+        with open(filename, 'rb') as fh:
+            buff = mmap.mmap(fh.fileno(), size, access=mmap.ACCESS_READ)
+    end = buff.rfind(b'\n', offset, size) + 1
+    if end <= offset:
+        return b'', offset
+    return memoryview(buff)[offset:end], end
+
+def parse_start_time(hline):
+    """parse timestamp from 'start_time = ...' header line"""
+    tstr = hline[1:].split('=', 1)[1].strip()
+    try:
+        return datetime.fromisoformat(tstr).timestamp()
+    except ValueError:
+        return dateparser.parse(tstr).timestamp()
+
+def parse_header(headers, filename):
+    """parse header lines of a log file to dictionary of attributes"""
+    fpath = Path(filename).absolute()
+    attrs = {'filename': fpath.name, 'pvname': 'unknown', 'type': 'time_double'}
+    enum_strs = {}
+    enum_mode = False
+    for hline in headers:
+        hline = hline.strip().replace('\t', ' ')
+        if len(hline) < 1:
+            continue
+        if hline[0] in COMMENTCHARS:
+            hline = hline[1:].strip()
+        if '-----' in hline:
+            break
+        if '=' in hline:
+            words = hline.split('=', 1)
+            if enum_mode:
+                enum_strs[int(words[0].strip())] = words[1].strip()
+            else:
+                attrs[words[0].strip()] = words[1].strip()
+        if 'enum strings' in hline:
+            enum_mode = True
+    if 'enum' in attrs['type'] and len(enum_strs) > 0:
+        attrs['enum_strs'] = enum_strs
+    return attrs
+
+def parse_body_lines(textlines, start_tstamp=MIN_TIMESTAMP, index=-1):
+    """parse data lines of a log file, one line at a time
+
+    Returns:
+       tuple of (timestamps, values, char_values, events, headers,
+                 number of index values, last index)
+    """
     times = []
     vals = []
     cvals = []
     headers = []
     events = []
-    index = -1
     val_index = 0
-    start_tstamp = MIN_TIMESTAMP
     for line in textlines:
         line = line.strip()
         if len(line) < 1:
@@ -192,8 +957,7 @@ def parse_logfile(textlines, filename):
         if line.startswith('#'):
             headers.append(line)
             if 'start_time' in line:
-                words = [a.strip() for a in line[1:].split('=')]
-                start_tstamp = dateparser.parse(words[1]).timestamp()
+                start_tstamp = parse_start_time(line)
         else:
             words = line.split(maxsplit=2)
             if len(words) == 1:
@@ -209,6 +973,15 @@ def parse_logfile(textlines, filename):
                     ts = times[-1]
             if val == '<event>':
                 events.append([ts, cval])
+            elif val == '<waveform>':
+                # value is the record number in the waveform data file
+                try:
+                    vals.append(float(int(cval)))
+                    cvals.append(val)
+                    times.append(ts)
+                    val_index += 1
+                except ValueError:
+                    events.append((ts, cval))
             else:
                 if val in ('<index>', '<non_numeric>'):
                     val_index  += 1
@@ -223,33 +996,365 @@ def parse_logfile(textlines, filename):
                         times.append(ts)
                     except ValueError:
                         events.append((ts, cval))
+    return times, vals, cvals, events, headers, val_index, index
+
+def parse_body_fast(textlines, start_tstamp=MIN_TIMESTAMP, index=-1):
+    """parse data lines of a log file in bulk, for the common case of
+    numeric values with only events otherwise.
+
+    Returns:
+       tuple of (timestamps, values, char_values, events, headers,
+                 number of index values, last index)
+       or None if the lines cannot be parsed in bulk.
+
+    Notes:
+       char values are extracted from the text lines on demand.
+    """
+    numeric, special = [], []
+    for i, line in enumerate(textlines):
+        if '<' in line or '#' in line:
+            special.append(i)
+        elif len(line) > 1:
+            numeric.append(i)
+
+    # all 'special' lines must be events
+    events = []
+    for i in special:
+        words = textlines[i].strip().split(maxsplit=2)
+        if len(words) < 2:
+            continue
+        if words[0].startswith('#') or words[1] in ('<index>', '<non_numeric>',
+                                                    '<waveform>'):
+            return None
+        try:
+            float(words[1])
+            return None
+        except ValueError:
+            pass
+        try:
+            ts = float(words[0])
+        except ValueError:
+            return None
+        cval = words[2] if len(words) > 2 else words[1]
+        events.append([i, ts, cval, words[1] == '<event>'])
+
+    lines = [textlines[i] for i in numeric]
+    times = vals = np.zeros(0, dtype='f8')
+    if len(lines) > 0:
+        try:
+            dat = np.loadtxt(lines, usecols=(0, 1), ndmin=2, comments=None)
+        except ValueError:
+            return None
+        if dat.shape[0] != len(lines):
+            return None
+        times, vals = dat[:, 0], dat[:, 1]
+
+    # fix invalid timestamps, using last good timestamp
+    bad = np.where(times < MIN_TIMESTAMP)[0]
+    for i in bad:
+        times[i] = start_tstamp if i == 0 else times[i-1]
+    for ev in events:
+        if ev[1] < MIN_TIMESTAMP:
+            j = np.searchsorted(numeric, ev[0]) - 1
+            ev[1] = start_tstamp if j < 0 else float(times[j])
+
+    events = [[ts, cval] if is_event else (ts, cval)
+              for i, ts, cval, is_event in events]
+    index += len(lines) + len(events)
+    return (times, vals, LineCharValues(lines), events, [], 0, index)
+
+def byte_strings(buff, starts, stops, width=1):
+    """array of byte strings for spans of a uint8 array
+
+    Arguments:
+       buff (ndarray): uint8 array
+       starts (ndarray): start index of each span
+       stops (ndarray): stop index (exclusive) of each span
+       width (int): minimum width of strings [1]
+
+    Returns:
+       ndarray of bytes, with dtype 'S<width>'
+    """
+    lens = stops - starts
+    if len(lens) > 0:
+        width = max(width, int(lens.max()))
+    # pad, so that a window of `width` bytes fits at every start
+    padded = np.concatenate((buff, np.zeros(width, dtype=np.uint8)))
+    out = sliding_window_view(padded, width)[starts]
+    out[np.arange(width) >= lens[:, None]] = 0
+    return out.view(f'S{width}').ravel()
+
+def encode_strings(strings):
+    """array of UTF-8 byte strings for a list of str"""
+    try:
+        return np.array(strings, dtype='S')
+    except UnicodeEncodeError:
+        return np.array([s.encode('utf-8') for s in strings], dtype='S')
+
+def scan_logbytes(body, index=-1):
+    """split data lines of a log file into tokens, a chunk of bytes at a
+    time, yielding the tokens of each chunk
+
+    Arguments:
+       body (ndarray): uint8 array of bytes of complete data lines
+       index (int): data line index before the first line [-1]
+
+    Yields:
+       dict of arrays for the data lines of each chunk, with `times`,
+       `words` (second word of each line), `cvals` (char value of each
+       line), and `index`, or None if a line cannot be parsed in bulk,
+       as for a header line.
+    """
+    pos, nbytes = 0, len(body)
+    while pos < nbytes:
+        stop = min(nbytes, pos + CHUNK_BYTES)
+        if stop < nbytes:
+            newlines = np.flatnonzero(body[pos:stop] == 10)
+            if len(newlines) > 0:
+                stop = pos + int(newlines[-1]) + 1
+            else:
+                stop = pos + int(np.flatnonzero(body[pos:] == 10)[0]) + 1
+        chunk = body[pos:stop]
+        pos = stop
+
+        # words are runs of bytes above ' ', lines end with '\n'
+        space = chunk <= 32
+        wstarts = np.flatnonzero(space[:-1] & ~space[1:]) + 1
+        if not space[0]:
+            wstarts = np.concatenate(([0], wstarts))
+        wstops = np.flatnonzero(~space[:-1] & space[1:]) + 1
+        lstops = np.flatnonzero(chunk == 10)
+        lstarts = np.concatenate(([0], lstops[:-1] + 1))
+        first = np.searchsorted(wstarts, lstarts)
+        nwords = np.searchsorted(wstarts, lstops) - first
+        if np.any(chunk[wstarts[first[nwords > 0]]] == 35):
+            yield None
+            return
+
+        # data lines have 2 or more words: timestamp, value, char value
+        first, nwords = first[nwords > 1], nwords[nwords > 1]
+        last = first + nwords - 1
+        cstart = np.where(nwords > 2, wstarts[np.minimum(first+2, last)],
+                          wstarts[first+1])
+        try:
+            times = byte_strings(chunk, wstarts[first], wstops[first]).astype('f8')
+        except ValueError:
+            yield None
+            return
+        yield {'times': times,
+               'words': byte_strings(chunk, wstarts[first+1], wstops[first+1]),
+               'cvals': byte_strings(chunk, cstart, wstops[last]),
+               'index': index + 1 + np.arange(len(first))}
+        index += len(first)
 
+def parse_body_bytes(body, attrs, start_tstamp=MIN_TIMESTAMP, index=-1):
+    """parse data lines of a log file from bytes, in bulk
+
+    Arguments:
+       body (ndarray): uint8 array of bytes of complete data lines
+       attrs (dict):  log file attributes, for formatting char values
+       start_tstamp (float): timestamp for data before any valid timestamp
+       index (int): data line index before the first line [-1]
+
+    Returns:
+       tuple of (timestamps, values, char_values, events, headers,
+                 number of index values, last index), as for
+       parse_body_lines(), or None if the lines cannot be parsed in bulk.
+
+    Notes:
+       Data lines are split into words with numpy, and converted to values
+       a chunk at a time, without decoding to text.  Char values are kept
+       as for compact_char_values(): only those that differ from the
+       formatted values, or encoded into a table of strings if many differ.
+    """
+    for encode in (False, True):
+        times, vals, events = [], [], []
+        cvals = EncodedValues() if encode else formatted_values(None, attrs)
+        npts = val_index = 0
+        last_index = index
+        for out in scan_logbytes(body, index=index):
+            if out is None:
+                return None
+            words, cv = out['words'], out['cvals']
+            is_event = words == b'<event>'
+            is_index = (words == b'<index>') | (words == b'<non_numeric>')
+            is_wfm = words == b'<waveform>'
+            values = np.full(len(words), np.nan)
+            values[is_index] = out['index'][is_index]
+            is_num = ~(is_event | is_index | is_wfm)
+            try:
+                values[is_num] = words[is_num].astype('f8')
+            except ValueError:
+                # words that are not numbers are events, as in parse_body_lines()
+                for i in np.flatnonzero(is_num).tolist():
+                    try:
+                        values[i] = float(words[i])
+                    except ValueError:
+                        is_num[i] = False
+            if np.any(is_wfm):
+                # value is the record number in the waveform data file
+                cv = cv.astype(f'S{max(cv.itemsize, 10)}')
+                for i in np.flatnonzero(is_wfm).tolist():
+                    try:
+                        values[i] = float(int(cv[i]))
+                        cv[i] = b'<waveform>'
+                    except ValueError:
+                        is_wfm[i] = False
+            is_point = is_num | is_index | is_wfm
+            val_index += int(np.count_nonzero(is_index | is_wfm))
+
+            # events, with the number of data points before each event
+            ipts = npts + np.cumsum(is_point)
+            for i in np.flatnonzero(~is_point).tolist():
+                cval = cv[i].decode('utf-8', errors='replace')
+                events.append([int(ipts[i]), out['times'][i], cval,
+                               bool(is_event[i])])
+
+            values, cv = values[is_point], cv[is_point]
+            times.append(out['times'][is_point])
+            vals.append(values)
+            if encode:
+                table, codes = np.unique(cv, return_inverse=True)
+                lookup = []
+                for cval in table.tolist():
+                    cval = cval.decode('utf-8', errors='replace')
+                    code = cvals.lookup.get(cval, None)
+                    if code is None:
+                        code = cvals.lookup[cval] = len(cvals.table)
+                        cvals.table.append(cval)
+                    lookup.append(code)
+                codes = np.array(lookup, dtype=np.intc)[codes.ravel()]
+                cvals.codes.frombytes(codes.tobytes())
+            else:
+                diff = np.flatnonzero(cv != encode_strings(cvals.format_all(values)))
+                for i in diff.tolist():
+                    cvals.overrides[npts+i] = cv[i].decode('utf-8', errors='replace')
+            npts += len(values)
+            if len(out['index']) > 0:
+                last_index = int(out['index'][-1])
+            if not encode and len(cvals.overrides) > npts//4:
+                break
+        else:
+            break
+
+    times = np.concatenate(times) if len(times) > 0 else np.zeros(0)
+    vals = np.concatenate(vals) if len(vals) > 0 else np.zeros(0)
+    # fix invalid timestamps, using last good timestamp
+    bad = np.where(times < MIN_TIMESTAMP)[0]
+    for i in bad:
+        times[i] = start_tstamp if i == 0 else times[i-1]
+    for ev in events:
+        if ev[1] < MIN_TIMESTAMP:
+            ev[1] = start_tstamp if ev[0] < 1 else times[ev[0]-1]
+
+    events = [[float(ev[1]), ev[2]] if ev[3] else (float(ev[1]), ev[2])
+              for ev in events]
+    if isinstance(cvals, FormattedValues):
+        cvals.values = vals
+    return (times, vals, cvals, events, [], val_index, last_index)
+
+def parse_logfile(textlines, filename, offset=0, time_range=None):
+    """parse text lines of a PVlogger log file
+
+    Arguments:
+      textlines (list):  list of text lines from log file
+      filename (str):  name of log file
+      offset (int):  byte offset in log file after the text lines [0]
+      time_range (tuple or None): (tstart, tstop) to read from binary
+                 data files [None, all data]
+
+    Returns:
+      PVLogData dataclass instance
+    """
+    dt = debugtimer()
+    nhead = 0
+    for line in textlines:
+        if not (line.startswith('#') or len(line.strip()) < 1):
+            break
+        nhead += 1
+    headers = [line.strip() for line in textlines[:nhead] if len(line.strip()) > 0]
+    start_tstamp = MIN_TIMESTAMP
+    for hline in headers:
+        if 'start_time' in hline:
+            start_tstamp = parse_start_time(hline)
+
+    body = textlines[nhead:]
+    out = parse_body_fast(body, start_tstamp=start_tstamp)
+    if out is None:
+        out = parse_body_lines(body, start_tstamp=start_tstamp)
     dt.add(f'read 0 {filename}')
+    return make_logdata(headers, out, filename, start_tstamp=start_tstamp,
+                        offset=offset, time_range=time_range)
+
+def parse_logbytes(buff, filename, offset=0, time_range=None):
+    """parse bytes of a PVlogger log file, as from read_logbytes()
+
+    Arguments:
+      buff (bytes-like):  bytes of complete lines from log file
+      filename (str):  name of log file
+      offset (int):  byte offset in log file after the bytes [0]
+      time_range (tuple or None): (tstart, tstop) to read from binary
+                 data files [None, all data]
+
+    Returns:
+      PVLogData dataclass instance, with compact numpy arrays
+
+    Notes:
+      only header lines are decoded to text.  Data lines are parsed with
+      parse_body_bytes(), or, if that is not possible, decoded to text
+      and parsed with parse_body_lines().
+    """
+    body = np.frombuffer(buff, dtype=np.uint8)
+    headers, nhead = [], 0
+    for line in bytes(body[:HEADER_BYTES]).split(b'\n')[:-1]:
+        if not (line.startswith(b'#') or len(line.strip()) < 1):
+            break
+        nhead += len(line) + 1
+        if len(line.strip()) > 0:
+            headers.append(line.strip().decode('utf-8', errors='replace'))
+    body = body[nhead:]
+    start_tstamp = MIN_TIMESTAMP
+    for hline in headers:
+        if 'start_time' in hline:
+            start_tstamp = parse_start_time(hline)
+
+    attrs = parse_header(headers, filename)
+    out = parse_body_bytes(body, attrs, start_tstamp=start_tstamp)
+    if out is None:
+        lines = bytes(body).decode('utf-8', errors='replace').split('\n')
+        out = parse_body_lines(lines, start_tstamp=start_tstamp)
+        lines = None
+    data = make_logdata(headers, out, filename, start_tstamp=start_tstamp,
+                        offset=offset, time_range=time_range)
+    return data.to_arrays()
+
+def make_logdata(headers, body, filename, start_tstamp=MIN_TIMESTAMP,
+                 offset=0, time_range=None):
+    """PVLogData from header lines and parsed data lines of a log file
+
+    Arguments:
+      headers (list):  header lines
+      body (tuple):  parsed data lines, as from parse_body_lines()
+      filename (str):  name of log file
+      start_tstamp (float): timestamp for data before any valid timestamp
+      offset (int):  byte offset in log file after the data lines [0]
+      time_range (tuple or None): (tstart, tstop) to read from binary
+                 data files [None, all data]
+
+    Returns:
+      PVLogData dataclass instance
+    """
+    times, vals, cvals, events, xheaders, val_index, index = body
+    headers.extend(xheaders)
+
     datetimes = None #
     mpldates =  None #
-    # try to parse attributes from header text
     fpath = Path(filename).absolute()
-    attrs = {'filename': fpath.name, 'pvname': 'unknown', 'type': 'time_double'}
-    enum_strs = {}
-    enum_mode = False
-    for hline in headers:
-        hline = hline.strip().replace('\t', ' ')
-        if len(hline) < 1:
-            continue
-        if hline[0] in COMMENTCHARS:
-            hline = hline[1:].strip()
-        if '-----' in hline:
-            break
-        if '=' in hline:
-            words = hline.split('=', 1)
-            if enum_mode:
-                enum_strs[int(words[0].strip())] = words[1].strip()
-            else:
-                attrs[words[0].strip()] = words[1].strip()
-        if 'enum strings' in hline:
-            enum_mode = True
-    if 'enum' in attrs['type'] and len(enum_strs) > 0:
-        attrs['enum_strs'] = enum_strs
+    attrs = parse_header(headers, filename)
+    if attrs.get('storage', None) == STORAGE_BINARY:
+        times, vals, cvals = read_binary_data(fpath, attrs, times, vals,
+                                              cvals, start_tstamp,
+                                              time_range=time_range)
 
     pvname = attrs.pop('pvname')
     npts = (len(vals) + len(events))
@@ -265,10 +1370,99 @@ def parse_logfile(textlines, filename):
                      datetimes=datetimes,
                      values=vals,
                      char_values=cvals,
-                     events=events)
+                     events=events,
+                     offset=offset,
+                     index=index)
+
+def read_binary_data(logfile, attrs, times, vals, cvals, start_tstamp,
+                     time_range=None):
+    """read binary records for a log file with binary storage,
+    combining with any values read from the text log file.
+
+    With time_range=(tstart, tstop), only records from the last one at
+    or before tstart to the last one at or before tstop are read.
+
+    Returns:
+       tuple of (timestamps, values, char_values)
+    """
+    datafile = Path(logfile).parent / attrs.get('datafile',
+                                                binary_datafile(logfile).name)
+    if time_range is None:
+        btimes, bvals = read_records(datafile)
+    else:
+        btimes, bvals = read_records(datafile, use_mmap=True)
+        i0, i1 = np.searchsorted(btimes, time_range, side='right').tolist()
+        i0 = max(0, i0-1)
+        btimes, bvals = np.array(btimes[i0:i1]), np.array(bvals[i0:i1])
+    bad = np.where(btimes < MIN_TIMESTAMP)[0]
+    if len(bad) > 0:
+        btimes = btimes.copy()
+        for i in bad:
+            btimes[i] = start_tstamp if i == 0 else btimes[i-1]
+
+    if len(times) > 0:
+        # combine text and binary values, ordered by time
+        btimes = np.concatenate((btimes, np.array(times, dtype='f8')))
+        bvals = np.concatenate((bvals, np.array(vals, dtype='f8')))
+        bcvals = formatted_values(bvals[:-len(times)], attrs)
+        bcvals = list(bcvals) + list(cvals)
+        order = np.argsort(btimes, kind='stable')
+        return btimes[order], bvals[order], [bcvals[i] for i in order]
+    return btimes, bvals, formatted_values(bvals, attrs)
+
+def read_logfile_arrays(filename, use_cache=False):
+    """read and parse a log file, returning PVLogData with numpy arrays,
+    for use in a worker process.  With use_cache=True, the parsed data
+    is also saved to the cache."""
+    key = cache_key(filename)
+    buff, offset = read_logbytes(filename)
+    data = parse_logbytes(buff, filename, offset=offset)
+    buff = None
+    if use_cache:
+        save_cached_data(data, filename, key=key)
+    return data
 
-def q_parse_logfile(text, filename, queue):
-    queue.put(parse_logfile(text, filename))
+def read_logfiles_arrays(filenames, use_cache=False):
+    """read, parse, and join the segments of a log file, returning
+    PVLogData with numpy arrays, for use in a worker process.  With
+    use_cache=True, cached data is used for segments that have not
+    changed, and parsed data is saved to the cache for each segment."""
+    datasets = []
+    for fname in filenames:
+        data = read_cached_logfile(fname) if use_cache else None
+        if data is None:
+            data = read_logfile_arrays(fname, use_cache=use_cache)
+        datasets.append(data)
+    if len(datasets) == 1:
+        return datasets[0]
+    return join_logdata(datasets).to_arrays()
+
+def read_cached_logfiles(filenames):
+    """read parsed data for the segments of a log file from the cache,
+    returning joined PVLogData or None if any segment has no valid cache"""
+    datasets = []
+    for fname in filenames:
+        data = read_cached_logfile(fname)
+        if data is None:
+            return None
+        datasets.append(data)
+    if len(datasets) == 1:
+        return datasets[0]
+    return join_logdata(datasets).to_arrays()
+
+def read_cached_logfile(filename):
+    """read parsed data for a log file from the cache,
+    returning PVLogData or None if there is no valid cache"""
+    out = load_cached_data(filename)
+    if out is None:
+        return None
+    fmt = out.pop('formatted', None)
+    if fmt is not None:
+        out['char_values'] = FormattedValues(out['values'], **fmt)
+    enc = out.pop('encoded', None)
+    if enc is not None:
+        out['char_values'] = EncodedValues(**enc)
+    return PVLogData(**out)
 
 
 def read_logfolder(folder):
@@ -290,10 +1484,11 @@ class PVLogFolder:
     """
     data and methods for a PVlogger Folder
     """
-    def __init__(self, folder, datadir='', **kws):
+    def __init__(self, folder, datadir='', use_cache=True, **kws):
         self.folder = Path(folder).resolve()
         self.fullpath = self.folder.as_posix()
         self.datadir = Path(datadir)
+        self.use_cache = use_cache
 
         self.time_start = None
         self.time_stop = None
@@ -302,7 +1497,10 @@ class PVLogFolder:
         self.motors = []
         self.instruments = []
         self.on_read = None
+        self.pool = None
+        self.pool_nproc = 0
         self.data = {}
+        self.event_index = EventIndex()
         if self.folder.exists():
             self.read_folder()
 
@@ -322,13 +1520,10 @@ class PVLogFolder:
         if not filelist.exists():
             raise ValueError(f"'{self.folder}' is not a valid PVlog folder: no file list")
 
-        logfiles = {}
-        for line in read_textfile(filelist).split('\n'):
-            if line.startswith('#'):
-                continue
-            words = [a.strip() for a in line.split('|', maxsplit=1)]
-            if len(words) > 1:
-                logfiles[words[0]] = Path(self.folder, words[1])
+        self.segments = read_filelist(filelist)
+        self.filelist_mtime = os.stat(filelist).st_mtime
+        logfiles = {pvname: segment_path(segs[-1][0])
+                    for pvname, segs in self.segments.items()}
         self.logfiles = logfiles
 
         # main config
@@ -346,18 +1541,27 @@ class PVLogFolder:
             conf = tomli.loads(ctext)
         self.config = conf
         self.pvs = {}
+        self.event_index = EventIndex()
         for pline in conf['pvs']:
-            words = [a.strip() for a in pline.split('|', maxsplit=2)]
-            if len(words) < 2:
-               words.extend(['<auto>', '<auto>'])
+            words = [a.strip() for a in pline.split('|')]
+            if len(words) < 3:
+               words.extend(['<auto>']*(3-len(words)))
             pvname = words[0]
             logfile = logfiles[pvname]
             if Path(logfile).exists():
-                mod_time = os.stat(logfile).st_mtime
-                self.pvs[pvname] = PVLogFile(pvname, logfile=logfile,
-                                             mod_time=mod_time,
-                                             description=words[1],
-                                             monitor_delta=words[2])
+                stat = os.stat(logfile)
+                pvlog = PVLogFile(pvname, logfile=logfile,
+                                  mod_time=stat.st_mtime,
+                                  description=words[1],
+                                  monitor_delta=words[2],
+                                  segments=self.segments[pvname],
+                                  use_cache=self.use_cache)
+                for segfile in pvlog.segment_files():
+                    binfile = binary_datafile(segfile)
+                    for fname in (segfile, binfile):
+                        if fname.exists():
+                            pvlog.size += os.stat(fname).st_size
+                self.pvs[pvname] = pvlog
 
         self.motors = conf['motors']
         # look for extra instrumens, as added during/after collection
@@ -370,8 +1574,12 @@ class PVLogFolder:
             conf['instruments'].update(xconf)
         self.instruments = conf['instruments']
 
-        # determine start and stop time
-        start_time = stop_time = 0
+        # determine stop time
+        self.read_time_stop()
+
+    def read_time_stop(self):
+        """read stop time from timestamp file"""
+        stop_time = 0
         tstamp_file = Path(self.folder, TIMESTAMP_FILE)
         if tstamp_file.exists():
             with open(tstamp_file, 'r', encoding='utf-8') as fh:
@@ -379,6 +1587,7 @@ class PVLogFolder:
                 words = line.split()
                 stop_time = float(words[0])
         self.time_stop = stop_time
+        return stop_time
 
     def _logfiles_sizeorder(self, reverse=False):
         """return list of PVs ordered by increasing size of logfiles
@@ -392,148 +1601,238 @@ class PVLogFolder:
             order = order[::-1]
         return [pvlist[i] for i in order]
 
-    def read_all_logs_text(self, verbose=False):
-        """read text of all PV logfiles"""
+    def read_all_logs_text(self, verbose=False, keep_text=False):
+        """read and parse all PV logfiles
+
+        Arguments:
+           verbose (bool): whether to print progress [False]
+           keep_text (bool): whether to keep the text lines of each log
+                 file in `pv.text`, as for viewing the text [False]
+
+        Notes:
+           log files are parsed from their bytes, so that with
+           keep_text=False, the text is never held in memory.
+        """
         t0 = time.time()
         for pvname, pv in self.pvs.items():
-            pv.text = read_textfile(pv.logfile).split('\n')
-            pv.mod_time = os.stat(pv.logfile).st_mtime
-            ts = None
-            try:
-                last_line = pv.text[-1]
-                if not last_line.startswith('#'):
-                    words = last_line[-1].split()
-                    if len(words) > 0:
-                        ts = float(words[0])
-            except:
-                pass
-            if ts is not None:
-                self.time_stop = ts
+            pv.read_log_text(parse=True, keep_text=keep_text)
+            if pv.data is not None and len(pv.data.timestamps) > 0:
+                self.time_stop = pv.data.timestamps[-1]
             if verbose:
-                print(f'{pvname} : {len(pv.text)}')
+                npts = 0 if pv.data is None else len(pv.data.timestamps)
+                print(f'{pvname} : {npts}')
         if verbose:
             dt = time.time()-t0
             print(f"#read {len(self.pvs)} log files, {dt:.2f} secs")
 
 
-    def parse_logfiles(self, nproc=4, nmax=None, verbose=False):
-        """parse all unparsed PV logfiles, using multiprocessing"""
+    def parse_logfiles(self, nproc=4, nmax=None, max_memory=None, verbose=False):
+        """parse all unparsed PV logfiles, using a pool of worker processes
+
+        Arguments:
+           nproc (int): number of worker processes [4]
+           nmax (int or None): max number of files to parse [None, all]
+           max_memory (int or None): memory budget in bytes [None, no limit]
+           verbose (bool): whether to print timing [False]
+
+        Notes:
+           files are parsed largest first. Each worker reads and parses
+           a log file, returning the data as numpy arrays.  The `on_read`
+           callback is called as each file is complete.
+
+           with `use_cache`, data is read from the _PVLOG_cache folder
+           for log files that have not changed since they were cached,
+           and saved there for log files that are parsed.
+
+           with `max_memory`, only the smallest files whose estimated
+           memory for parsed data fits in the budget are parsed. Data for
+           other PVs can be read when needed, with `read_logfile()`.
+        """
         t0 = time.time()
-        # files largest to smallest
-        pdata = {}
-        pvlist = []
-        maxsize = 0
-        for pvname in self.pvs:
-            if self.pvs[pvname].data is None:
-                pdata[pvname] = {'status': 'pending',
-                                 'queue': None, 'proc': None}
-                pvlist.append(pvname)
-
-        random.shuffle(pvlist)
+        pvlist = [pvname for pvname in self._logfiles_sizeorder(reverse=True)
+                  if self.pvs[pvname].data is None]
         if nmax is not None:
             pvlist = pvlist[:nmax]
+        if max_memory is not None:
+            selected, total = set(), 0
+            for pvname in reversed(pvlist):
+                total += self.estimate_memory(pvname)
+                if total > max_memory:
+                    break
+                selected.add(pvname)
+            pvlist = [pvname for pvname in pvlist if pvname in selected]
 
         npvs = len(pvlist)
         if self.on_read is not None:
             self.on_read(pvname='', npvs=npvs, nproc=nproc)
 
-        # now run up to nproc processes to parse the text files
-        def start_next_process(pvlist):
-            for pvname in pvlist:
-                pdat = pdata[pvname]
-                if pdat['status'] == 'pending':
-                    q = pdat['queue'] = Queue()
-                    args = (self.pvs[pvname].text, self.pvs[pvname].logfile, q)
-                    proc = Process(target=q_parse_logfile, args=args)
-                    pdat['proc'] = proc
-                    proc.start()
-                    pdat['status'] = 'started'
-                    break
+        if self.use_cache:
+            ncached = 0
+            for pvname in pvlist[:]:
+                pv = self.pvs[pvname]
+                mod_time = os.stat(pv.logfile).st_mtime
+                data = read_cached_logfiles(pv.segment_files())
+                if data is not None:
+                    pv.data, pv.mod_time = data, mod_time
+                    self.update_start_time(data)
+                    pvlist.remove(pvname)
+                    ncached += 1
+                    if self.on_read is not None:
+                        self.on_read(npvs=len(pvlist), nstart=0, pvname=pvname,
+                                     nproc=nproc, tstart=self.time_start)
+            if verbose:
+                print(f"# read {ncached} Log files from cache: {time.time()-t0:.2f} secs")
+
+        if len(pvlist) < 1:
+            return
 
-        for i in range(nproc):
-            start_next_process(pvlist)
-
-        iloop = 0
-        data_start_time = None
-        while len(pvlist) > 0:
-            iloop += 1
-            nextpv = None
-            _size = maxsize + 1
-            work = []
-            for pvn in pvlist:
-                pdat = pdata[pvn]
-                if (pdat['status'] == 'started' and
-                    pdat['queue'] is not None):
-                    xsize = len(self.pvs[pvn].text)
-                    work.append(pvn)
-                    if xsize < _size:
-                        _size = xsize
-                        nextpv = pvn
-            if nextpv is None or iloop % 2 == 1:
-                nextpv = random.choice(work)
-            pvname = nextpv
-            pdat = pdata[pvname]
-            ret = None
+        if self.pool is None or self.pool_nproc != nproc:
+            self.close_pool()
+            self.pool = ProcessPoolExecutor(max_workers=nproc)
+            self.pool_nproc = nproc
+
+        lock = Lock()
+        complete = Event()
+        state = {'npending': len(pvlist)}
+
+        def parse_done(future, pvname=None):
+            pv = self.pvs[pvname]
             try:
-                ret = pdat['queue'].get(timeout=0.5)
-            except:
-                ret = None
-            if ret is not None:
-                self.pvs[pvname].data = ret
-                pdat['proc'].join()
-                pdat['queue'].close()
-                del pdat['queue'], pdat['proc']
-                stime = ret.attrs.get('start_time',  None)
-                if stime is not None:
-                    start_tstamp = dateparser.parse(stime).timestamp()
-                    if data_start_time is None:
-                        data_start_time = start_tstamp
-                    else:
-                        data_start_time = min(data_start_time, start_tstamp)
-                pvlist.remove(pvname)
-                pdat['status'] = 'complete'
-                start_next_process(pvlist)
-
-                if verbose and len(pvlist) > 0:
-                    npend, nstart = 0, 0
-                    for pvn in pvlist:
-                        stat = pdata[pvn]['status']
-                        if stat.startswith('pend'):
-                            npend +=1
-                        elif stat.startswith('start'):
-                            nstart +=1
-                if data_start_time != self.time_start:
-                    self.time_start = data_start_time
-                if self.on_read is not None:
-                    self.on_read(npvs=len(pvlist), nstart=nstart, pvname=pvname,
-                                  nproc=nproc, tstart=self.time_start)
+                data = future.result()
+            except Exception:
+                data = None
+                if verbose:
+                    print(f"# could not parse log file for '{pvname}'")
+            with lock:
+                pv.data = data
+                if data is not None:
+                    self.update_start_time(data)
+                state['npending'] -= 1
+                npending = state['npending']
+            if self.on_read is not None:
+                self.on_read(npvs=npending, nstart=min(nproc, npending),
+                             pvname=pvname, nproc=nproc, tstart=self.time_start)
+            if npending == 0:
+                complete.set()
+
+        for pvname in pvlist:
+            pv = self.pvs[pvname]
+            pv.mod_time = os.stat(pv.logfile).st_mtime
+            future = self.pool.submit(read_logfiles_arrays, pv.segment_files(),
+                                      use_cache=self.use_cache)
+            future.add_done_callback(partial(parse_done, pvname=pvname))
+
+        complete.wait()
         if verbose:
             dt = time.time()-t0
             print(f"# parsed {npvs} Log files: {dt:.2f} secs")
 
+    def estimate_memory(self, pvname):
+        """estimated memory in bytes for the parsed data of a PV"""
+        return DATA_MEMORY_FACTOR * self.pvs[pvname].size
+
+    def update_start_time(self, data):
+        """update folder start time from 'start_time' of PVLogData"""
+        stime = data.attrs.get('start_time',  None)
+        if stime is not None:
+            tstamp = dateparser.parse(stime).timestamp()
+            if self.time_start is None:
+                self.time_start = tstamp
+            self.time_start = min(self.time_start, tstamp)
+
+    def close_pool(self):
+        """shut down pool of worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        self.pool = None
+
     def reset_new_logfiles(self, parse_data=False):
-        """find 'new' logfiles,  read the text, and set the
-        data to None.
+        """find 'new' logfiles, and read the data added to them.
+
+        Arguments:
+           parse_data (bool): whether to read and parse logfiles
+                    that have not yet been parsed [False]
+
+        Returns:
+           list of PV names with new data
 
-        if parse_data is True, the data will be parsed
+        Notes:
+           for PVs with parsed data, only the data added to
+           the logfile since it was last read is parsed.
         """
+        self.read_time_stop()
+        updated = []
+        for pvname in self.update_segments():
+            pv = self.pvs[pvname]
+            if pv.data is not None or parse_data:
+                pv.read_log_text(parse=True)
+                updated.append(pvname)
         for pvname, pv in self.pvs.items():
+            if pvname in updated:
+                continue
             mtime = os.stat(pv.logfile).st_mtime
-            if mtime > pv.mod_time:
-                pv.text = read_textfile(pv.logfile).split('\n')
-                pv.mod_time = mtime
-                pv.data = None
-                if parse_data:
-                    pv.data = parse_logfile(pv.text, pv.logfile)
-        return
+            binfile = binary_datafile(pv.logfile)
+            if binfile.exists():
+                mtime = max(mtime, os.stat(binfile).st_mtime)
+            if pv.mod_time is None or mtime > pv.mod_time:
+                if pv.data is not None:
+                    if pv.read_tail() > 0:
+                        updated.append(pvname)
+                    pv.mod_time = mtime
+                elif parse_data:
+                    pv.read_log_text(parse=True)
+                    pv.mod_time = mtime
+                    updated.append(pvname)
+        return updated
+
+    def update_segments(self):
+        """read the file list, if changed, for new log file segments
+
+        Returns:
+           list of PV names with new log file segments
+        """
+        filelist = Path(self.folder, FILELIST_FILE)
+        mtime = os.stat(filelist).st_mtime
+        if mtime == self.filelist_mtime:
+            return []
+        self.filelist_mtime = mtime
+        self.segments = read_filelist(filelist)
+        updated = []
+        for pvname, pv in self.pvs.items():
+            segments = self.segments.get(pvname, None)
+            if segments is None or len(segments) == len(pv.segments):
+                continue
+            pv.segments = segments
+            pv.logfile = self.logfiles[pvname] = segment_path(segments[-1][0])
+            pv.mod_time = None
+            updated.append(pvname)
+        return updated
 
     def read_logfile(self, pvname):
-        """read logfile, save file timestamp"""
+        """read and parse logfile, save file timestamp,
+        using cached data if available"""
         pv = self.pvs.get(pvname, None)
         if pv is None:
             raise ValueError(f"Unknown PV name: '{pvname}'")
-        pv.read_log_text(parse=True)
-        pv.mod_time = os.stat(pv.logfile).st_mtime
+        mod_time = os.stat(pv.logfile).st_mtime
+        data = None
+        if len(pv.segments) > 1:
+            data = read_logfiles_arrays(pv.segment_files(),
+                                        use_cache=self.use_cache)
+        elif self.use_cache:
+            data = read_cached_logfile(pv.logfile)
+        if data is not None:
+            pv.data, pv.mod_time = data, mod_time
+            pv.has_motor_events = pv.end_added = False
+        else:
+            key = cache_key(pv.logfile)
+            pv.read_log_text(parse=True)
+            if pv.data is not None:
+                pv.data.to_arrays()
+                if self.use_cache:
+                    save_cached_data(pv.data, pv.logfile, key=key)
+        if pv.data is not None:
+            self.update_start_time(pv.data)
         if pvname in self.motors:
             self.read_motor_events(pvname)
         return pv
@@ -548,27 +1847,56 @@ class PVLogFolder:
        Event data is a list of (timestamp, string) values, and so look like:
            [(1734109257.422, 'FOFF = Frozen'),
             (1734109257.422, 'SET = Use'), ...]
+
+       The data for the Motor Fields is read once and kept, and the events
+       are merged with the events for the Motor PV in time order.
         """
-        if motorname in self.motors:
-            pv = self.pvs[motorname]
+        if motorname not in self.motors:
+            return
+        pv = self.pvs[motorname]
+        if pv.data is None:
+            pv.read_log_text(parse=True)
+        if pv.has_motor_events:
+            return
+        root = motorname[:-4]
+        streams = [sorted_events(pv.data.events)]
+        for suff in motor_fields:
+            pvname = f'{root}{suff}'
+            fpv = self.pvs.get(pvname, None)
+            if fpv is None:
+                continue
+            if fpv.data is None:
+                self.read_logfile(pvname)
+            if fpv.data is not None:
+                streams.append(event_stream(fpv.data, label=suff[1:],
+                                            all_values=True))
+        pv.data.events = list(merge_events(streams))
+        pv.has_motor_events = True
+
+    def get_events(self, tstart=None, tstop=None, pvnames=None):
+        """events for PVs in a time range, in time order
+
+        Arguments:
+           tstart (float or None): start time [None, for first event]
+           tstop (float or None):  stop time [None, for last event]
+           pvnames (list or None): PV names [None, for all PVs]
+
+        Returns:
+           list of (timestamp, pvname, text)
+
+        Notes:
+           events are the logged events, the values of enum PVs, and
+           the Motor Field values for motors.  Data for PVs is read
+           as needed, and the events are kept in an EventIndex.
+        """
+        if pvnames is None:
+            pvnames = list(self.pvs.keys())
+        pvnames = [pvname for pvname in pvnames if pvname in self.pvs]
+        for pvname in pvnames:
+            pv = self.pvs[pvname]
             if pv.data is None:
-                pv.read_log_text(parse=True)
-            root = motorname[:-4]
-            # print('read motor init events ',pv.data.events)
-            if pv.has_motor_events and len(pv.data.events) > 7:
-                return
-
-            for suff in motor_fields:
-                pvname = f'{root}{suff}'
-                label = suff[1:]
-                if pvname in self.logfiles:
-                    pvdat = read_logfile(self.logfiles[pvname])
-                    dtype = pvdat.attrs['type']
-                    enumstrs = pvdat.attrs.get('enum_strs', None)
-                    for ts, val, cval in zip(pvdat.timestamps, pvdat.values,
-                                            pvdat.char_values):
-                        if 'enum' in dtype and enumstrs is not None:
-                            cval = enumstrs.get(val, cval)
-                        pv.data.events.append((ts, f'{label} = {cval}'))
-            pv.data.events = sorted(pv.data.events, key=lambda x: x[0])
-            pv.has_motor_events = True
+                self.read_logfile(pvname)
+            elif pvname in self.motors:
+                self.read_motor_events(pvname)
+            self.event_index.update(pvname, pv.data)
+        return self.event_index.query(tstart, tstop, pvnames)
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+"""
+sparse time index of PVLogger log files
+
+For each log file, the byte offset and timestamp of every INDEX_STEP-th
+line are saved to a .npz file in the _PVLOG_cache folder, next to the log
+files.  This allows reading only the part of a log file for a time range.
+The index is built on first use, and extended as the log file grows.
+"""
+import os
+from pathlib import Path
+import numpy as np
+
+from .logcache import CACHE_DIR
+
+INDEX_STEP = 1000
+INDEX_VERSION = 1
+BLOCK_SIZE = 32*1024*1024
+MIN_TIMESTAMP = 1.0e9
+
+def index_file(logfile):
+    """name of time index file for a log file"""
+    logfile = Path(logfile)
+    return Path(logfile.parent, CACHE_DIR, f'{logfile.name}.tidx.npz')
+
+def new_time_index():
+    """empty time index"""
+    return {'version': INDEX_VERSION, 'size': 0, 'nlines': 0,
+            'header_end': -1, 'offsets': np.zeros(0, dtype='i8'),
+            'times': np.zeros(0, dtype='f8')}
+
+def line_timestamp(line):
+    """timestamp for a data line, or None for headers, events,
+    and lines that cannot be parsed"""
+    words = line.split(maxsplit=2)
+    if len(words) < 2 or words[0].startswith(b'#'):
+        return None
+    if not words[1].startswith(b'<'):
+        try:
+            float(words[1])
+        except ValueError:
+            return None
+    elif words[1] not in (b'<index>', b'<non_numeric>', b'<waveform>'):
+        return None
+    try:
+        tstamp = float(words[0])
+    except ValueError:
+        return None
+    return tstamp if tstamp > MIN_TIMESTAMP else None
+
+def extend_time_index(logfile, tindex, step=INDEX_STEP):
+    """extend a time index for data added to a log file
+
+    Arguments:
+       logfile (str or Path):  name of log file
+       tindex (dict):  time index, as from new_time_index()
+       step (int):  number of lines between index entries [1000]
+
+    Returns:
+       True if the index was changed, False otherwise
+    """
+    size = os.stat(logfile).st_size
+    offset, nlines = tindex['size'], tindex['nlines']
+    if size <= offset:
+        return False
+    offsets, times = [], []
+    with open(logfile, 'rb') as fh:
+        fh.seek(offset)
+        while offset < size:
+            buff = fh.read(min(BLOCK_SIZE, size - offset))
+            ends = np.flatnonzero(np.frombuffer(buff, dtype=np.uint8) == 10)
+            if len(ends) < 1:
+                break
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            if tindex['header_end'] < 0:
+                for i0, i1 in zip(starts.tolist(), ends.tolist()):
+                    line = buff[i0:i1].strip()
+                    if len(line) > 0 and not line.startswith(b'#'):
+                        tindex['header_end'] = offset + i0
+                        break
+            # index every step-th line, or the next data line after it
+            nblock = len(starts)
+            for i in range((-nlines) % step, nblock, step):
+                for j in range(i, min(i + step, nblock)):
+                    tstamp = line_timestamp(buff[starts[j]:ends[j]])
+                    if tstamp is not None:
+                        offsets.append(offset + int(starts[j]))
+                        times.append(tstamp)
+                        break
+            nlines += len(starts)
+            offset += int(ends[-1]) + 1
+            fh.seek(offset)
+    if offset == tindex['size']:
+        return False
+    tindex['size'], tindex['nlines'] = offset, nlines
+    tindex['offsets'] = np.concatenate((tindex['offsets'],
+                                        np.array(offsets, dtype='i8')))
+    times = np.concatenate((tindex['times'], np.array(times, dtype='f8')))
+    # timestamps should increase, but enforce this for searching
+    tindex['times'] = np.maximum.accumulate(times) if len(times) > 0 else times
+    return True
+
+def save_time_index(logfile, tindex):
+    """save time index for a log file, returning whether it was written"""
+    ifile = index_file(logfile)
+    try:
+        ifile.parent.mkdir(exist_ok=True)
+        tmpfile = ifile.with_suffix('.tmp.npz')
+        np.savez(tmpfile, **tindex)
+        os.replace(tmpfile, ifile)
+    except OSError:
+        return False
+    return True
+
+def load_time_index(logfile):
+    """load saved time index for a log file, or None if not available"""
+    ifile = index_file(logfile)
+    if not ifile.exists():
+        return None
+    try:
+        with np.load(ifile, allow_pickle=False) as npz:
+            tindex = {name: npz[name] for name in npz.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    for key in ('version', 'size', 'nlines', 'header_end'):
+        tindex[key] = int(tindex.get(key, -1))
+    if tindex['version'] != INDEX_VERSION:
+        return None
+    return tindex
+
+def read_time_index(logfile, step=INDEX_STEP):
+    """get time index for a log file: loading the saved index,
+    extending it for any data added to the log file, and building
+    it if needed.
+
+    Returns:
+       dict with byte offsets `offsets` and timestamps `times` of
+       indexed lines, byte offset `header_end` of the end of the
+       header lines, and `size`, the number of bytes indexed.
+    """
+    tindex = load_time_index(logfile)
+    if tindex is None or os.stat(logfile).st_size < tindex['size']:
+        tindex = new_time_index()
+    if extend_time_index(logfile, tindex, step=step):
+        save_time_index(logfile, tindex)
+    return tindex
+
+def index_range(tindex, tstart, tstop):
+    """byte range of a log file to read for a time range
+
+    Arguments:
+       tindex (dict):  time index from read_time_index()
+       tstart (float): start time
+       tstop (float): stop time
+
+    Returns:
+       tuple of (start, stop) byte offsets, with stop=None to read to
+       the end of the file.
+
+    Notes:
+       the range starts at or before the last data line at or before
+       tstart, and ends after the last data line at or before tstop.
+    """
+    offsets, times = tindex['offsets'], tindex['times']
+    start = tindex['header_end']
+    if start < 0:
+        start = tindex['size']
+    i = np.searchsorted(times, tstart, side='left') - 1
+    if i >= 0:
+        start = int(offsets[i])
+    j = np.searchsorted(times, tstop, side='right')
+    stop = None if j >= len(offsets) else int(offsets[j])
+    return start, stop
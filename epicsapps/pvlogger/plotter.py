@@ -16,14 +16,58 @@ from wxutils import (get_cwd, MenuItem, LEFT, pack, HLine,
 from wxmplot import PlotPanel
 from pyshortcuts import fix_filename, gformat
 
+from ..utils.decimate import MinMaxPyramid, DECIMATE_MINPTS
 
 N_EVENTS = 7
 
 class DatePlotPanel(PlotPanel):
-    """subclass PlotPanel to force date formatting"""
+    """subclass PlotPanel to force date formatting, and to
+    plot decimated data for long time series"""
     def __init__(self, parent, **kws):
+        self.decimated = []
+        self.xlim_callbacks = {}
+        self.decimate_pending = False
         PlotPanel.__init__(self, parent, **kws)
 
+    def clear(self):
+        """ clear plot """
+        self.decimated = []
+        self.xlim_callbacks = {}
+        PlotPanel.clear(self)
+
+    def add_decimated(self, line, pyramid):
+        """set a plotted line to show data from a MinMaxPyramid,
+        updated when the x range shown changes"""
+        axes = line.axes
+        self.decimated.append((line, pyramid))
+        if axes not in self.xlim_callbacks:
+            self.xlim_callbacks[axes] = axes.callbacks.connect('xlim_changed',
+                                                               self.onXlimChanged)
+
+    def decimated_npts(self, axes):
+        """number of points to plot: 2 per pixel of axes width"""
+        try:
+            return max(500, int(2*axes.get_window_extent().width))
+        except Exception:
+            return 2000
+
+    def onXlimChanged(self, axes=None):
+        if len(self.decimated) > 0 and not self.decimate_pending:
+            self.decimate_pending = True
+            wx.CallAfter(self.update_decimated)
+
+    def update_decimated(self):
+        """re-fetch decimated data for the x range shown"""
+        self.decimate_pending = False
+        for line, pyramid in self.decimated:
+            axes = line.axes
+            if axes is None:
+                continue
+            xmin, xmax = axes.get_xlim()
+            line.set_data(*pyramid.get_data(xmin, xmax,
+                                            npts=self.decimated_npts(axes)))
+        self.canvas.draw_idle()
+
     def xformatter(self, x, pos):
         " x-axis formatter "
         return self.__date_format(x)
@@ -524,14 +568,30 @@ Matt Newville <newville@cars.uchicago.edu>"""
         """add arrow to plot"""
         self.panel.add_arrow(x1, y1, x2, y2, **kws)
 
-    def plot(self, x, y, **kw):
+    def plot(self, x, y, pyramid=None, **kw):
         """plot after clearing current plot """
-        self.panel.plot(x, y, **kw)
-        self._adjust_framesize(side=kw.get('side', None))
+        self._plot_data(self.panel.plot, x, y, pyramid=pyramid, **kw)
 
-    def oplot(self, x, y, **kw):
+    def oplot(self, x, y, pyramid=None, **kw):
         """generic plotting method, overplotting any existing plot """
-        self.panel.oplot(x, y, **kw)
+        self._plot_data(self.panel.oplot, x, y, pyramid=pyramid, **kw)
+
+    def _plot_data(self, plotter, x, y, pyramid=None, **kw):
+        """plot data with a panel plot method
+
+        Notes:
+           data with more than DECIMATE_MINPTS points is plotted with
+           min/max decimation from a MinMaxPyramid, either given as
+           `pyramid` or made from x and y, and is re-fetched at finer
+           resolution when zooming in.
+        """
+        if pyramid is None and len(x) > DECIMATE_MINPTS:
+            pyramid = MinMaxPyramid(x, y)
+        if pyramid is not None:
+            x, y = pyramid.get_data(npts=self.panel.decimated_npts(self.panel.axes))
+        lines = plotter(x, y, **kw)
+        if pyramid is not None and lines:
+            self.panel.add_decimated(lines[0], pyramid)
         self._adjust_framesize(side=kw.get('side', None))
 
     def _adjust_framesize(self, side=None):
@@ -576,11 +636,14 @@ Matt Newville <newville@cars.uchicago.edu>"""
         out = []
         labels = []
         itrace = 0
+        pyramids = {id(line): pyr for line, pyr in self.panel.decimated}
         for ax in self.panel.fig.get_axes():
             for line in ax.lines:
                 itrace += 1
                 x = line.get_xdata()
                 y = line.get_ydata()
+                if id(line) in pyramids:
+                    x, y = pyramids[id(line)].x, pyramids[id(line)].y
                 ylab = line.get_label()
 
                 if len(ylab) < 1:
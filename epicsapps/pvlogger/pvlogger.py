@@ -8,6 +8,7 @@ import atexit
 import traceback
 import uuid
 from time import time, sleep
+from threading import Lock
 from collections import deque
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -20,6 +21,15 @@ from epics import get_pv, PV
 from epics import ca
 
 from .configfile import PVLoggerConfig
+from .writer import (LogWriter, MAX_OPENFILES, FSYNC_TIME, WRITE_TIME,
+                     WRITE_BATCH)
+from .binarylog import (binary_datafile, pack_records, STORAGE_TEXT,
+                        STORAGE_BINARY, STORAGE_FORMATS, waveform_datafile,
+                        waveform_type, waveform_record_dtype, pack_waveforms)
+from .compression import make_compressor, QUIET_TIME
+from .segments import (parse_segment_time, next_segment_time, segment_logname,
+                       compress_logfile, segment_compression_formats,
+                       SegmentCompressor)
 from ..instruments import InstrumentDB
 from ..utils import normalize_pvname, normalize_path
 
@@ -37,6 +47,9 @@ INSTRUMENTS_FILE = '_PVLOG_instruments.txt'
 UPDATETIME = 15.0
 LOGTIME = 300.0
 SLEEPTIME = 0.5
+POLLTIME = QUIET_TIME/2.0
+CONNECT_TIME = 5.0
+MEGABYTE = 1024*1024
 
 motor_fields = ('.OFF', '.FOFF', '.SET', '.HLS', '.LLS',
                 '.DIR', '_able.VAL', '.SPMG')
@@ -66,6 +79,16 @@ def get_instruments(instrument_names=None, escan_credentials=None):
                     insts[iname].append(pvname)
     return insts
 
+def wait_for_connections(pvs, timeout=CONNECT_TIME):
+    """wait for a list of PVs to connect, up to a total time of timeout
+    seconds, returning the time waited"""
+    t0 = time()
+    pending = [pv for pv in pvs if not pv.connected]
+    while len(pending) > 0 and time() < t0 + timeout:
+        sleep(0.01)
+        pending = [pv for pv in pending if not pv.connected]
+    return time() - t0
+
 def save_pvlog_timestamp(pvlog_folder):
     """
     save timestamp to _PVLOG_timestamp.txt to show when logger last ran
@@ -109,14 +132,36 @@ def check_pvlog_timestamp(pvlog_folder, timestamp_only=False):
 
 class LoggedPV():
     """wraps a PV for logging
+
+    With `pv` given, that PV-like object is used as the data source
+    instead of connecting to the Epics PV, and `onChanges()` should be
+    called for new values.
     """
-    def __init__(self, pvname, desc=None, mdel=None,
-                 descpv=None, mdelpv=None, connection_timeout=0.25):
+    def __init__(self, pvname, desc=None, mdel=None, descpv=None,
+                 mdelpv=None, connection_timeout=0.25, writer=None,
+                 storage=STORAGE_TEXT, compression=None, segment_time=0,
+                 segment_size=0, segment_compress=None, pv=None):
         self.pvname = normalize_pvname(pvname)
         self.connection_timeout = connection_timeout
+        self.writer = writer
+        self.storage = storage
         logname = self.pvname.replace('.', '_') + '.log'
         self.fpath = Path(new_filename(fix_filename(logname)))
         self.filename = self.fpath.as_posix()
+        self.binpath = binary_datafile(self.fpath)
+        self.wfmpath = waveform_datafile(self.fpath)
+        self.wfm_dtype = None
+        self.wfm_count = 0
+        self.logname = self.fpath.name
+        self.segment_time = segment_time
+        self.segment_size = segment_size
+        self.segment_compress = segment_compress
+        self.segments = [[self.filename, None, None]]
+        self.next_segment = next_segment_time(time(), segment_time)
+        self.segment_bytes = 0
+        self.segments_changed = False
+        self.closed_files = []
+        self.last_written = None
         self.timestamp = 0.0
         self.start_timestamp = None
         self.end_timestamp = None
@@ -127,12 +172,19 @@ class LoggedPV():
         self.needs_flush = False
         self.connected = None
         self.next_flushtime = 0.0
+        self.compress_lock = Lock()
         self.set_desc(desc, descpv)
         self.set_mdel(mdel, mdelpv)
-        self.pv = get_pv(self.pvname, callback=self.onChanges,
-                         connection_callback=self.onConnect)
+        self.set_compression(compression)
+        self.pv = pv
+        if self.pv is None:
+            self.pv = get_pv(self.pvname, callback=self.onChanges,
+                             connection_callback=self.onConnect)
 
     def write(self, txt, flush=False):
+        if self.writer is not None:
+            self.writer.write(self.fpath, txt, flush=flush)
+            return
         with open(self.fpath, 'a', encoding='utf-8') as fh:
             fh.write(txt)
             if flush:
@@ -140,8 +192,20 @@ class LoggedPV():
                 self.next_flushtime = time() + 15.0
                 self.needs_flush = False
 
+    def write_records(self, path, bdata):
+        """write packed binary records to a binary data file"""
+        if self.writer is not None:
+            self.writer.write(path, bdata)
+            return
+        with open(path, 'ab') as fh:
+            fh.write(bdata)
+
     def flush(self):
         self.next_flushtime = time() + 15.0
+        if self.writer is not None:
+            self.writer.sync()
+            self.needs_flush = False
+            return
         with open(self.fpath, 'a', encoding='utf-8') as fh:
             fh.flush()
             self.needs_flush = False
@@ -165,6 +229,31 @@ class LoggedPV():
             except (ValueError, TypeError):
                 self.mdel = None
 
+    def set_compression(self, compression):
+        """set compression mode, such as 'swinging_door 0.01', 'rate 2',
+        or 'percent 0.5'.  An invalid mode will log all values."""
+        with self.compress_lock:
+            try:
+                self.compressor = make_compressor(compression)
+            except (ValueError, TypeError):
+                self.compressor = None
+        self.compression = 'none' if self.compressor is None else repr(self.compressor)
+
+    def poll_compression(self, now=None):
+        """log values held for compression, if no new values have arrived"""
+        if self.compressor is not None:
+            if now is None:
+                now = time()
+            with self.compress_lock:
+                self.queue_data(self.compressor.poll(now))
+
+    def queue_data(self, points):
+        """add data points to the data queue, notifying the writer"""
+        if len(points) > 0:
+            self.data.extend(points)
+            if self.writer is not None:
+                self.writer.notify(self, len(points))
+
     def set_desc(self, desc, descpv):
         "set description"
         self.desc = desc
@@ -208,7 +297,12 @@ class LoggedPV():
             if timestamp is None or timestamp < MIN_TIMESTAMP:
                 timestamp = time()
             self.timestamp = timestamp
-            self.data.append((timestamp, value, char_value))
+            if self.compressor is None:
+                self.queue_data([(timestamp, value, char_value)])
+            else:
+                with self.compress_lock:
+                    self.queue_data(self.compressor.add((timestamp, value,
+                                                         char_value)))
 
     def save_current_value(self):
         """
@@ -218,12 +312,75 @@ class LoggedPV():
         This may be useful to do periodically, or at
         the end of data collection.
         """
-        self.data.append((time(), self.value, self.char_value))
+        if self.compressor is not None:
+            with self.compress_lock:
+                self.queue_data(self.compressor.flush())
+        self.queue_data([(time(), self.value, self.char_value)])
 
     def write_data(self):
+        text, bdata, npts = self.format_data()
+        for path, data in bdata.items():
+            self.write_records(path, data)
+        if len(text) > 0:
+            flush = self.needs_flush and (time() > self.next_flushtime)
+            self.write(text, flush=flush)
+        for path in self.pop_closed_files():
+            if self.segment_compress is not None and path.suffix == '.log':
+                compress_logfile(path, method=self.segment_compress)
+
+    def segment_due(self):
+        """whether a new log file segment should be started"""
+        if self.segment_bytes < 1:
+            return False
+        return ((self.next_segment is not None and time() >= self.next_segment) or
+                (self.segment_size > 0 and self.segment_bytes >= self.segment_size))
+
+    def new_segment(self):
+        """close the current log file segment and start a new one, which
+        will start with the last value written to the closed segment.
+        Segments are listed with the timestamp of this value as the stop
+        time of the closed segment and the start time of the new segment."""
+        now = time()
+        tbound = now
+        if self.last_written is not None:
+            tbound = self.last_written[0]
+        self.closed_files.extend([self.fpath, self.binpath])
+        self.segments[-1][2] = tbound
+        segname = segment_logname(self.logname, len(self.segments))
+        self.fpath = Path(new_filename(fix_filename(segname)))
+        self.filename = self.fpath.as_posix()
+        self.binpath = binary_datafile(self.fpath)
+        self.segments.append([self.filename, tbound, None])
+        self.next_segment = next_segment_time(now, self.segment_time)
+        self.segment_bytes = 0
+        self.needs_header = True
+        self.segments_changed = True
+        if self.last_written is not None:
+            self.data.appendleft(self.last_written)
+
+    def pop_closed_files(self):
+        """return and clear list of files for closed log file segments"""
+        closed = self.closed_files
+        self.closed_files = []
+        return closed
+
+    def format_data(self):
+        """format buffered data (and header if needed) for the log file,
+        emptying the data queue.
+
+        Returns:
+           tuple of (text, binary records, number of data points), with
+           binary records a dict of {path: bytes} for binary data files
+           and waveform data files.
+        """
         if len(self.data) < 1:
-            return
+            return '', {}, 0
+        if self.segment_due():
+            self.new_segment()
+        binary = (self.storage == STORAGE_BINARY)
         buff = []
+        records = []
+        waveforms = []
         if self.needs_header:
             if self.pv.connected:
                 if self.value is None:
@@ -235,12 +392,25 @@ class LoggedPV():
                     f"# pvname        = {self.pvname}",
                     f"# label         = {self.desc}",
                     f"# monitor_delta = {self.mdel}",
+                    f"# compression   = {self.compression}",
                     f"# start_time    = {isotime()}"]
 
             for attr in ('count', 'nelm', 'type', 'units',
                     'precision', 'host', 'access'):
                 val = getattr(self.pv, attr, 'unknown')
                 buff.append(f"# {attr:12s}  = {val}")
+            if binary:
+                buff.append(f"# {'storage':12s}  = {self.storage}")
+                buff.append(f"# {'datafile':12s}  = {self.binpath.name}")
+            wfm_type = waveform_type(self.pv.type, self.pv.nelm)
+            if wfm_type is not None:
+                # one waveform data file is used for all log file segments
+                if self.wfm_dtype is None:
+                    self.wfm_dtype = waveform_record_dtype(wfm_type, self.pv.nelm)
+                    if self.wfmpath.exists():
+                        self.wfm_count = self.wfmpath.stat().st_size // self.wfm_dtype.itemsize
+                buff.append(f"# {'waveform_file':12s}  = {self.wfmpath.name}")
+                buff.append(f"# {'waveform_type':12s}  = {wfm_type}")
             enum_strs = getattr(self.pv, 'enum_strs', None)
             if enum_strs is not None:
                 buff.append("# enum strings:")
@@ -255,13 +425,23 @@ class LoggedPV():
         if n > 0:
             for i in range(n):
                 ts, val, cval = self.data.popleft()
+                self.last_written = (ts, val, cval)
                 if i == 0 and self.needs_header:
                     # re-determine the char value for the first point
                     cur_val = self.pv.value
                     cval = self.pv._set_charval(val)
                     self.char_value = self.pv._set_charval(cur_val)
+                if (self.wfm_dtype is not None and val is not None and
+                    not isinstance(val, (str, bytes))):
+                    waveforms.append((ts, val))
+                    buff.append(f"{ts:.3f}  <waveform>   {self.wfm_count}")
+                    self.wfm_count += 1
+                    continue
                 xval = '<index>'
                 if self.pv.nelm == 1 and 'double' in self.pv.type:
+                    if binary and isinstance(val, (int, float)):
+                        records.append((ts, val))
+                        continue
                     try:
                         xval = gformat(val, length=16)
                     except (ValueError, TypeError):
@@ -269,14 +449,23 @@ class LoggedPV():
                 elif ('enum' in self.pv.type or
                       'int' in self.pv.type or
                       'long' in self.pv.type):
+                    if binary and self.pv.nelm == 1:
+                        records.append((ts, val))
+                        continue
                     xval = f'{val:<16d}'
 
                 buff.append(f"{ts:.3f}  {xval}   {cval}")
             buff.append('')
             self.needs_flush = True
             self.needs_header = False
-        flush = self.needs_flush and (time() > self.next_flushtime)
-        self.write('\n'.join(buff), flush=flush)
+        bdata = {}
+        if len(records) > 0:
+            bdata[self.binpath] = pack_records(records)
+        if len(waveforms) > 0:
+            bdata[self.wfmpath] = pack_waveforms(waveforms, self.wfm_dtype)
+        text = '\n'.join(buff)
+        self.segment_bytes += len(text) + len(bdata.get(self.binpath, b''))
+        return text, bdata, n
 
 
 class PVLogger():
@@ -292,6 +481,18 @@ class PVLogger():
         self.configread_timestamp = None
         self.escan_credentials = escan_credentials
         self.exc = None
+        self.writer = LogWriter()
+        self.storage = STORAGE_TEXT
+        self.compression = None
+        self.connect_timeout = CONNECT_TIME
+        self.segment_time = 0
+        self.segment_size = 0
+        self.segment_compress = None
+        self.helpers = {}
+        self.helpers_resolved = set()
+        self.config_pvnames = []
+        self.motors = []
+        self.folder_config = {}
         self.configfile = configfile
         if configfile is not None and Path(configfile).exists():
             self.read_configfile()
@@ -319,6 +520,32 @@ class PVLogger():
         if self.escan_credentials is None and escan_cred is not None:
             self.escan_credentials = escan_cred
 
+        # options for log writer
+        self.writer.max_openfiles = max(1, int(self.config.get('max_openfiles',
+                                                               MAX_OPENFILES)))
+        self.writer.fsync_time = float(self.config.get('fsync_time', FSYNC_TIME))
+        self.writer.latency = float(self.config.get('write_latency', WRITE_TIME))
+        self.writer.batch_size = max(1, int(self.config.get('write_batch',
+                                                            WRITE_BATCH)))
+        self.storage = self.config.get('storage', STORAGE_TEXT)
+        if self.storage not in STORAGE_FORMATS:
+            self.storage = STORAGE_TEXT
+        self.compression = self.config.get('compression', None)
+        self.connect_timeout = float(self.config.get('connect_timeout', CONNECT_TIME))
+
+        # options for log file segments
+        self.segment_time = parse_segment_time(self.config.get('segment_time', 0))
+        try:
+            self.segment_size = max(0, float(self.config.get('segment_size', 0)))
+        except (ValueError, TypeError):
+            self.segment_size = 0
+        self.segment_compress = self.config.get('segment_compress', None)
+        if self.segment_compress not in segment_compression_formats():
+            self.segment_compress = None
+        self.writer.compressor = None
+        if self.segment_compress is not None:
+            self.writer.compressor = SegmentCompressor(self.segment_compress)
+
     def make_pvlog_folder(self, chdir=True):
         pvlog_folder = self.pvlog_folder
         pvlog_folder.mkdir(mode=0o755, parents=False, exist_ok=True)
@@ -336,11 +563,12 @@ class PVLogger():
         initial connection, or re-connection of PVs
         from configuration to PV objects, and saved metadata files
         """
-        _pvnames, _pvdesc, _pvmdel = [], [], []
+        _pvnames, _pvdesc, _pvmdel, _pvcomp = [], [], [], []
         for pvline in self.config.get('pvs', []):
             name = pvline.strip()
             desc = '<auto>'
             mdel = '<auto>'
+            comp = self.compression
             if '|' in pvline:
                 words = [w.strip() for w in pvline.split('|')]
                 name = words[0]
@@ -348,14 +576,18 @@ class PVLogger():
                     desc = words[1]
                 if len(words) > 2:
                     mdel = words[2]
+                if len(words) > 3:
+                    comp = words[3]
             if name in _pvnames:
                 idx = _pvnames.index(name)
                 _pvdesc[idx] = desc
                 _pvmdel[idx] = mdel
+                _pvcomp[idx] = comp
             else:
                 _pvnames.append(name)
                 _pvdesc.append(desc)
                 _pvmdel.append(mdel)
+                _pvcomp.append(comp)
         sourcefile = self.config.get('sourcefile', None)
         inst_names = self.config.get('instruments', [])
         escan_cred = os.environ.get('ESCAN_CREDENTIALS', self.escan_credentials)
@@ -374,87 +606,180 @@ class PVLogger():
                         inst_map[inst].append(pvname)
                         _pvdesc.append('<auto>')
                         _pvmdel.append('<auto>')
+                        _pvcomp.append(self.compression)
                 except AttributeError:
                     pass
 
-        mdelpvs = {}
-        descpvs = {}
-        rtyppvs = {}
+        # create all LoggedPVs and helper PVs for record type, description,
+        # and monitor delta without waiting, so that all channel searches
+        # are sent at once, then wait for them together.
         for ipv, pvname in enumerate(_pvnames):
-            if pvname.endswith('.VAL'):
+            lpv = self.add_pv(pvname, desc=_pvdesc[ipv], mdel=_pvmdel[ipv],
+                              compression=_pvcomp[ipv])
+            if (pvname.endswith('.VAL') and pvname not in self.helpers
+                    and pvname not in self.helpers_resolved):
                 pref = pvname[:-4]
-                rtyppvs[pvname] = get_pv(f"{pref}.RTYP")
+                hpvs = {'rtyp': get_pv(f"{pref}.RTYP")}
                 if _pvdesc[ipv] in (None, 'None', '<auto>'):
-                    descpvs[pvname] = get_pv(f"{pref}.DESC")
+                    hpvs['desc'] = get_pv(f"{pref}.DESC")
                 if _pvmdel[ipv] in (None, 'None', '<auto>'):
-                    mdelpvs[pvname] = get_pv(f"{pref}.MDEL")
+                    hpvs['mdel'] = get_pv(f"{pref}.MDEL")
+                self.helpers[pvname] = hpvs
+            if pvname not in self.config_pvnames:
+                self.config_pvnames.append(pvname)
+
+        helper_pvs = []
+        for hpvs in self.helpers.values():
+            helper_pvs.extend(hpvs.values())
+        logged_pvs = [lpv.pv for lpv in self.pvs.values()]
+        twait = wait_for_connections(logged_pvs + helper_pvs,
+                                     timeout=self.connect_timeout)
+        nhelp = len(helper_pvs)
+        nhconn = len([pv for pv in helper_pvs if pv.connected])
+        self.resolve_helpers(save=False)
 
-        sleep(0.05)
         out = {'datadir': self.pvlog_folder.as_posix(),
                'start_datetime': self.start_datestring,
-               'end_datetime': self.end_datestring}
+               'end_datetime': self.end_datestring,
+               'max_openfiles': self.writer.max_openfiles,
+               'fsync_time': self.writer.fsync_time,
+               'write_latency': self.writer.latency,
+               'write_batch': self.writer.batch_size,
+               'connect_timeout': self.connect_timeout,
+               'storage': self.storage}
+        if self.segment_time > 0:
+            out['segment_time'] = self.segment_time
+        if self.segment_size > 0:
+            out['segment_size'] = self.segment_size
+        if self.segment_compress is not None:
+            out['segment_compress'] = self.segment_compress
+        if self.compression is not None:
+            out['compression'] = self.compression
         if sourcefile is not None:
             out['sourcefile'] = sourcefile
         out['instruments'] = inst_map
-        out['motors'] = []
-        out['pvs'] = []
+        self.folder_config = out
+        self.save_folder_config()
 
-        for ipv, pvname in enumerate(_pvnames):
-            desc = _pvdesc[ipv]
-            mdel = _pvmdel[ipv]
-            descpv = mdelpv = None
-            if desc in (None, 'None', '<auto>') and pvname in descpvs:
-                descpv = descpvs[pvname]
-            if mdel in (None, 'None', '<auto>')  and pvname in mdelpvs:
-                mdelpv = mdelpvs[pvname]
-            lpv = self.add_pv(pvname, desc=desc, mdel=mdel,
-                              descpv=descpv, mdelpv=mdelpv)
-
-            out['pvs'].append(' | '.join([lpv.pvname, lpv.desc, str(lpv.mdel)]))
-
-            rtype_pv = rtyppvs.get(pvname, None)
-            if rtype_pv is not None and 'motor' == rtype_pv.get():
-                desc = lpv.desc
-                out['motors'].append(pvname)
-                prefix = pvname[:-4]
-                for mfield in motor_fields:
-                    self.add_pv(f"{prefix}{mfield}",
-                                desc=f"{lpv.desc} {mfield}",  mdel=None)
-
-        with open(Path(self.pvlog_folder, CONF_FILE), 'w', encoding='utf-8') as fh:
-            yaml.safe_dump(out, fh, default_flow_style=False, sort_keys=False)
-
-        pfiles = ["# PV Name                                |    Log File "]
-        for lpv in self.pvs.values():
-            pfiles.append(f"{lpv.pvname:40s} | {lpv.filename:40s}")
-        pfiles.append("")
-        with open(Path(self.pvlog_folder, FILELIST_FILE), 'w', encoding='utf-8') as fh:
-            fh.write('\n'.join(pfiles))
         # count connected PVs
-        sleep(0.1)
         ntotal = len(self.pvs)
         nconn = 0
         for loggedpv in self.pvs.values():
             if loggedpv.pv.connected:
                 nconn += 1
-        conn_msg = f'{isotime()}: Connected to {nconn} of {ntotal} Logged PVs'
+        conn_msg = (f'{isotime()}: Connected to {nconn} of {ntotal} Logged PVs, '
+                    f'{nhconn} of {nhelp} helper PVs in {twait:.2f} sec')
+        if len(self.helpers) > 0:
+            conn_msg = (f'{conn_msg}\n{isotime()}: waiting for helper PVs '
+                        f'for {len(self.helpers)} Logged PVs')
         with open(Path(self.pvlog_folder, RUNLOG_FILE), 'a', encoding='utf-8') as fh:
             fh.write(conn_msg + '\n')
         return conn_msg
 
+    def resolve_helpers(self, save=True):
+        """set descriptions and monitor deltas, and add motor fields, from
+        helper PVs that have connected, saving the folder configuration
+        files if needed.
+
+        Returns:
+           number of Logged PVs with all helper PVs resolved
+        """
+        nresolved = 0
+        changed = False
+        for pvname, hpvs in list(self.helpers.items()):
+            lpv = self.pvs[pvname]
+            descpv = hpvs.get('desc', None)
+            if descpv is not None and descpv.connected:
+                lpv.set_desc('<auto>', descpv)
+                hpvs.pop('desc')
+                if pvname in self.motors:
+                    # motor fields added before the description was known
+                    self.add_motor_fields(pvname)
+                changed = True
+            mdelpv = hpvs.get('mdel', None)
+            if mdelpv is not None and mdelpv.connected:
+                lpv.set_mdel('<auto>', mdelpv)
+                hpvs.pop('mdel')
+                changed = True
+            rtyppv = hpvs.get('rtyp', None)
+            if rtyppv is not None and rtyppv.connected:
+                if rtyppv.get() == 'motor':
+                    if pvname not in self.motors:
+                        self.motors.append(pvname)
+                    self.add_motor_fields(pvname)
+                    changed = True
+                hpvs.pop('rtyp')
+            if len(hpvs) == 0:
+                self.helpers.pop(pvname)
+                self.helpers_resolved.add(pvname)
+                nresolved += 1
+        if changed and save:
+            self.save_folder_config()
+        return nresolved
+
+    def add_motor_fields(self, pvname):
+        """add or update Logged PVs for the fields of a motor,
+        with descriptions from the description of the motor"""
+        prefix = pvname[:-4]
+        desc = self.pvs[pvname].desc
+        if desc in (None, 'None', '<auto>'):
+            desc = prefix
+        for mfield in motor_fields:
+            self.add_pv(f"{prefix}{mfield}", desc=f"{desc} {mfield}", mdel=None)
+
+    def save_folder_config(self):
+        """save configuration and list of log files to the PVLOG folder"""
+        out = dict(self.folder_config)
+        out['motors'] = list(self.motors)
+        out['pvs'] = []
+        for pvname in self.config_pvnames:
+            lpv = self.pvs[pvname]
+            pvline = [lpv.pvname, lpv.desc, str(lpv.mdel)]
+            if lpv.compressor is not None:
+                pvline.append(lpv.compression)
+            out['pvs'].append(' | '.join(pvline))
+
+        with open(Path(self.pvlog_folder, CONF_FILE), 'w', encoding='utf-8') as fh:
+            yaml.safe_dump(out, fh, default_flow_style=False, sort_keys=False)
+
+        segmented = self.segment_time > 0 or self.segment_size > 0
+        pfiles = ["# PV Name                                |    Log File "]
+        if segmented:
+            pfiles[0] = f"{pfiles[0]}                              | Start Time     | Stop Time"
+        for lpv in self.pvs.values():
+            lpv.segments_changed = False
+            if not segmented:
+                pfiles.append(f"{lpv.pvname:40s} | {lpv.filename:40s}")
+                continue
+            for fname, tstart, tstop in lpv.segments:
+                tstart = '' if tstart is None else f"{tstart:.3f}"
+                tstop = '' if tstop is None else f"{tstop:.3f}"
+                pfiles.append(f"{lpv.pvname:40s} | {fname:40s} | {tstart:14s} | {tstop}")
+        pfiles.append("")
+        with open(Path(self.pvlog_folder, FILELIST_FILE), 'w', encoding='utf-8') as fh:
+            fh.write('\n'.join(pfiles))
 
-    def add_pv(self, pvname, desc=None, mdel=None, descpv=None, mdelpv=None):
+    def add_pv(self, pvname, desc=None, mdel=None, descpv=None, mdelpv=None,
+               compression=None):
         if pvname not in self.pvs:
             self.pvs[pvname] = LoggedPV(pvname, desc=desc, mdel=mdel,
-                                        descpv=descpv, mdelpv=mdelpv)
+                                        descpv=descpv, mdelpv=mdelpv,
+                                        writer=self.writer,
+                                        storage=self.storage,
+                                        compression=compression,
+                                        segment_time=self.segment_time,
+                                        segment_size=self.segment_size*MEGABYTE,
+                                        segment_compress=self.segment_compress)
         else:
             this_pv = self.pvs[pvname]
-            if desc in (None, 'None', '<auto'):
+            if desc in (None, 'None', '<auto>'):
                 desc = this_pv.desc
             this_pv.set_desc(desc, descpv)
-            if mdel in (None, 'None', '<auto'):
+            if mdel in (None, 'None', '<auto>'):
                 mdel = this_pv.mdel
             this_pv.set_mdel(mdel, mdelpv)
+            if compression is not None:
+                this_pv.set_compression(compression)
 
         return self.pvs[pvname]
 
@@ -520,13 +845,15 @@ class PVLogger():
         """finish data collection"""
         with open(Path(self.pvlog_folder, RUNLOG_FILE), 'a', encoding='utf-8') as fh:
             fh.write(f'{isotime()}: got exit signal\n')
+        self.writer.stop()
         for pv in self.pvs.values():
             pv.pv.clear_callbacks()
             pv.save_current_value()
         sleep(SLEEPTIME)
-        for pv in self.pvs.values():
-            pv.write_data()
-            pv.flush()
+        self.writer.drain(self.pvs)
+        self.writer.close()
+        if any(pv.segments_changed for pv in self.pvs.values()):
+            self.save_folder_config()
         with open(Path(self.pvlog_folder, RUNLOG_FILE), 'a', encoding='utf-8') as fh:
             fh.write(f'{isotime()}: finishing\n')
 
@@ -580,13 +907,23 @@ class PVLogger():
         print(conn_msg, flush=True)
 
         atexit.register(self.on_exit)
+        self.writer.start()
 
+        # data is written by the writer thread as PVs change, so the main
+        # loop only needs to wake up for its own timers: checking control
+        # files, writing the run log, and polling PVs with compression.
         last_update = 0
         last_logtime = 0
+        last_poll = 0
         messages = []
         while True:
+            compressed = [pv for pv in self.pvs.values()
+                          if pv.compressor is not None]
+            twake = min(last_update + UPDATETIME, last_logtime + LOGTIME)
+            if len(compressed) > 0:
+                twake = min(twake, last_poll + POLLTIME)
             try:
-                sleep(SLEEPTIME)
+                sleep(max(0.01, twake - time()))
                 now = time()
             except KeyboardInterrupt:
                 self.exc = sys.exception()
@@ -595,17 +932,18 @@ class PVLogger():
             except Exception:
                 self.exc = sys.exception()
                 messages.append(f"{isotime()}: unkknwn error in mainloop {self.exc}")
-            try:
-                for pv in self.pvs.values():
-                    try:
-                        if len(pv.data) > 0:
-                            pv.write_data()
-                    except Exception:
-                        messages.append(f"{isotime()}: error writing data for {pv}")
-            except Exception:
-                self.exc = sys.exception()
+            if len(self.writer.messages) > 0:
+                messages.extend(self.writer.messages)
+                self.writer.messages = []
+            if now > last_poll + POLLTIME:
+                for pv in compressed:
+                    pv.poll_compression(now)
+                last_poll = now
 
             if now > last_update + UPDATETIME:
+                # set before the checks, so that an error in them
+                # waits for the next update rather than retrying at once
+                last_update = now
                 save_pvlog_timestamp(self.pvlog_folder)
                 try:
                     if self.look_for_exit_signal():
@@ -615,16 +953,31 @@ class PVLogger():
                 except Exception:
                     self.exc = sys.exception()
                     messages.append(f"{isotime()}: error looking for exit")
+                try:
+                    if len(self.helpers) > 0:
+                        nresolved = self.resolve_helpers()
+                        if nresolved > 0:
+                            messages.append(f"{isotime()}: resolved helper PVs "
+                                            f"for {nresolved} Logged PVs, "
+                                            f"{len(self.helpers)} waiting")
+                except Exception:
+                    self.exc = sys.exception()
+                    messages.append(f"{isotime()}: error resolving helper pvs")
+                try:
+                    if any(pv.segments_changed for pv in self.pvs.values()):
+                        self.save_folder_config()
+                except Exception:
+                    self.exc = sys.exception()
+                    messages.append(f"{isotime()}: error writing file list")
                 try:
                     self.look_for_new_pvs()
-                    last_update = now
                 except Exception:
                     self.exc = sys.exception()
                     messages.append(f"{isotime()}: error looking for new pvs")
 
             try:
                 if now > last_logtime + LOGTIME:
-                    messages.append(f'{isotime()}: collecting')
+                    messages.append(f'{isotime()}: collecting, {self.writer.report()}')
 
                 if len(messages) > 0:
                     messages.append('')
@@ -636,5 +989,8 @@ class PVLogger():
                 self.exc = sys.exception()
                 messages.append(f"{isotime()}: error while writing run log file")
 
+        self.writer.stop()
+        self.writer.drain(self.pvs)
+        self.writer.close()
         with open(Path(self.pvlog_folder, RUNLOG_FILE), 'a', encoding='utf-8') as fh:
             fh.write(f"{isotime()}: collection done.\n")
@@ -9,7 +9,6 @@ from threading import Thread
 from pathlib import Path
 from subprocess import Popen
 
-from numpy import arange
 from functools import partial
 from datetime import datetime, timedelta
 from dateutil import parser as dateparser
@@ -34,17 +33,18 @@ from wxutils import (GridPanel, SimpleText, TextCtrl, MenuItem,
 from wxutils.colors import use_darkdetect
 
 from pyshortcuts import uname, isotime, fix_filename
-from epicsapps.stripchart import StripChartFrame
 from wxmplot.colors import hexcolor
 
 from .configfile import PVLoggerConfig
-from .logfile import read_logfolder, TZONE
+from .logfile import read_logfolder, TZONE, PREFETCH_MEMORY
+from .export import export_timeseries, export_formats
 
 from .plotter import PlotFrame
 from .pvtableview import PVTableFrame
 from .eventtableview import EventTableFrame
 
 from ..utils import get_icon, fit_frame, get_pvdesc, get_pvmdel
+from ..utils.decimate import MinMaxPyramid, DECIMATE_MINPTS
 from .pvlogger import (get_instruments, check_pvlog_timestamp, UPDATETIME,
                        REQUEST_FILE, STOP_FILE, INSTRUMENTS_FILE)
 DVSTYLE = dv.DV_VERT_RULES|dv.DV_ROW_LINES|dv.DV_MULTIPLE|dv.DV_HORIZ_RULES
@@ -61,7 +61,10 @@ PLOT_COLORS = ('#1f77b4', '#d62728', '#2ca02c', '#ff7f0e', '#9467bd',
 EXPORT_TIME_UNITS = ('seconds', 'minutes')
 EXPORT_TIME_STEPS = ('1', '2', '5', '10', '15', '30', '60')
 
-TSV_WILDCARD = 'Tab-Separted files (*.tsv)|*.tsv|All files (*.*)|*.*'
+EXPORT_WILDCARDS = {'tsv': 'Tab-Separted files (*.tsv)|*.tsv',
+                    'csv': 'Comma-Separated files (*.csv)|*.csv',
+                    'parquet': 'Parquet files (*.parquet)|*.parquet',
+                    'hdf5': 'HDF5 files (*.h5)|*.h5'}
 YAML_WILDCARD = 'PVLogger Config Files (*.yaml)|*.yaml|All files (*.*)|*.*'
 
 STY  = wx.GROW|wx.ALL
@@ -258,6 +261,7 @@ class ExportFrame(wx.Frame):
         self.parent = parent
         self.last_time_start = 0
         self.last_time_stop = 0
+        self.export_thread = None
 
         wids = self.wids = {}
         wx.Frame.__init__(self, parent, -1, 'Export Data for Selected PVs',
@@ -357,48 +361,48 @@ class ExportFrame(wx.Frame):
         pvdescs = [p for p in self.parent.pvlist.GetCheckedStrings()]
         if len(pvdescs) < 1:
             return
-        self.export_datasets = None
+        if self.export_thread is not None and self.export_thread.is_alive():
+            self.parent.write_message('export in progress', panel=1)
+            return
 
         fname = fix_filename(pvdescs[0] + '.tsv')
-        fname = FileSave(self, f'Export {len(pvdescs)} PVs to Time TSV File',
-                         wildcard=TSV_WILDCARD, default_file=fname)
+        wildcard = '|'.join([EXPORT_WILDCARDS[f] for f in export_formats()]
+                            + ['All files (*.*)|*.*'])
+        fname = FileSave(self, f'Export {len(pvdescs)} PVs to Time Series File',
+                         wildcard=wildcard, default_file=fname)
         if fname is None:
             return
 
-        datasets, times = self.extract_time_data(ts1, ts2, tstep, pvdescs)
-
-        head0 = ['# Date/Time', 'Timestamp']
-        head1 = ['# Date/Time', 'Timestamp']
-        for pvname, dat in datasets.items():
-            head0.append(dat[0])
-            head1.append(pvname)
-        buff = ['\t '.join(head0),  '\t '.join(head1)]
-        for i, ts in enumerate(times):
-            row = [isotime(ts), f"{ts:.1f}"]
-            for dat in datasets.values():
-                row.append(dat[i+1])
-            buff.append('\t '.join(row))
-        buff.append('')
-        with open(fname, 'w') as fh:
-            fh.write('\n'.join(buff))
-        self.parent.write_message(f'exported data for {len(pvdescs)} to {fname}', panel=1)
-
-    def extract_time_data(self, tstart, tstop, tstep, pvdescs):
-        max_ts = 0
+        datasets, max_ts = self.get_export_data(pvdescs, ts1, ts2)
+        tstop = min(max_ts, ts2) + tstep
+
+        def on_progress(nwritten, ntotal):
+            msg = f'exporting data: {100.0*nwritten/max(1, ntotal):.0f}% complete'
+            wx.CallAfter(self.parent.write_message, msg, panel=1)
+
+        def export():
+            try:
+                export_timeseries(datasets, fname, ts1, tstop, tstep,
+                                  on_progress=on_progress)
+                msg = f'exported data for {len(pvdescs)} PVs to {fname}'
+            except Exception as exc:
+                msg = f'export to {fname} failed: {exc}'
+            wx.CallAfter(self.parent.write_message, msg, panel=1)
+
+        self.export_thread = Thread(target=export, daemon=True)
+        self.export_thread.start()
+
+    def get_export_data(self, pvdescs, tstart, tstop):
+        """get data for PVs to export, and the time of the last data point"""
+        max_ts = self.parent.log_folder.time_stop or 0
         datasets = {}
         for pvdesc in pvdescs:
             pvname = self.parent.pvmap[pvdesc]
-            dat = self.parent.get_pvdata(pvname)
-            datasets[pvname] = [pvdesc]
-            if dat is None:
-                dat = self.parent.get_pvdata(pvname)
-            max_ts = max(max_ts, dat.timestamps[-1])
-        max_ts = min(max_ts, tstop)
-        tstamps = arange(tstart, max_ts+1.1*tstep, tstep)
-        for pvname, dat in datasets.items():
-            vals = self.parent.log_folder.pvs[pvname].values_at(tstamps)
-            datasets[pvname].extend(vals)
-        return datasets, tstamps
+            dat = self.parent.get_pvdata_range(pvname, tstart, tstop)
+            datasets[pvname] = (pvdesc, dat)
+            if len(dat.timestamps) > 0:
+                max_ts = max(max_ts, dat.timestamps[-1])
+        return datasets, max_ts
 
 
 class EventDialogFrame(wx.Frame):
@@ -491,15 +495,15 @@ class EventDialogFrame(wx.Frame):
                            dtime2.GetHour(), dtime2.GetMinute(), 0)
         dt1 = dt1 - timedelta(minutes=5)
         dt2 = dt2 + timedelta(minutes=5)
-        event_data = {}
+        pvdescs = {}
         for pvdesc in self.parent.pvlist.GetCheckedStrings():
-            pvname = self.parent.pvmap[pvdesc]
-            data = self.parent.get_pvdata(pvname)
-            if data is None:
-                data = self.parent.get_pvdata(pvname)
-            event_data[pvdesc] = data
+            pvdescs[self.parent.pvmap[pvdesc]] = pvdesc
+        events = self.parent.log_folder.get_events(dt1.timestamp(),
+                                                   dt2.timestamp(),
+                                                   pvnames=list(pvdescs.keys()))
         self.parent.show_subframe('event_table', EventTableFrame)
-        self.parent.subframes['event_table'].set_data(event_data, dt1, dt2)
+        self.parent.subframes['event_table'].set_data(events, dt1, dt2,
+                                                      pvdescs=pvdescs)
 
 
 
@@ -526,6 +530,7 @@ Matt Newville <newville@cars.uchicago.edu>
         self.log_folder = None
         self.collect_folder = None
         self.parse_thread = None
+        self.pyramids = {}
         self.live_pvs = {}
         self.pvs_connected = 'unknown'
         self.save_inst_time = 0.0
@@ -1165,7 +1170,7 @@ were not processed.  Data collection may be stopped.""",
             return None
         if pvlog.data is None:
             self.write_message(f'parsing data for {pvname} ... ', panel=1)
-            pvlog.parse()
+            self.log_folder.read_logfile(pvname)
         pvlog.set_end_time(self.log_folder.time_stop)
         if pvlog.data.mpldates is None:
             pvlog.get_mpldates()
@@ -1177,7 +1182,30 @@ were not processed.  Data collection may be stopped.""",
             self.log_folder.read_motor_events(pvname)
         return pvlog.data
 
+    def get_pvdata_range(self, pvname, tstart, tstop):
+        """get PVdata for a time range, reading only that part of
+        the log file if the data for the PV has not been read"""
+        pvlog = self.log_folder.pvs[pvname]
+        if pvlog.data is not None or pvname in self.log_folder.motors:
+            return self.get_pvdata(pvname)
+        self.write_message(f'reading data for {pvname} ... ', panel=1)
+        return pvlog.read_range(tstart, tstop)
+
+    def get_pyramid(self, pvname, data):
+        """get MinMaxPyramid of decimated data for plotting a PV,
+        caching until the data changes"""
+        if len(data.timestamps) <= DECIMATE_MINPTS:
+            return None
+        key = (len(data.timestamps), data.timestamps[-1], data.values[-1])
+        cached = self.pyramids.get(pvname, None)
+        if cached is None or cached[0] != key:
+            cached = (key, MinMaxPyramid(data.mpldates, data.values))
+            self.pyramids[pvname] = cached
+        return cached[1]
+
     def onPlotLiveOne(self, event):
+        # imported here, as the strip chart imports from this package
+        from epicsapps.stripchart import StripChartFrame
         liveplot = self.show_subframe('pvlive', StripChartFrame, prompt=False)
         pvdesc = self.wids['pv1'].GetStringSelection()
         pvname = self.pvmap[pvdesc]
@@ -1186,6 +1214,7 @@ were not processed.  Data collection may be stopped.""",
         liveplot.Show()
 
     def onPlotLiveSel(self, event):
+        from epicsapps.stripchart import StripChartFrame
         liveplot = self.show_subframe('pvlive', StripChartFrame)
         for w in ('pv1', 'pv2', 'pv3', 'pv4'):
             pvdesc = self.wids[w].GetStringSelection()
@@ -1221,7 +1250,8 @@ were not processed.  Data collection may be stopped.""",
                     'colour':hcol, 'ylabel': f'{label} ({pvname})'}
 
             opts.update(PLOTOPTS)
-            pwin.plot(data.mpldates, data.values, **opts)
+            pwin.plot(data.mpldates, data.values,
+                      pyramid=self.get_pyramid(pvname, data), **opts)
             enum_strs = data.attrs.get('enum_strs', None)
             if enum_strs is not None:
                 pwin.panel.set_ytick_labels(enum_strs, yaxes=1)
@@ -1270,14 +1300,15 @@ were not processed.  Data collection may be stopped.""",
                 if yaxes == 1:
                     plot = pframe.plot
                     opts['ylabel'] = ylabel
-                    tmin = min(data.mpldates)
-                    tmax = max(data.mpldates)
+                    tmin = data.mpldates.min()
+                    tmax = data.mpldates.max()
                 else:
                     opts[f'y{yaxes}label'] = ylabel
-                    tmin = min(tmin, min(data.mpldates))
-                    tmax = max(tmax, max(data.mpldates))
+                    tmin = min(tmin, data.mpldates.min())
+                    tmax = max(tmax, data.mpldates.max())
 
-                plot(data.mpldates, data.values, **opts)
+                plot(data.mpldates, data.values,
+                     pyramid=self.get_pyramid(pvname, data), **opts)
                 enum_strs = data.attrs.get('enum_strs', None)
                 if enum_strs is not None:
                     pframe.panel.set_ytick_labels(enum_strs, yaxes=yaxes)
@@ -1355,6 +1386,7 @@ is not a valid PVLogger Data Folder""",
 
     def use_logfolder(self, folder):
         self.log_folder = folder
+        self.pyramids = {}
         self.log_folder.on_read = self.onReadDataFile
         self.wids['view_work_folder'].SetLabel(folder.fullpath)
         self.wids['curr_work_folder'].SetLabel(folder.fullpath)
@@ -1412,6 +1444,10 @@ is not a valid PVLogger Data Folder""",
         self.collecting = check_pvlog_timestamp(self.log_folder.fullpath,
                                                 timestamp_only=True)
         status_msg = f'collecting, updated: {isotime()}'
+        if self.parse_thread is None or not self.parse_thread.is_alive():
+            updated = self.log_folder.reset_new_logfiles()
+            if len(updated) > 0:
+                status_msg = f'{status_msg}, new data for {len(updated)} PVs'
         if not self.collecting:
             self.collect_timer.Stop()
             for collect_wid in ('btn_more_rows', 'btn_add_collect', 'btn_end_now',
@@ -1445,11 +1481,11 @@ is not a valid PVLogger Data Folder""",
 
     def read_folder(self):
         self.write_message('reading folder data....')
-        self.log_folder.read_all_logs_text()
         self.write_message('ready')
         self.write_message(' ', panel=1)
         self.parse_thread = Thread(target=self.log_folder.parse_logfiles,
-                                   kwargs={'verbose': True, 'nproc': 8})
+                                   kwargs={'verbose': True, 'nproc': 8,
+                                           'max_memory': PREFETCH_MEMORY})
         self.parse_thread.start()
 
 
@@ -1522,6 +1558,9 @@ is not a valid PVLogger Data Folder""",
         if self.collect_timer is not None:
             self.collect_timer.Stop()
 
+        if self.log_folder is not None:
+            self.log_folder.close_pool()
+
         for name, frame in self.subframes.items():
             try:
                 frame.Destroy()
@@ -0,0 +1,197 @@
+#!/usr/bin/python
+"""
+log file segments for PVLogger
+
+With `segment_time` or `segment_size` in the PVLogger configuration, the
+log file for each PV is split into segments: a new log file is started
+at fixed times of day (for `segment_time`, as 'hourly', 'daily', 'weekly'
+or a number of seconds) or when a log file exceeds `segment_size` MB.
+Each segment is a complete log file, with a header and starting with the
+last value logged in the previous segment.  Closed segments can be
+compressed, with `segment_compress` of 'gzip' or 'zstd'.
+
+The segments for each PV are listed in _PVLOG_filelist.txt, with lines of
+    PVName | LogFile | Start Timestamp | Stop Timestamp
+with an empty start timestamp for the first segment and an empty stop
+timestamp for the segment being written.  The stop time of a segment and
+the start time of the next segment are the timestamp of the last value
+in the segment, which is also the first value of the next segment.
+"""
+import os
+import gzip
+from pathlib import Path
+from threading import Thread
+from queue import Queue
+from datetime import datetime, timedelta
+from pyshortcuts import isotime
+
+HAS_ZSTD = False
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    pass
+
+COMPRESS_GZIP = 'gzip'
+COMPRESS_ZSTD = 'zstd'
+COMPRESS_SUFFIXES = {COMPRESS_GZIP: '.gz', COMPRESS_ZSTD: '.zst'}
+
+SEGMENT_TIMES = {'hourly': 3600, 'daily': 86400, 'weekly': 7*86400}
+
+def segment_compression_formats():
+    """list of available compression formats for closed segments"""
+    formats = [COMPRESS_GZIP]
+    if HAS_ZSTD:
+        formats.append(COMPRESS_ZSTD)
+    return formats
+
+def parse_segment_time(value):
+    """segment time in seconds from a config value of 'hourly', 'daily',
+    'weekly', or a number of seconds. Returns 0 for no segmenting."""
+    if value in (None, '', 'none', 'None'):
+        return 0
+    if str(value).lower() in SEGMENT_TIMES:
+        return SEGMENT_TIMES[str(value).lower()]
+    try:
+        return max(0, float(value))
+    except (ValueError, TypeError):
+        return 0
+
+def next_segment_time(now, segment_time):
+    """time to start the next segment: the next multiple of segment_time
+    after local midnight, for segment times up to 1 day"""
+    if segment_time <= 0:
+        return None
+    if segment_time > 86400:
+        return now + segment_time
+    midnight = datetime.fromtimestamp(now).replace(hour=0, minute=0,
+                                                   second=0, microsecond=0)
+    tmid = midnight.timestamp()
+    nseg = int((now - tmid)//segment_time) + 1
+    tnext = tmid + nseg*segment_time
+    tomorrow = (midnight + timedelta(days=1)).timestamp()
+    return min(tnext, tomorrow)
+
+def segment_logname(logname, index):
+    """log file name for segment `index` of a log file"""
+    logname = Path(logname)
+    if index < 1:
+        return logname.name
+    return f"{logname.stem}_{index:04d}{logname.suffix}"
+
+def segment_path(logfile):
+    """path of a log file segment, which may have been compressed"""
+    logfile = Path(logfile)
+    if not logfile.exists():
+        for suffix in COMPRESS_SUFFIXES.values():
+            cfile = Path(f"{logfile}{suffix}")
+            if cfile.exists():
+                return cfile
+    return logfile
+
+def is_compressed(logfile):
+    """whether a log file segment is compressed"""
+    return Path(logfile).suffix in COMPRESS_SUFFIXES.values()
+
+def read_compressed(filename):
+    """read the decompressed bytes of a compressed log file segment"""
+    filename = Path(filename)
+    if filename.suffix == COMPRESS_SUFFIXES[COMPRESS_ZSTD]:
+        if not HAS_ZSTD:
+            raise OSError(f"cannot read '{filename}': zstandard is not installed")
+        with open(filename, 'rb') as fh:
+            return zstandard.ZstdDecompressor().stream_reader(fh).read()
+    with gzip.open(filename, 'rb') as fh:
+        return fh.read()
+
+def compress_logfile(logfile, method=COMPRESS_GZIP):
+    """compress a closed log file segment, replacing it with a
+    compressed file.  Returns the name of the compressed file."""
+    logfile = Path(logfile)
+    cfile = Path(f"{logfile}{COMPRESS_SUFFIXES[method]}")
+    tmpfile = Path(f"{cfile}.tmp")
+    with open(logfile, 'rb') as fin:
+        if method == COMPRESS_ZSTD:
+            with open(tmpfile, 'wb') as fout:
+                zstandard.ZstdCompressor().copy_stream(fin, fout)
+        else:
+            with gzip.open(tmpfile, 'wb') as fout:
+                while True:
+                    buff = fin.read(1024*1024)
+                    if len(buff) < 1:
+                        break
+                    fout.write(buff)
+    st = os.stat(logfile)
+    os.utime(tmpfile, (st.st_atime, st.st_mtime))
+    os.replace(tmpfile, cfile)
+    logfile.unlink()
+    return cfile
+
+def read_filelist(filelist):
+    """read list of log file segments for each PV from a file list
+
+    Returns:
+       dict of {pvname: list of (logfile, tstart, tstop)}, in order of
+       segments, with tstart and tstop of None if not known.
+    """
+    folder = Path(filelist).parent
+    segments = {}
+    with open(filelist, 'r', encoding='utf-8') as fh:
+        lines = fh.readlines()
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        words = [a.strip() for a in line.split('|')]
+        if len(words) < 2:
+            continue
+        tstart = tstop = None
+        if len(words) > 3:
+            try:
+                tstart = float(words[2])
+            except ValueError:
+                pass
+            try:
+                tstop = float(words[3])
+            except ValueError:
+                pass
+        segments.setdefault(words[0], []).append((Path(folder, words[1]),
+                                                  tstart, tstop))
+    return segments
+
+
+class SegmentCompressor:
+    """compresses closed log file segments in a background thread
+
+    Arguments:
+       method (str):  compression method, 'gzip' or 'zstd' ['gzip']
+    """
+    def __init__(self, method=COMPRESS_GZIP):
+        self.method = method
+        self.queue = Queue()
+        self.thread = None
+        self.messages = []
+
+    def add(self, logfile):
+        """add a closed log file segment to compress"""
+        self.queue.put(Path(logfile))
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = Thread(target=self._run, name='pvlog_compress',
+                                 daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """wait for all queued segments to be compressed"""
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while True:
+            logfile = self.queue.get()
+            if logfile is None:
+                break
+            try:
+                compress_logfile(logfile, method=self.method)
+            except Exception:
+                self.messages.append(f"{isotime()}: could not compress {logfile}")
@@ -0,0 +1,237 @@
+#!/usr/bin/python
+"""
+Shared log writer for PVLogger, keeping a bounded pool of open log files
+"""
+import os
+from time import time
+from threading import Thread, Lock, Condition
+from collections import OrderedDict
+from pyshortcuts import isotime
+
+from .binarylog import BINARY_SUFFIXES
+
+MAX_OPENFILES = 256
+FSYNC_TIME = 15.0
+WRITE_TIME = 0.5
+WRITE_BATCH = 5000
+
+class LogWriter:
+    """writes buffered data for many LoggedPVs
+
+    Arguments:
+       max_openfiles (int):  max number of log files held open [256]
+       fsync_time (float):   time (sec) between flushing and syncing files [15]
+       latency (float):  max time (sec) between a PV change and writing it [0.5]
+       batch_size (int):  number of new data points that will start writing
+                          before the latency time [5000]
+
+    Notes:
+       open file handles are kept in a least-recently-used pool, so that
+       writing data does not need to open and close files each time.
+       LoggedPVs call `notify()` when they have new data.  The writer
+       thread, run with `start()`, sleeps until there is new data, and then
+       writes data for the notified PVs in one drain pass when either
+       `latency` seconds have passed since the first new data point or
+       `batch_size` new data points are waiting.
+    """
+    def __init__(self, max_openfiles=MAX_OPENFILES, fsync_time=FSYNC_TIME,
+                 latency=WRITE_TIME, batch_size=WRITE_BATCH):
+        self.max_openfiles = max(1, int(max_openfiles))
+        self.fsync_time = float(fsync_time)
+        self.latency = float(latency)
+        self.batch_size = max(1, int(batch_size))
+        self.handles = OrderedDict()
+        self.dirty = set()
+        self.lock = Lock()
+        self.pending = {}
+        self.npending = 0
+        self.first_pending = 0.0
+        self.wakeup = Condition(Lock())
+        self.thread = None
+        self.running = False
+        self.messages = []
+        self.compressor = None
+        self.next_fsync = time() + self.fsync_time
+        self.reset_stats()
+
+    def reset_stats(self):
+        """reset write statistics"""
+        self.stats = {'ncycles': 0, 'nlines': 0, 'nopens': 0,
+                      'time_total': 0.0, 'time_max': 0.0, 'time_last': 0.0,
+                      'delay_max': 0.0}
+
+    def notify(self, pv, npts=1):
+        """note that a LoggedPV has new data to write, waking the
+        writer thread if enough data points are waiting"""
+        with self.wakeup:
+            if self.npending == 0:
+                self.first_pending = time()
+                self.wakeup.notify()
+            self.pending[pv] = True
+            self.npending += npts
+            if self.npending >= self.batch_size:
+                self.wakeup.notify()
+
+    def wait_for_data(self):
+        """wait for new data, returning list of LoggedPVs to write,
+        or None if the writer is stopped"""
+        with self.wakeup:
+            while self.running and self.npending == 0:
+                timeout = None
+                if len(self.dirty) > 0:
+                    timeout = max(0.001, self.next_fsync - time())
+                if not self.wakeup.wait(timeout=timeout):
+                    return []
+            deadline = self.first_pending + self.latency
+            while (self.running and self.npending < self.batch_size and
+                   time() < deadline):
+                self.wakeup.wait(timeout=deadline - time())
+            if not self.running:
+                return None
+            pvs = list(self.pending)
+            self.stats['delay_max'] = max(self.stats['delay_max'],
+                                          time() - self.first_pending)
+            self.pending = {}
+            self.npending = 0
+        return pvs
+
+    def get_handle(self, path):
+        """get open file handle for a path, opening if needed and
+        closing the least recently used handle if the pool is full"""
+        fh = self.handles.pop(path, None)
+        if fh is None:
+            while len(self.handles) >= self.max_openfiles:
+                opath, ofh = self.handles.popitem(last=False)
+                ofh.close()
+                self.dirty.discard(opath)
+            if path.suffix in BINARY_SUFFIXES:
+                fh = open(path, 'ab')
+            else:
+                fh = open(path, 'a', encoding='utf-8')
+            self.stats['nopens'] += 1
+        self.handles[path] = fh
+        return fh
+
+    def write(self, path, data, flush=False):
+        """write data to file: text for log files, bytes for binary data files"""
+        with self.lock:
+            fh = self.get_handle(path)
+            fh.write(data)
+            if flush:
+                fh.flush()
+            else:
+                self.dirty.add(path)
+
+    def drain(self, pvs):
+        """write buffered data for a collection of LoggedPVs
+        returns number of lines written
+        """
+        t0 = time()
+        nlines = 0
+        if isinstance(pvs, dict):
+            pvs = list(pvs.values())
+        for pv in pvs:
+            if len(pv.data) < 1:
+                continue
+            try:
+                text, bdata, npts = pv.format_data()
+                for path, data in bdata.items():
+                    self.write(path, data)
+                if len(text) > 0:
+                    self.write(pv.fpath, text)
+                nlines += npts
+                for path in pv.pop_closed_files():
+                    self.close_segment(path)
+            except Exception:
+                self.messages.append(f"{isotime()}: error writing data for {pv.pvname}")
+        if time() > self.next_fsync:
+            self.sync()
+        if self.compressor is not None and len(self.compressor.messages) > 0:
+            self.messages.extend(self.compressor.messages)
+            self.compressor.messages = []
+
+        dt = time() - t0
+        self.stats['ncycles'] += 1
+        self.stats['nlines'] += nlines
+        self.stats['time_total'] += dt
+        self.stats['time_last'] = dt
+        self.stats['time_max'] = max(dt, self.stats['time_max'])
+        return nlines
+
+    def close_segment(self, path):
+        """sync and close a file for a closed log file segment, compressing
+        log files if a SegmentCompressor is set"""
+        with self.lock:
+            fh = self.handles.pop(path, None)
+            if fh is not None:
+                fh.flush()
+                os.fsync(fh.fileno())
+                fh.close()
+            self.dirty.discard(path)
+        if (self.compressor is not None and path.suffix not in BINARY_SUFFIXES
+            and path.exists()):
+            self.compressor.add(path)
+
+    def sync(self):
+        """flush and fsync all files written since the last sync"""
+        with self.lock:
+            for path in self.dirty:
+                fh = self.handles.get(path, None)
+                if fh is not None:
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            self.dirty = set()
+        self.next_fsync = time() + self.fsync_time
+
+    def close(self):
+        """sync and close all files, and wait for closed log file
+        segments to be compressed"""
+        self.sync()
+        with self.lock:
+            for fh in self.handles.values():
+                fh.close()
+            self.handles = OrderedDict()
+        if self.compressor is not None:
+            self.compressor.stop()
+
+    def report(self, reset=True):
+        """return message of write statistics, optionally resetting them"""
+        stats = self.stats
+        ncyc = max(1, stats['ncycles'])
+        tave = 1000.0*stats['time_total']/ncyc
+        tmax = 1000.0*stats['time_max']
+        tdelay = 1000.0*stats['delay_max']
+        msg = (f"wrote {stats['nlines']} lines in {stats['ncycles']} cycles, "
+               f"latency ave={tave:.2f} ms, max={tmax:.2f} ms, "
+               f"max delay={tdelay:.0f} ms, "
+               f"{stats['nopens']} opens, {len(self.handles)} open files")
+        if reset:
+            self.reset_stats()
+        return msg
+
+    def start(self):
+        """start writer thread, writing data for LoggedPVs as notified"""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = Thread(target=self._run, name='pvlog_writer', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """stop writer thread"""
+        with self.wakeup:
+            self.running = False
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def _run(self):
+        while self.running:
+            pvs = self.wait_for_data()
+            if pvs is None:
+                break
+            if len(pvs) > 0:
+                self.drain(pvs)
+            elif time() > self.next_fsync:
+                self.sync()
@@ -0,0 +1,173 @@
+"""
+save strip chart data
+
+Data for all PVs is saved at once, either as a text file for each PV,
+or as a single table of all PVs with a row for each time at which any
+PV changed, holding the last value of each PV at that time.  The table
+can be written as text, NPZ, or HDF5.
+
+Text is written in chunks of rows, with one format operation for all
+the values in each chunk, which is about twice as fast as np.savetxt().
+"""
+import time
+from pathlib import Path
+import numpy as np
+
+HAS_H5PY = False
+try:
+    import h5py
+    HAS_H5PY = True
+except ImportError:
+    pass
+
+SAVE_PVFILES = 'pvfiles'
+SAVE_TABLE = 'table'
+SAVE_NPZ = 'npz'
+SAVE_HDF5 = 'hdf5'
+
+SAVE_SUFFIXES = {SAVE_PVFILES: '.dat', SAVE_TABLE: '.txt',
+                 SAVE_NPZ: '.npz', SAVE_HDF5: '.h5'}
+SAVE_WILDCARDS = {SAVE_PVFILES: 'Text Files, one per PV (*.dat)|*.dat',
+                  SAVE_TABLE: 'Text Table of all PVs (*.txt)|*.txt',
+                  SAVE_NPZ: 'NPZ Table of all PVs (*.npz)|*.npz',
+                  SAVE_HDF5: 'HDF5 Table of all PVs (*.h5)|*.h5'}
+
+FILECHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'
+CHUNK_SIZE = 65536
+
+def save_formats():
+    """list of available save formats"""
+    formats = [SAVE_PVFILES, SAVE_TABLE, SAVE_NPZ]
+    if HAS_H5PY:
+        formats.append(SAVE_HDF5)
+    return formats
+
+def pv_filename(basename, pvname, ext):
+    """name of data file for a PV"""
+    pvname = ''.join([s if s in FILECHARS else '_' for s in pvname])
+    return f"{basename}_{pvname}.{ext}"
+
+def write_text(filename, header, rowfmt, columns, chunksize=CHUNK_SIZE):
+    """write text file of header lines and rows of values
+
+    Arguments:
+       filename (str): name of output file
+       header (list): list of header lines
+       rowfmt (str): format for a row of values, without newline
+       columns (2-d array): array of values, with a row for each line
+       chunksize (int): number of rows to format at once [65536]
+    """
+    rowfmt = rowfmt + '\n'
+    with open(filename, 'w', encoding='utf-8') as fh:
+        fh.write(''.join([f"{line}\n" for line in header]))
+        for i in range(0, len(columns), chunksize):
+            chunk = columns[i:i+chunksize]
+            fh.write((rowfmt*len(chunk)) % tuple(chunk.ravel().tolist()))
+
+def aligned_table(pvdata):
+    """table of values of PVs at all times any PV changed
+
+    Arguments:
+       pvdata (dict): dict of {pvname: (timestamps, values)}
+
+    Returns:
+       tuple of (times, columns), with an array of the sorted union of
+       timestamps for all PVs and a 2-d array with a column for each
+       PV of its last value at or before each time, and NaN before its
+       first value.
+    """
+    parts = [np.asarray(times, dtype='f8') for times, values in pvdata.values()]
+    times = np.unique(np.concatenate(parts)) if len(parts) > 0 else np.zeros(0)
+    columns = np.full((len(times), len(pvdata)), np.nan)
+    for i, (ptimes, pvalues) in enumerate(pvdata.values()):
+        if len(ptimes) < 1:
+            continue
+        idx = np.searchsorted(ptimes, times, side='right') - 1
+        valid = idx >= 0
+        columns[valid, i] = np.asarray(pvalues, dtype='f8')[idx[valid]]
+    return times, columns
+
+def save_pvfiles(basename, pvdata, ext='dat', tnow=None):
+    """save a text file for each PV, with timestamps, values,
+    and times relative to tnow [now]
+
+    Returns:
+       list of file names
+    """
+    if tnow is None:
+        tnow = time.time()
+    fnames = []
+    for pvname, (times, values) in pvdata.items():
+        if len(times) < 1:
+            continue
+        fname = pv_filename(basename, pvname, ext)
+        header = [f"# Epics PV Strip Chart Data for PV: {pvname} ",
+                  f"# Current Time  = {time.ctime(tnow)} ",
+                  f"# Earliest Time = {time.ctime(times[0])} ",
+                  "#------------------------------",
+                  "#  Timestamp         Value       Time-Current_Time(s)"]
+        write_text(fname, header, "  %.3f %16g     %.3f",
+                   np.column_stack((times, values, times - tnow)))
+        fnames.append(fname)
+    return fnames
+
+def save_table_text(filename, pvnames, descs, times, columns):
+    """save table of PV values as text"""
+    header = ['# Epics PV Strip Chart Data, values at time of last change',
+              '# Timestamp\t ' + '\t '.join(descs),
+              '# Timestamp\t ' + '\t '.join(pvnames)]
+    rowfmt = '\t '.join(['%.3f'] + ['%.10g']*len(pvnames))
+    write_text(filename, header, rowfmt, np.column_stack((times, columns)))
+
+def save_table_npz(filename, pvnames, descs, times, columns):
+    """save table of PV values to NPZ file, with arrays 'timestamp',
+    'values' (with a column for each PV), 'pvnames', and 'descriptions'"""
+    with open(filename, 'wb') as fh:
+        np.savez(fh, timestamp=times, values=columns,
+                 pvnames=np.array(pvnames, dtype=str),
+                 descriptions=np.array(descs, dtype=str))
+
+def save_table_hdf5(filename, pvnames, descs, times, columns):
+    """save table of PV values to HDF5 file, with datasets
+    'timestamp' and one for each PV"""
+    with h5py.File(filename, 'w') as h5file:
+        h5file.attrs['source'] = 'epicsapps stripchart'
+        h5file.create_dataset('timestamp', data=times)
+        for i, (pvname, desc) in enumerate(zip(pvnames, descs)):
+            dset = h5file.create_dataset(pvname.replace('/', '_'),
+                                         data=columns[:, i])
+            dset.attrs['pvname'] = pvname
+            dset.attrs['description'] = desc
+
+TABLE_WRITERS = {SAVE_TABLE: save_table_text, SAVE_NPZ: save_table_npz,
+                 SAVE_HDF5: save_table_hdf5}
+
+def save_stripchart_data(filename, pvdata, descs=None, form=SAVE_PVFILES,
+                         tnow=None):
+    """save strip chart data for all PVs
+
+    Arguments:
+       filename (str): name of output file.  For form='pvfiles', this
+                  is the base name for the files for each PV
+       pvdata (dict): dict of {pvname: (timestamps, values)}
+       descs (dict or None): dict of {pvname: description} [None]
+       form (str): one of 'pvfiles', 'table', 'npz', 'hdf5' ['pvfiles']
+       tnow (float or None): current time, for 'pvfiles' [None, for now]
+
+    Returns:
+       list of file names written
+    """
+    if form == SAVE_PVFILES:
+        basename, ext = Path(filename).with_suffix('').as_posix(), Path(filename).suffix
+        if len(ext) < 2:
+            ext = SAVE_SUFFIXES[SAVE_PVFILES]
+        return save_pvfiles(basename, pvdata, ext=ext[1:], tnow=tnow)
+    if form not in TABLE_WRITERS or form not in save_formats():
+        raise ValueError(f"unknown save format '{form}'")
+    if descs is None:
+        descs = {}
+    pvnames = list(pvdata.keys())
+    times, columns = aligned_table(pvdata)
+    TABLE_WRITERS[form](filename, pvnames, [descs.get(p, p) for p in pvnames],
+                        times, columns)
+    return [filename]
@@ -0,0 +1,172 @@
+"""
+time history of PV values for the strip chart
+"""
+import numpy as np
+
+HISTORY_SIZE = 2**20
+BLOCK_SIZE = 256
+
+def as_float(value):
+    """float value for plotting, or NaN for values that are not numbers"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class PVHistory:
+    """time history of values for a PV, kept in a preallocated
+    ring buffer of the latest `size` values
+
+    Arguments:
+       size (int): maximum number of values kept [2**20]
+
+    Notes:
+       each value is written twice, at positions i and i+size of arrays
+       of 2*size values, so that the latest values are always a contiguous
+       slice.  `timestamps` and `values` are views into the buffer, and
+       are not copied.  Timestamps should be added in increasing order,
+       so that `index_range()` can find the values for a time range with
+       a binary search.
+
+       The min and max values of each block of BLOCK_SIZE positions in
+       the buffer are kept as values are added, so that `minmax()` needs
+       to look only at the values at the ends of a range.
+    """
+    def __init__(self, size=HISTORY_SIZE):
+        size = max(2, int(size))
+        self.block = min(BLOCK_SIZE, size)
+        self.size = self.block*((size + self.block - 1)//self.block)
+        self._times = np.empty(2*self.size, dtype=np.float64)
+        self._values = np.empty(2*self.size, dtype=np.float64)
+        nblocks = self.size//self.block
+        self._bmin = np.full(nblocks, np.inf)
+        self._bmax = np.full(nblocks, -np.inf)
+        self.head = 0   # position of next value, from 0 to size-1
+        self.count = 0  # number of values kept, up to size
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        """add a value"""
+        value = as_float(value)
+        i, j = self.head, self.head + self.size
+        self._times[i] = self._times[j] = timestamp
+        self._values[i] = self._values[j] = value
+        # a block's min and max start over when its first position is written
+        iblock = i//self.block
+        if i % self.block == 0:
+            self._bmin[iblock], self._bmax[iblock] = np.inf, -np.inf
+        if value < self._bmin[iblock]:
+            self._bmin[iblock] = value
+        if value > self._bmax[iblock]:
+            self._bmax[iblock] = value
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.size, self.count + 1)
+
+    def extend(self, timestamps, values):
+        """add arrays of timestamps and values"""
+        timestamps = np.asarray(timestamps, dtype=np.float64)[-self.size:]
+        values = np.asarray(values, dtype=np.float64)[-self.size:]
+        npts = len(timestamps)
+        if npts < 1:
+            return
+        idx = (self.head + np.arange(npts)) % self.size
+        for i in (idx, idx + self.size):
+            self._times[i] = timestamps
+            self._values[i] = values
+        blocks = np.unique(idx//self.block)
+        self.head = (self.head + npts) % self.size
+        self.count = min(self.size, self.count + npts)
+
+        # block min and max, for the block being written only up to head
+        vals = self._values[:self.size].reshape(-1, self.block)[blocks]
+        iblock, ihead = divmod(self.head, self.block)
+        if ihead > 0 and iblock in blocks:
+            vals = vals.copy()
+            vals[blocks == iblock, ihead:] = np.nan
+        with np.errstate(invalid='ignore'):
+            self._bmin[blocks] = np.fmin.reduce(vals, axis=1, initial=np.inf)
+            self._bmax[blocks] = np.fmax.reduce(vals, axis=1, initial=-np.inf)
+
+    def clear(self):
+        """remove all values"""
+        self.head = self.count = 0
+
+    def _slice(self):
+        stop = self.head + self.size
+        return slice(stop - self.count, stop)
+
+    @property
+    def timestamps(self):
+        """timestamps, oldest first, as a view into the buffer"""
+        return self._times[self._slice()]
+
+    @property
+    def values(self):
+        """values, oldest first, as a view into the buffer"""
+        return self._values[self._slice()]
+
+    def index_range(self, tmin=None, tmax=None):
+        """range of indices of values for times tmin to tmax
+
+        Arguments:
+           tmin (float or None): start time [None, for the first value]
+           tmax (float or None): stop time [None, for the last value]
+
+        Returns:
+           tuple of (i0, i1), for values i0 to i1 (exclusive), including
+           the last value before tmin, which is the value shown at tmin.
+        """
+        times = self.timestamps
+        i0, i1 = 0, len(times)
+        if tmin is not None:
+            i0 = max(0, int(np.searchsorted(times, tmin, side='left')) - 1)
+        if tmax is not None:
+            i1 = int(np.searchsorted(times, tmax, side='right'))
+        return i0, max(i0, i1)
+
+    def window(self, tmin=None, tmax=None):
+        """timestamps and values for times tmin to tmax, as views
+        into the buffer, as for index_range()"""
+        i0, i1 = self.index_range(tmin, tmax)
+        return self.timestamps[i0:i1], self.values[i0:i1]
+
+    def minmax(self, i0=0, i1=None):
+        """min and max of values i0 to i1 (exclusive), ignoring NaNs
+
+        Returns:
+           tuple of (min, max), or (NaN, NaN) if there are no values
+        """
+        i1 = self.count if i1 is None else min(i1, self.count)
+        start = self.head + self.size - self.count
+        pos0, pos1 = start + max(0, i0), start + i1
+        if pos1 <= pos0:
+            return np.nan, np.nan
+        nblocks = len(self._bmin)
+        b0 = -(-pos0//self.block)
+        b1 = pos1//self.block
+        parts = [self._values[pos0:min(pos1, b0*self.block)],
+                 self._values[max(pos0, b1*self.block):pos1]]
+        ymin, ymax = np.inf, -np.inf
+        if b1 > b0:
+            blocks = np.arange(b0, b1) % nblocks
+            ymin = self._bmin[blocks].min()
+            ymax = self._bmax[blocks].max()
+        elif b1 < b0:
+            parts = [self._values[pos0:pos1]]
+        for vals in parts:
+            if len(vals) > 0:
+                ymin = np.fmin.reduce(vals, initial=ymin)
+                ymax = np.fmax.reduce(vals, initial=ymax)
+        if ymin > ymax:
+            return np.nan, np.nan
+        return float(ymin), float(ymax)
+
+    def last(self):
+        """(timestamp, value) of the latest value, or None if empty"""
+        if self.count < 1:
+            return None
+        i = (self.head - 1) % self.size
+        return self._times[i], self._values[i]
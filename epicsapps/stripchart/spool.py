@@ -0,0 +1,162 @@
+"""
+persisted time history for the strip chart
+
+PV values are spooled to a file for each PV in a spool folder, as
+fixed-width records of little-endian float64 (timestamp, value) pairs,
+the same records used for PVLogger binary data files.  When a PV is
+added to the strip chart, its recent history can be read back from
+the spool folder, or from a PVLOG folder written by the PVLogger.
+"""
+import os
+from pathlib import Path
+import numpy as np
+from pyshortcuts import fix_filename
+
+from ..utils import normalize_pvname
+from ..pvlogger.binarylog import RECORD_DTYPE, pack_records, read_records
+
+SPOOL_SUFFIX = '.spool'
+SPOOL_MAXRECORDS = 2**22
+
+def empty_history():
+    """empty arrays of timestamps and values"""
+    return np.zeros(0, dtype='f8'), np.zeros(0, dtype='f8')
+
+def merge_history(parts):
+    """merge parts of a time history
+
+    Arguments:
+       parts (list):  list of (timestamps, values) arrays
+
+    Returns:
+       tuple of (timestamps, values) arrays, in order of time
+
+    Notes:
+       parts are used in order of their first timestamp, and values
+       at or before the last timestamp of an earlier part are skipped.
+    """
+    parts = sorted([p for p in parts if len(p[0]) > 0], key=lambda p: p[0][0])
+    if len(parts) < 1:
+        return empty_history()
+    times, values, tlast = [], [], -np.inf
+    for ptimes, pvalues in parts:
+        i0 = int(np.searchsorted(ptimes, tlast, side='right'))
+        if i0 < len(ptimes):
+            times.append(ptimes[i0:])
+            values.append(pvalues[i0:])
+            tlast = ptimes[-1]
+    return np.concatenate(times), np.concatenate(values)
+
+def time_range(timestamps, values, tstart=None, tstop=None):
+    """copies of timestamps and values for times tstart to tstop,
+    starting with the last value at or before tstart"""
+    i0, i1 = 0, len(timestamps)
+    if tstart is not None:
+        i0 = max(0, int(np.searchsorted(timestamps, tstart, side='right')) - 1)
+    if tstop is not None:
+        i1 = int(np.searchsorted(timestamps, tstop, side='right'))
+    return np.array(timestamps[i0:i1]), np.array(values[i0:i1])
+
+class HistorySpool:
+    """spool folder of PV values for the strip chart
+
+    Arguments:
+       folder (str or Path): folder for spool files, created if needed
+       maxrecords (int): maximum number of records kept for each PV [2**22]
+
+    Notes:
+       values added with add() are kept until flush() appends them to
+       the spool files.  A spool file that grows past `maxrecords` is
+       rewritten with its latest maxrecords//2 records.
+    """
+    def __init__(self, folder, maxrecords=SPOOL_MAXRECORDS):
+        self.folder = Path(folder).absolute()
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.maxrecords = max(2, int(maxrecords))
+        self.pending = {}
+
+    def __repr__(self):
+        return f"HistorySpool('{self.folder.as_posix()}')"
+
+    def spool_file(self, pvname):
+        """name of spool file for a PV"""
+        return Path(self.folder, fix_filename(pvname) + SPOOL_SUFFIX)
+
+    def add(self, pvname, timestamp, value):
+        """add a value for a PV, to be written by flush()"""
+        if pvname not in self.pending:
+            self.pending[pvname] = []
+        self.pending[pvname].append((timestamp, value))
+
+    def flush(self):
+        """append pending values to spool files"""
+        pending, self.pending = self.pending, {}
+        for pvname, records in pending.items():
+            if len(records) < 1:
+                continue
+            sfile = self.spool_file(pvname)
+            with open(sfile, 'ab') as fh:
+                fh.write(pack_records(records))
+            if sfile.stat().st_size > self.maxrecords*RECORD_DTYPE.itemsize:
+                self.compact(pvname)
+
+    def compact(self, pvname):
+        """rewrite spool file for a PV with its latest maxrecords//2 records"""
+        sfile = self.spool_file(pvname)
+        times, values = read_records(sfile)
+        keep = self.maxrecords//2
+        tmpfile = sfile.with_suffix(SPOOL_SUFFIX + '.tmp')
+        with open(tmpfile, 'wb') as fh:
+            fh.write(pack_records(np.column_stack((times[-keep:], values[-keep:]))))
+        os.replace(tmpfile, sfile)
+
+    def read(self, pvname, tstart=None, tstop=None):
+        """read spooled values for a PV
+
+        Arguments:
+           pvname (str): PV name
+           tstart (float or None): start time [None, for the first value]
+           tstop (float or None): stop time [None, for the last value]
+
+        Returns:
+           tuple of (timestamps, values) arrays for the time range,
+           starting with the last value at or before tstart
+        """
+        sfile = self.spool_file(pvname)
+        if not sfile.exists():
+            return empty_history()
+        times, values = read_records(sfile, use_mmap=True)
+        return time_range(times, values, tstart, tstop)
+
+def read_pvlog_history(logfolder, pvname, tstart, tstop=None):
+    """read values for a PV from a PVLOG folder
+
+    Arguments:
+       logfolder (PVLogFolder, str, or Path): PVLOG folder
+       pvname (str): PV name
+       tstart (float): start time
+       tstop (float or None): stop time [None, for now]
+
+    Returns:
+       tuple of (timestamps, values) arrays for the time range, starting
+       with the last value at or before tstart.  These are empty if the
+       PV is not in the folder or its values are not numeric.
+
+    Notes:
+       only the parts of the log files for the time range are read,
+       using the time index of the log files.
+    """
+    from ..pvlogger.logfile import PVLogFolder
+    if not isinstance(logfolder, PVLogFolder):
+        logfolder = PVLogFolder(logfolder)
+    pv = logfolder.pvs.get(pvname, None)
+    if pv is None:
+        pv = logfolder.pvs.get(normalize_pvname(pvname), None)
+    if pv is None:
+        return empty_history()
+    if tstop is None:
+        tstop = np.inf
+    data = pv.read_range(tstart, tstop)
+    if not data.is_numeric:
+        return empty_history()
+    return data.timestamps, data.values
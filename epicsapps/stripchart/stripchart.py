@@ -6,11 +6,12 @@ import os
 import sys
 import time
 import shutil
+from threading import Thread
 from collections import namedtuple
 
 import numpy as np
 
-from numpy import array, where
+from numpy import array
 from functools import partial
 from pathlib import Path
 
@@ -32,18 +33,24 @@ from wxmplot.plotpanel import PlotPanel
 from wxmplot.colors import hexcolor
 
 
-from ..utils import SelectWorkdir, get_icon, ConfigFile, load_yaml
+from ..utils import (SelectWorkdir, get_icon, ConfigFile, load_yaml,
+                     minmax_decimate)
+from .history import PVHistory
+from .spool import HistorySpool, merge_history, read_pvlog_history
+from .export import (save_stripchart_data, save_formats, SAVE_SUFFIXES,
+                     SAVE_WILDCARDS)
 
 TZONE = str(datetime.now(timezone.utc).astimezone().tzinfo)
 if os.environ.get('TZ', None) is not None:
     TZONE = pytz.timezone(os.environ.get('TZ', TZONE))
 
 CONFFILE = 'stripchart.yaml'
-FILECHARS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'
 
 BGCOL  = (250, 250, 240)
 
 POLLTIME = 80
+SPOOLTIME = 5000  # time between writes to history spool files, in ms
+FAST_XLEAD = 0.10  # for fast redraw, fraction of time range shown after now
 NPVS = 4
 STY  = wx.GROW|wx.ALL
 LSTY = wx.ALIGN_LEFT|wx.EXPAND|wx.ALL
@@ -65,6 +72,11 @@ _configtext = """
 ##   pvname, pvdesc, use_log, ymin, ymax
 pvs:
    - ['S:SRcurrentAI.VAL', 'Storage Ring Current', 0, '', '']
+##  optional history: folder to spool values to, PVLOG folder, and
+##  hours of history to read from these when a PV is added
+spool_folder: ''
+pvlog_folder: ''
+backfill_hours: 0
 """
 
 class StripChartConfig(ConfigFile):
@@ -177,7 +189,9 @@ Also, these key bindings can be used
     about_msg =  """Epics PV Strip Chart  version 0.1
 Matt Newville <newville@cars.uchicago.edu>
 """
-    def __init__(self, parent=None, configfile=None, prompt=True, nmax=2**20, ntrim=None):
+    def __init__(self, parent=None, configfile=None, prompt=True, nmax=2**20, ntrim=None,
+                 fast_redraw=True, spool_folder=None, pvlog_folder=None,
+                 backfill_hours=0):
         self.pvdata = {}
         self.pvs = {}
         self.pv_opts = {}
@@ -191,13 +205,27 @@ Matt Newville <newville@cars.uchicago.edu>
         self.paused = False
         self.nmax = nmax
         if self.nmax is None:
-            self.nmax = min(NMAX_DEFAULT, nmax)
+            self.nmax = NMAX_DEFAULT
+        # ntrim is no longer used: each PV keeps its latest nmax
+        # values in a ring buffer
         self.ntrim = ntrim
-        if self.ntrim is None:
-            self.ntrim = self.nmax/32
         self.timelabel = 'minutes'
+        # fast redraw: decimated traces, blitted over a saved background
+        self.fast_redraw = fast_redraw
+        self.blit_background = None
+        self.blit_key = None
+        self.xlims = None
+        self.ylims = {}
+        # history: values spooled to files in spool_folder, and
+        # backfilled from spool_folder and pvlog_folder when a PV is added
+        self.spool = None
+        self.pvlog = None
+        self.pvlog_folder = pvlog_folder
+        self.backfill_hours = backfill_hours
+        self.save_thread = None
 
         self.create_frame(parent)
+        self.set_spool_folder(spool_folder)
         self.config = {'pvs': []}
         if prompt:
             ret = SelectWorkdir(self)
@@ -206,6 +234,9 @@ Matt Newville <newville@cars.uchicago.edu>
         self.timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.onUpdatePlot, self.timer)
         self.timer.Start(POLLTIME)
+        self.spool_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.onFlushSpool, self.spool_timer)
+        self.spool_timer.Start(SPOOLTIME)
 
     def onReadConfig(self, event=None):
         wcard = 'StripChart Config Files (*.yaml)|*.yaml|All files (*.*)|*.*'
@@ -235,6 +266,15 @@ Matt Newville <newville@cars.uchicago.edu>
         self.config = {'pvs': []}
         nconf = getattr(self.configfile, 'config', {})
         self.config.update(nconf)
+        if self.config.get('pvlog_folder', None):
+            self.set_pvlog_folder(self.config['pvlog_folder'])
+        if self.config.get('spool_folder', None):
+            self.set_spool_folder(self.config['spool_folder'])
+        try:
+            self.backfill_hours = float(self.config.get('backfill_hours',
+                                                        self.backfill_hours))
+        except (TypeError, ValueError):
+            pass
 
     def create_frame(self, parent, size=(950, 450), **kwds):
         self.parent = parent
@@ -247,6 +287,7 @@ Matt Newville <newville@cars.uchicago.edu>
 
         self.plotpanel = PlotPanel(self)
         self.plotpanel.messenger = self.write_message
+        self.plotpanel.canvas.mpl_connect('draw_event', self.onDrawEvent)
 
         pvpanel = self.build_pvpanel()
         self.build_btnpanel()
@@ -389,6 +430,13 @@ Matt Newville <newville@cars.uchicago.edu>
         MenuItem(self, mfile, "&Save Data\tCtrl+S",
                  "Save Text File of Data", self.onSaveData)
 
+        MenuItem(self, mfile, "Use History Spool Folder...",
+                 "Select Folder to Spool PV Values to", self.onSpoolFolder)
+
+        MenuItem(self, mfile, "Backfill From PVLOG Folder...",
+                 "Read Recent PV Values from a PVLOG Folder", self.onBackfillPVLog)
+        mfile.AppendSeparator()
+
         MenuItem(self, mfile, "Save Plot Image\t",
                  "Save PNG Image of Plot", pp.save_figure)
 
@@ -417,6 +465,10 @@ Matt Newville <newville@cars.uchicago.edu>
         mopt.AppendSeparator()
         MenuItem(self, mopt, "Zoom Out\tCtrl+Z",
                  "Zoom out to full data range", pp.unzoom_all)
+        mopt.AppendSeparator()
+        MenuItem(self, mopt, "Fast Redraw",
+                 "Decimate traces and redraw only the traces when possible",
+                 self.onFastRedraw, kind='check', checked=self.fast_redraw)
 
 
         mhelp = wx.Menu()
@@ -429,6 +481,120 @@ Matt Newville <newville@cars.uchicago.edu>
         mbar.Append(mhelp, "&Help")
         self.SetMenuBar(mbar)
 
+    def onFastRedraw(self, event=None):
+        self.fast_redraw = event.IsChecked()
+        self.set_animated(self.fast_redraw)
+        self.blit_background = None
+        self.xlims = None
+        self.force_replot = True
+        self.needs_refresh = True
+
+    def set_spool_folder(self, folder):
+        """spool PV values to files in folder, or stop spooling for None"""
+        if self.spool is not None:
+            self.spool.flush()
+        self.spool = None
+        if folder not in (None, ''):
+            try:
+                self.spool = HistorySpool(folder)
+            except OSError as exc:
+                self.write_message(f'cannot use spool folder {folder}: {exc}')
+
+    def set_pvlog_folder(self, folder):
+        """use PVLOG folder for backfilling PV values"""
+        self.pvlog_folder = folder
+        self.pvlog = None
+
+    def get_pvlog(self):
+        """PVLogFolder for pvlog_folder, or None"""
+        if self.pvlog is None and self.pvlog_folder not in (None, ''):
+            from ..pvlogger.logfile import PVLogFolder
+            try:
+                self.pvlog = PVLogFolder(self.pvlog_folder)
+            except ValueError as exc:
+                self.write_message(f'cannot read PVLOG folder: {exc}')
+                self.pvlog_folder = None
+        return self.pvlog
+
+    def backfill(self, pvname, hours=None):
+        """add values for a PV for the last `hours` [backfill_hours],
+        from the spool folder and PVLOG folder, keeping the values
+        already recorded
+
+        Returns:
+            number of values added
+        """
+        hours = self.backfill_hours if hours is None else hours
+        if hours is None or hours <= 0 or pvname not in self.pvdata:
+            return 0
+        tstart = time.time() - 3600.0*hours
+        hist = self.pvdata[pvname]
+        parts = [(hist.timestamps.copy(), hist.values.copy())]
+        if self.spool is not None:
+            self.spool.flush()
+            parts.append(self.spool.read(pvname, tstart))
+        pvlog = self.get_pvlog()
+        if pvlog is not None:
+            try:
+                parts.append(read_pvlog_history(pvlog, pvname, tstart))
+            except (OSError, ValueError) as exc:
+                self.write_message(f'cannot read {pvname} from PVLOG folder: {exc}')
+        times, values = merge_history(parts)
+        # times before tstart are kept only for the value shown at tstart
+        nold = max(0, int(np.searchsorted(times, tstart, side='right')) - 1)
+        times, values = times[nold:], values[nold:]
+        if len(times) <= len(hist):
+            return 0
+        new = PVHistory(self.nmax)
+        new.extend(times, values)
+        self.pvdata[pvname] = new
+        self.force_replot = True
+        self.needs_refresh = True
+        return len(new) - len(hist)
+
+    def onSpoolFolder(self, event=None):
+        dlg = wx.DirDialog(self, 'Select Folder to Spool PV Values to',
+                           defaultPath=os.getcwd(),
+                           style=wx.DD_DEFAULT_STYLE)
+        if dlg.ShowModal() == wx.ID_OK:
+            path = Path(dlg.GetPath()).absolute().as_posix()
+            self.set_spool_folder(path)
+            self.config['spool_folder'] = path
+            self.write_message(f'Spooling PV values to {path}')
+        dlg.Destroy()
+
+    def onBackfillPVLog(self, event=None):
+        dlg = wx.DirDialog(self, 'Select PVLOG Folder to Read PV Values from',
+                           defaultPath=os.getcwd(),
+                           style=wx.DD_DEFAULT_STYLE)
+        path = None
+        if dlg.ShowModal() == wx.ID_OK:
+            path = Path(dlg.GetPath()).absolute().as_posix()
+        dlg.Destroy()
+        if path is None:
+            return
+        self.set_pvlog_folder(path)
+        if self.get_pvlog() is None:
+            return
+        self.config['pvlog_folder'] = path
+        hours = self.backfill_hours
+        if hours is None or hours <= 0:
+            # the time range shown
+            hours = self.time_ctrl.GetValue()
+            if self.timelabel == 'minutes':
+                hours /= 60.0
+            elif self.timelabel == 'seconds':
+                hours /= 3600.0
+        nvals = sum(self.backfill(pvname, hours=hours) for pvname in self.pvdata)
+        self.write_message(f'Read {nvals} values from PVLOG folder {path}')
+
+    def onFlushSpool(self, event=None):
+        if self.spool is not None:
+            try:
+                self.spool.flush()
+            except OSError as exc:
+                self.write_message(f'cannot write spool files: {exc}')
+
     def onPVshow(self, event=None, row=0):
         if not event.IsChecked():
             trace = self.plotpanel.conf.get_mpl_line(row)
@@ -462,7 +628,9 @@ Matt Newville <newville@cars.uchicago.edu>
                 return
 
             self.pvlist.append(name)
-            self.pvdata[name] = [(time.time(), pv.get())]
+            self.pvdata[name] = PVHistory(self.nmax)
+            self.pvdata[name].append(time.time(), pv.get())
+            self.backfill(name)
 
             if basename.endswith('.VAL'):
                 basename = basename[:-4]
@@ -501,10 +669,10 @@ Matt Newville <newville@cars.uchicago.edu>
     def onPVChange(self, pvname=None, value=None, timestamp=None, **kw):
         if timestamp is None:
             timestamp = time.time()
-        self.pvdata[pvname].append((timestamp, value))
+        self.pvdata[pvname].append(timestamp, value)
+        if self.spool is not None:
+            self.spool.add(pvname, timestamp, self.pvdata[pvname].last()[1])
         self.needs_refresh = True
-        if len(self.pvdata[pvname]) > self.nmax:
-            self.pvdata[pvname] = self.pvdata[pvname][self.ntrim:]
 
     def onPVchoice(self, event=None, row=0, **kws):
         pvname = self.wids[f'pv{row}'].GetStringSelection()
@@ -593,45 +761,58 @@ Matt Newville <newville@cars.uchicago.edu>
         self.SetStatusText(s, panel)
 
     def onSaveData(self, event=None):
+        if self.save_thread is not None and self.save_thread.is_alive():
+            self.write_message('saving data in progress')
+            return
+        formats = save_formats()
+        wildcard = '|'.join([SAVE_WILDCARDS[f] for f in formats])
         dlg = wx.FileDialog(self, message='Save Data to File...',
                             defaultDir = os.getcwd(),
                             defaultFile='PVStripChart.dat',
+                            wildcard=wildcard,
                             style=wx.FD_SAVE|wx.FD_CHANGE_DIR)
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
-            self.SaveDataFiles(path)
-            self.write_message(f'Saved data to {path}')
+            form = formats[dlg.GetFilterIndex()]
+            if Path(path).suffix == '':
+                path = path + SAVE_SUFFIXES[form]
+            self.SaveDataFiles(path, form=form)
         dlg.Destroy()
 
-    def SaveDataFiles(self, path):
-        basename, ext = os.path.splitext(path)
-        if len(ext) < 2:
-            ext = '.dat'
-        if ext.startswith('.'):
-            ext = ext[1:]
-
-        for pvname, data in self.pvdata.items():
-            tnow = time.time()
-            tmin = data[0][0]
-            fname = []
-            for s in pvname:
-                if s not in FILECHARS:
-                    s = '_'
-                fname.append(s)
-            fname = os.path.join("%s_%s.%s" % (basename, ''.join(fname), ext))
-
-            buff = ["# Epics PV Strip Chart Data for PV: %s " % pvname]
-            buff.append("# Current Time  = %s " % time.ctime(tnow))
-            buff.append("# Earliest Time = %s " % time.ctime(tmin))
-            buff.append("#------------------------------")
-            buff.append("#  Timestamp         Value       Time-Current_Time(s)")
-            for tx, yval in data:
-                buff.append("  %.3f %16g     %.3f"  % (tx, yval, tx-tnow))
-
-            fout = open(fname, 'w', encoding='utf-8')
-            fout.write("\n".join(buff))
-            fout.close()
-            #dat = tnow, func(tnow)
+    def SaveDataFiles(self, path, form='pvfiles'):
+        """save data for all PVs, in a thread
+
+        Arguments:
+           path (str): name of output file, or base name for
+                       one file per PV with form='pvfiles'
+           form (str): one of 'pvfiles', 'table', 'npz', 'hdf5' ['pvfiles']
+
+        Returns:
+           the Thread saving the data
+        """
+        # copy data here, as values will be added while saving
+        pvdata = {pvname: (hist.timestamps.copy(), hist.values.copy())
+                  for pvname, hist in self.pvdata.items()}
+        descs = {pvname: opts[0] for pvname, opts in self.pv_opts.items()}
+        tnow = time.time()
+        self.write_message(f'Saving data to {path}')
+
+        def save():
+            try:
+                fnames = save_stripchart_data(path, pvdata, descs=descs,
+                                              form=form, tnow=tnow)
+                msg = f'Saved data to {path}'
+                if len(fnames) < 1:
+                    msg = 'No data to save'
+                elif len(fnames) > 1:
+                    msg = f'Saved data to {len(fnames)} files like {fnames[0]}'
+            except Exception as exc:
+                msg = f'Saving data to {path} failed: {exc}'
+            wx.CallAfter(self.write_message, msg)
+
+        self.save_thread = Thread(target=save, daemon=True)
+        self.save_thread.start()
+        return self.save_thread
 
     def onAbout(self, event=None):
         dlg = wx.MessageDialog(self, self.about_msg,
@@ -648,6 +829,8 @@ Matt Newville <newville@cars.uchicago.edu>
 
     def onExit(self, event=None):
         self.timer.Stop()
+        self.spool_timer.Stop()
+        self.onFlushSpool()
         conf_pvs = []
         for pvname, dat in self.pv_opts.items():
             desc, uselog, ymin, ymax = dat
@@ -694,8 +877,11 @@ Matt Newville <newville@cars.uchicago.edu>
 
         tmin = self.time_ctrl.GetValue() * timescale
         tmin = tnow - tmin
+        tlim0, tlim1 = self.get_xlims(tmin, tnow)
 
         ppan = self.plotpanel
+        if self.force_replot:
+            self.blit_background = None
 
         xmin = -1
         xmax = 0
@@ -710,6 +896,7 @@ Matt Newville <newville@cars.uchicago.edu>
         use_update = True
         if nselected < self.nplot:
             ppan.clear()
+            self.blit_background = None
             use_update = False
 
         self.nplot = 0
@@ -731,30 +918,25 @@ Matt Newville <newville@cars.uchicago.edu>
             if len(desc.strip()) < 1:
                 desc = pvname
 
-            dat_t  = [i[0] for i in self.pvdata[pvname]]
-            dat_y  = [i[1] for i in self.pvdata[pvname]]
-            if dat_t[-1] < (tnow - 30.): # value has not update for 30 second
-                self.pvdata[pvname].append([tnow, dat_y[-1]])
-                dat_t  = [i[0] for i in self.pvdata[pvname]]
-                dat_y  = [i[1] for i in self.pvdata[pvname]]
+            hist = self.pvdata[pvname]
+            tlast, ylast = hist.last()
+            if tlast < (tnow - 30.): # value has not update for 30 second
+                hist.append(tnow, ylast)
 
-            if len(dat_t)  < 2:
+            # only the values shown, from the last value before the left edge
+            i0, i1 = hist.index_range(tlim0, tnow)
+            if i1 - i0  < 2:
                 continue
-
-            tdat = np.array(dat_t)
-            ydat = np.array(dat_y)
-            mask = where(tdat > (tmin-10))
-            tdat = tdat[mask]/86400.0 # convert to mpldates
-            ydat = ydat[mask]
-
-            if len(tdat)  < 2:
+            dmin, dmax = hist.minmax(i0, i1)
+            if not np.isfinite(dmin):
                 continue
+            ymin, ymax = self.get_ylims(i, dmin, dmax, ymin, ymax)
 
-            yrange = max((max(ydat) - min(ydat)), 1.e-8)
-            if ymin is None:
-                ymin = min(ydat) - yrange*0.02
-            if ymax is None:
-                ymax = max(ydat) + yrange*0.02
+            tdat = hist.timestamps[i0:i1]
+            ydat = hist.values[i0:i1]
+            if self.fast_redraw:
+                tdat, ydat = minmax_decimate(tdat, ydat, 2*self.get_plot_width())
+            tdat = tdat/86400.0 # convert to mpldates
 
             ylabel = 'ylabel'
             logscale = 'ylog_scale'
@@ -762,16 +944,14 @@ Matt Newville <newville@cars.uchicago.edu>
                 ylabel = f'y{yaxes}label'
                 logscale = f'y{yaxes}log_scale'
 
-            tspan = tnow - tmin
-            tmin = (tmin - tspan*0.02)
-            tmax = (tnow + tspan*0.02)
             use_update = pvname in self.plotted_pvs.values()
-            xmin = tmin/86400.0
-            xmax = tmax/86400.0
+            xmin = tlim0/86400.0
+            xmax = tlim1/86400.0
             # print(" I ", pvname, pvname in self.plotted_pvs.values(), len(tdat), len(ydat), use_update)
             if use_update and not self.force_replot:
                 try:
-                    ppan.update_line(yaxes-1, tdat, ydat, draw=False, yaxes=yaxes)
+                    ppan.update_line(yaxes-1, tdat, ydat, draw=False, yaxes=yaxes,
+                                     update_limits=not self.fast_redraw)
                     ppan.set_xylims((xmin, xmax, ymin, ymax), yaxes=yaxes)
                     ppan.conf.set_trace_color(color, trace=yaxes-1, delay_draw=True)
                     setattr(ppan.conf, ylabel, desc)
@@ -784,7 +964,7 @@ Matt Newville <newville@cars.uchicago.edu>
                         'delay_draw': True, 'yaxes_tracecolor': True,
                         'use_dates': True, 'timezone': TZONE}
                 opts[ylabel] = desc
-                opts[logscale] = uselog and min(ydat) > 0
+                opts[logscale] = uselog and dmin > 0
                 plot = ppan.plot if yaxes==1 else ppan.oplot
                 plot(tdat, ydat, yaxes=yaxes, color=color,
                      ymin=ymin, ymax=ymax, label=desc, **opts)
@@ -792,11 +972,96 @@ Matt Newville <newville@cars.uchicago.edu>
 
         snow = time.strftime("%Y-%b-%d %H:%M:%S", time.localtime())
         self.plotpanel.set_title(snow, delay_draw=True)
-        self.plotpanel.canvas.draw()
+        if self.fast_redraw:
+            self.blit_redraw()
+        else:
+            self.plotpanel.canvas.draw()
         self.force_replot = False
         self.needs_refresh = False
         return
 
+    def get_xlims(self, tmin, tnow):
+        """x limits of plot, in seconds, for times tmin to tnow
+
+        With fast redraw, the limits extend past tnow by FAST_XLEAD of
+        the time range, and are kept until tnow reaches the right edge,
+        so that the axes need to be redrawn only occasionally.
+        """
+        tspan = tnow - tmin
+        if not self.fast_redraw:
+            return (tmin - tspan*0.02, tnow + tspan*0.02)
+        if (self.xlims is None or self.force_replot or tnow >= self.xlims[1]
+                or abs(self.xlims[2] - tspan) > 1.e-3*tspan):
+            self.xlims = (tmin - tspan*0.02, tnow + tspan*FAST_XLEAD, tspan)
+            self.ylims = {}
+        return self.xlims[:2]
+
+    def get_ylims(self, row, dmin, dmax, ymin=None, ymax=None):
+        """y limits of plot for data from dmin to dmax, unless set by
+        ymin or ymax.  With fast redraw, the limits are kept while the
+        data stays within them."""
+        yrange = max((dmax - dmin), 1.e-8)
+        limits = (dmin - yrange*0.02, dmax + yrange*0.02)
+        if self.fast_redraw:
+            prev = self.ylims.get(row, None)
+            if prev is not None and prev[0] <= dmin and dmax <= prev[1]:
+                limits = prev
+            self.ylims[row] = limits
+        return (limits[0] if ymin is None else ymin,
+                limits[1] if ymax is None else ymax)
+
+    def get_plot_width(self):
+        """width of plot axes in pixels"""
+        try:
+            return max(100, int(self.plotpanel.axes.get_window_extent().width))
+        except Exception:
+            return 1000
+
+    def animated_artists(self):
+        """artists drawn over the background for fast redraw:
+        the traces and the title"""
+        axes = self.plotpanel.fig.get_axes()
+        artists = [line for ax in axes for line in ax.get_lines()]
+        if len(axes) > 0:
+            artists.append(axes[0].title)
+        return artists
+
+    def set_animated(self, animated):
+        for artist in self.animated_artists():
+            artist.set_animated(animated)
+
+    def draw_animated(self):
+        for artist in self.animated_artists():
+            if artist.get_visible():
+                artist.axes.draw_artist(artist)
+
+    def onDrawEvent(self, event=None):
+        """save the background after a full draw, for fast redraw"""
+        if self.fast_redraw:
+            canvas = self.plotpanel.canvas
+            self.blit_background = canvas.copy_from_bbox(self.plotpanel.fig.bbox)
+            self.draw_animated()
+
+    def blit_redraw(self):
+        """redraw plot for fast redraw: the full figure is drawn only
+        when the axes have changed, and otherwise only the traces and
+        title are drawn over the saved background"""
+        ppan = self.plotpanel
+        canvas = ppan.canvas
+        ppan.set_viewlimits()
+        self.set_animated(True)
+        key = [canvas.get_width_height()]
+        for ax in ppan.fig.get_axes():
+            key.append((ax.get_xlim(), ax.get_ylim(), ax.get_yscale(),
+                        ax.get_ylabel(), ax.get_position().bounds))
+        if self.blit_background is None or key != self.blit_key:
+            self.blit_key = key
+            canvas.draw()
+        else:
+            canvas.restore_region(self.blit_background)
+            self.draw_animated()
+            canvas.blit(ppan.fig.bbox)
+
 class StripChartApp(wx.App):
     def __init__(self, configfile=None, prompt=True, debug=False, **kws):
         self.configfile = configfile
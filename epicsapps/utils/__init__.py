@@ -9,6 +9,7 @@ from .utils import get_pvdesc, get_pvmdel, get_pvroot, normalize_pvname
 from .textfile import read_textfile, unixpath, normalize_path
 from .griddata import DataTableGrid, DictFrame
 from .math import index_of, js2array
+from .decimate import MinMaxPyramid, minmax_decimate
 
 HAS_WXPYTHON = True
 import wx
@@ -0,0 +1,175 @@
+"""
+min/max decimation of long time series for plotting
+"""
+import numpy as np
+
+DECIMATE_FACTOR = 4
+DECIMATE_MINPTS = 20000
+
+def _bin_extrema(ymin, ymax, factor):
+    """indices of the min and max values in bins of `factor` points,
+    as (imin, imax) arrays of indices into ymin and ymax"""
+    npts = len(ymin)
+    nbins = (npts + factor - 1)//factor
+    npad = nbins*factor - npts
+    if npad > 0:
+        ymin = np.concatenate((ymin, np.repeat(ymin[-1:], npad)))
+        ymax = np.concatenate((ymax, np.repeat(ymax[-1:], npad)))
+    offsets = np.arange(nbins)*factor
+    imin = ymin.reshape(nbins, factor).argmin(axis=1) + offsets
+    imax = ymax.reshape(nbins, factor).argmax(axis=1) + offsets
+    return np.minimum(imin, npts-1), np.minimum(imax, npts-1)
+
+def _group_extrema(ymin, ymax, ngroups):
+    """indices of the min and max values in `ngroups` groups of nearly
+    equal numbers of points, as (imin, imax) arrays of indices into
+    ymin and ymax"""
+    npts = len(ymin)
+    groups = (np.arange(npts)*ngroups)//npts
+    first = np.searchsorted(groups, np.arange(ngroups))
+    imin = np.lexsort((ymin, groups))[first]
+    imax = np.lexsort((-ymax, groups))[first]
+    return imin, imax
+
+def _minmax_arrays(y):
+    """arrays for finding min and max values, with NaNs ignored"""
+    y = np.asarray(y, dtype=np.float64)
+    nans = np.isnan(y)
+    if not nans.any():
+        return y, y
+    return np.where(nans, np.inf, y), np.where(nans, -np.inf, y)
+
+def _merge_indices(imin, imax):
+    """merge min and max indices of bins to a sorted index array"""
+    idx = np.sort(np.column_stack((imin, imax)), axis=1).ravel()
+    if len(idx) > 1:
+        idx = idx[np.concatenate(([True], np.diff(idx) > 0))]
+    return idx
+
+def minmax_decimate(x, y, npts):
+    """decimate x, y data to about npts points, keeping the
+    minimum and maximum y values for each of npts/2 bins in x.
+
+    Arguments:
+       x (ndarray):  x values, increasing
+       y (ndarray):  y values
+       npts (int):   target number of points
+
+    Returns:
+       x, y arrays of decimated data, in order of x
+
+    Notes:
+       data with fewer than npts points is returned unchanged.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if len(y) <= npts:
+        return x, y
+    factor = int(np.ceil(2.0*len(y)/max(2, npts)))
+    ymin, ymax = _minmax_arrays(y)
+    idx = _merge_indices(*_bin_extrema(ymin, ymax, factor))
+    return x[idx], y[idx]
+
+
+class MinMaxPyramid:
+    """pyramid of min/max decimated data for plotting long time series
+
+    Arguments:
+       x (ndarray):  x values, increasing
+       y (ndarray):  y values
+       factor (int): decimation factor between levels [4]
+
+    Notes:
+       each level holds the indices of the min and max values in bins of
+       factor**level points, so that spikes are kept at every level.
+       Use `get_data(xmin, xmax, npts)` to get data for plotting, with
+       about npts points in the range xmin to xmax: the finest level with
+       at most `factor` times too many bins is used, and its bins are
+       merged into npts/2 bins.
+    """
+    def __init__(self, x, y, factor=DECIMATE_FACTOR):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.factor = max(2, int(factor))
+        self.npts = len(self.y)
+        self.levels = []
+        self.full = None
+        self.full_npts = None
+
+        idtype = np.int32 if self.npts < 2**31 else np.int64
+        self._ymin, self._ymax = ymin, ymax = _minmax_arrays(self.y)
+        imin = imax = np.arange(self.npts)
+        while len(imin) > 2:
+            kmin, _ = _bin_extrema(ymin[imin], ymax[imin], self.factor)
+            _, kmax = _bin_extrema(ymin[imax], ymax[imax], self.factor)
+            imin = imin[kmin].astype(idtype)
+            imax = imax[kmax].astype(idtype)
+            self.levels.append((imin, imax))
+
+    def __len__(self):
+        return self.npts
+
+    def get_indices(self, i0, i1, npts):
+        """indices of points to plot for data points i0 to i1 (exclusive)"""
+        i0 = max(0, i0)
+        i1 = min(self.npts, i1)
+        if i1 - i0 <= npts or len(self.levels) < 1:
+            return np.arange(i0, i1)
+        nbins = max(1, npts//2)
+        if i1 - i0 <= self.factor*nbins:
+            imin = imax = np.arange(i0, i1)
+        else:
+            for level, (imin, imax) in enumerate(self.levels):
+                binsize = self.factor**(level+1)
+                if (i1 - i0)/binsize <= self.factor*nbins:
+                    break
+            b0 = i0//binsize
+            b1 = (i1 - 1)//binsize + 1
+            imin, imax = imin[b0:b1], imax[b0:b1]
+        # merge points or bins into nbins bins, for about npts points
+        if len(imin) > nbins:
+            kmin, _ = _group_extrema(self._ymin[imin], self._ymax[imin], nbins)
+            _, kmax = _group_extrema(self._ymin[imax], self._ymax[imax], nbins)
+            imin, imax = imin[kmin], imax[kmax]
+        idx = _merge_indices(imin, imax)
+        idx = idx[(idx >= i0) & (idx < i1)]
+        if len(idx) > 0:
+            if idx[0] != i0:
+                idx = np.concatenate(([i0], idx))
+            if idx[-1] != i1-1:
+                idx = np.concatenate((idx, [i1-1]))
+        return idx
+
+    def get_data(self, xmin=None, xmax=None, npts=2000):
+        """get decimated x, y data for plotting
+
+        Arguments:
+           xmin (float or None): start of x range shown [None]
+           xmax (float or None): end of x range shown [None]
+           npts (int): number of points for the x range shown [2000]
+
+        Returns:
+           x, y arrays of data, in order of x
+
+        Notes:
+           data between xmin and xmax is decimated to about npts points,
+           and is combined with data for the full x range decimated to
+           about npts points, so that the min and max of the returned
+           data always match those of the full data.
+        """
+        npts = max(4, int(npts))
+        if self.full is None or self.full_npts != npts:
+            self.full = self.get_indices(0, self.npts, npts)
+            self.full_npts = npts
+        idx = self.full
+        if xmin is not None or xmax is not None:
+            i0, i1 = 0, self.npts
+            if xmin is not None:
+                i0 = max(0, np.searchsorted(self.x, xmin, side='right') - 1)
+            if xmax is not None:
+                i1 = min(self.npts, np.searchsorted(self.x, xmax, side='left') + 1)
+            if i1 - i0 < self.npts:
+                idx = np.concatenate((idx[idx < i0],
+                                      self.get_indices(i0, i1, npts),
+                                      idx[idx >= i1]))
+        return self.x[idx], self.y[idx]